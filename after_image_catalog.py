@@ -0,0 +1,115 @@
+import logging
+import os
+import random
+import threading
+from typing import Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+AFTER_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+class AfterImageCatalog:
+    """
+    In-memory catalog of every "after" photo, used by the public random-image endpoints.
+
+    Entries are kept in a flat list so a random sample of k images costs O(k) and never touches
+    the filesystem. A path -> position index allows O(1) swap-removal, and a per-contact index
+    lets /delete drop all of a customer's images at once. Each entry is built once, when the
+    image is added, by `entry_builder(relative_path)`.
+    """
+
+    def __init__(self, data_dir: str, entry_builder: Callable[[str], dict]):
+        self.data_dir = data_dir
+        self.entry_builder = entry_builder
+        self._lock = threading.Lock()
+        self._paths: list[str] = []
+        self._entries: list[dict] = []
+        self._positions: dict[str, int] = {}
+        self._by_contact: dict[str, set[str]] = {}
+
+    def load(self, contact_ids: Iterable[str]) -> int:
+        """Walks the after/ folders of the given contacts and rebuilds the catalog."""
+        paths = []
+        for contact_id in contact_ids:
+            images_dir = os.path.join(self.data_dir, contact_id, "images")
+            if not os.path.isdir(images_dir):
+                continue
+            for service_apt_dir in os.listdir(images_dir):
+                after_dir = os.path.join(images_dir, service_apt_dir, "after")
+                if not os.path.isdir(after_dir):
+                    continue
+                for filename in os.listdir(after_dir):
+                    if filename.lower().endswith(AFTER_IMAGE_EXTENSIONS):
+                        paths.append(f"{contact_id}/images/{service_apt_dir}/after/{filename}")
+
+        with self._lock:
+            self._paths = []
+            self._entries = []
+            self._positions = {}
+            self._by_contact = {}
+            for path in paths:
+                self._add(path)
+
+        logger.info(f"After-image catalog loaded {len(paths)} images")
+        return len(paths)
+
+    def _add(self, relative_path: str):
+        if relative_path in self._positions:
+            # Re-adding refreshes the entry, e.g. once variants have been generated.
+            self._entries[self._positions[relative_path]] = self.entry_builder(relative_path)
+            return
+        self._positions[relative_path] = len(self._paths)
+        self._paths.append(relative_path)
+        self._entries.append(self.entry_builder(relative_path))
+        contact_id = relative_path.split("/", 1)[0]
+        self._by_contact.setdefault(contact_id, set()).add(relative_path)
+
+    def _remove(self, relative_path: str):
+        position = self._positions.pop(relative_path, None)
+        if position is None:
+            return
+        # Move the last entry into the freed slot so the list stays dense.
+        last_path = self._paths.pop()
+        last_entry = self._entries.pop()
+        if last_path != relative_path:
+            self._paths[position] = last_path
+            self._entries[position] = last_entry
+            self._positions[last_path] = position
+
+        contact_id = relative_path.split("/", 1)[0]
+        contact_paths = self._by_contact.get(contact_id)
+        if contact_paths is not None:
+            contact_paths.discard(relative_path)
+            if not contact_paths:
+                del self._by_contact[contact_id]
+
+    def add(self, relative_path: str):
+        """Adds an after image, given by its path relative to the data directory."""
+        relative_path = relative_path.replace(os.sep, '/')
+        if not relative_path.lower().endswith(AFTER_IMAGE_EXTENSIONS):
+            return
+        with self._lock:
+            self._add(relative_path)
+
+    def remove(self, relative_path: str):
+        with self._lock:
+            self._remove(relative_path.replace(os.sep, '/'))
+
+    def remove_contact(self, contact_id: str):
+        """Drops every image belonging to a deleted customer."""
+        with self._lock:
+            for relative_path in list(self._by_contact.get(contact_id, ())):
+                self._remove(relative_path)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def choice(self) -> dict | None:
+        with self._lock:
+            return random.choice(self._entries) if self._entries else None
+
+    def sample(self, count: int) -> list[dict]:
+        """Returns up to `count` distinct random entries."""
+        with self._lock:
+            return random.sample(self._entries, min(max(count, 0), len(self._entries)))
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import Awaitable, Callable
+
+import file_io
+
+logger = logging.getLogger(__name__)
+
+Runner = Callable[[dict], Awaitable[None]]
+
+# Columns a runner may checkpoint with update().
+_UPDATABLE_FIELDS = {
+    "stage", "progress_message_id", "thread_id", "message_count", "last_message_id",
+    "bytes_written", "text_length", "error",
+}
+
+
+class ArchiveJobQueue:
+    """
+    Durable queue of channel archive jobs.
+
+    A job is stored in SQLite as soon as it is submitted and the runner checkpoints its
+    progress (stage, last exported message, bytes written) as it goes. Jobs interrupted by
+    a restart are picked up again on start(), and a failed job is picked up again when its
+    channel is submitted again; both continue from their checkpoint. At most
+    `concurrency` jobs run at once; the rest wait in the "queued" state.
+    """
+
+    def __init__(self, db_path: str, concurrency: int = 3):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._slots = asyncio.Semaphore(concurrency)
+        self._runner: Runner | None = None
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    # --- Storage ---
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS archive_jobs (
+                    id TEXT PRIMARY KEY,
+                    channel_id INTEGER NOT NULL,
+                    channel_name TEXT NOT NULL,
+                    contact_id TEXT,
+                    requested_by TEXT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    stage TEXT NOT NULL DEFAULT 'export',
+                    progress_message_id INTEGER,
+                    thread_id INTEGER,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    last_message_id INTEGER,
+                    bytes_written INTEGER NOT NULL DEFAULT 0,
+                    text_length INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    finished_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_archive_jobs_channel ON archive_jobs (channel_id, status);
+                CREATE INDEX IF NOT EXISTS idx_archive_jobs_status ON archive_jobs (status);
+            """)
+            self._conn = conn
+        return self._conn
+
+    def submit(self, channel_id: int, channel_name: str, contact_id: str | None, requested_by: str | None) -> tuple[dict, bool]:
+        """
+        Queues a job for the channel and returns (job, queued). If the channel already has a
+        queued or running job, that job is returned with queued=False. If its last job failed,
+        that job is queued again and keeps its stage and checkpoint, so it resumes where it
+        stopped. Otherwise a new job is stored. Blocking (SQLite write).
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = conn.execute(
+                    "SELECT * FROM archive_jobs WHERE channel_id = ? AND status IN ('queued', 'running')",
+                    (channel_id,),
+                ).fetchone()
+                if existing is None:
+                    failed = conn.execute(
+                        "SELECT id FROM archive_jobs WHERE channel_id = ? AND status = 'failed' ORDER BY created_at DESC LIMIT 1",
+                        (channel_id,),
+                    ).fetchone()
+                    if failed is not None:
+                        job_id = failed["id"]
+                        conn.execute(
+                            "UPDATE archive_jobs SET status = 'queued', requested_by = ?, error = NULL, finished_at = NULL, updated_at = ? "
+                            "WHERE id = ?",
+                            (requested_by, now, job_id),
+                        )
+                    else:
+                        job_id = uuid.uuid4().hex[:8]
+                        conn.execute(
+                            "INSERT INTO archive_jobs (id, channel_id, channel_name, contact_id, requested_by, created_at, updated_at) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (job_id, channel_id, channel_name, contact_id, requested_by, now, now),
+                        )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if existing is not None:
+            return dict(existing), False
+        if failed is not None:
+            logger.info(f"Requeued failed archive job {job_id} for channel {channel_id}")
+        else:
+            logger.info(f"Queued archive job {job_id} for channel {channel_id}")
+        return self.get(job_id), True
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM archive_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def update(self, job_id: str, **fields):
+        """Checkpoints job fields. Blocking (SQLite write)."""
+        unknown = set(fields) - _UPDATABLE_FIELDS
+        if unknown:
+            raise ValueError(f"Cannot update archive job fields: {', '.join(sorted(unknown))}")
+        self._set(job_id, **fields)
+
+    def _set(self, job_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._connect().execute(
+                f"UPDATE archive_jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                (*fields.values(), time.time(), job_id),
+            )
+
+    # --- Workers ---
+    async def start(self, runner: Runner):
+        """
+        Registers the runner and resumes every job left queued or running by the last process.
+        Later calls (e.g. on a Discord reconnect) do nothing.
+        """
+        if self._runner is not None:
+            return
+        self._runner = runner
+
+        def pending() -> list[str]:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("UPDATE archive_jobs SET status = 'queued' WHERE status = 'running'")
+                return [row["id"] for row in conn.execute("SELECT id FROM archive_jobs WHERE status = 'queued' ORDER BY created_at")]
+
+        job_ids = await file_io.run(pending)
+        for job_id in job_ids:
+            self.schedule(job_id)
+        if job_ids:
+            logger.info(f"Resuming {len(job_ids)} archive job(s)")
+
+    def schedule(self, job_id: str):
+        """Starts a task for a submitted job. Must be called on the event loop."""
+        if self._runner is None or job_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def stop(self):
+        """Cancels running jobs; they stay 'running' in the database and resume on the next start()."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job_id: str):
+        async with self._slots:
+            await file_io.run(self._set, job_id, status="running")
+            job = await file_io.run(self.get, job_id)
+            try:
+                await self._runner(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await file_io.run(self._set, job_id, status="failed", error=str(e), finished_at=time.time())
+                logger.error(f"Archive job {job_id} failed: {e}\n{traceback.format_exc()}")
+                return
+            await file_io.run(self._set, job_id, status="completed", error=None, finished_at=time.time())
+            logger.info(f"Archive job {job_id} completed")
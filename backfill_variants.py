@@ -0,0 +1,148 @@
+"""
+Generates resized variants for photos that were stored before the variant pipeline existed.
+
+Usage:
+    python backfill_variants.py [--workers 4] [--overwrite]
+
+Walks customer_data/*/images/service_apt*/{before,after}/ with a process pool and writes the
+thumb/medium/full variants next to each original (see image_variants.py). Progress is recorded
+in a manifest after every image, so the command can be interrupted and rerun; images that are
+already in the manifest and unchanged on disk are skipped.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import image_variants
+
+logger = logging.getLogger(__name__)
+
+CUSTOMER_DATA_DIR = "customer_data"
+DEFAULT_MANIFEST = os.path.join("bot_data", "variants_manifest.json")
+
+
+def find_originals(data_dir: str):
+    """Yields every before/after original under the customer data directory."""
+    for contact_id in sorted(os.listdir(data_dir)):
+        images_dir = os.path.join(data_dir, contact_id, "images")
+        if not os.path.isdir(images_dir):
+            continue
+        for service_apt_dir in sorted(os.listdir(images_dir)):
+            for image_type in ("before", "after"):
+                type_dir = os.path.join(images_dir, service_apt_dir, image_type)
+                if not os.path.isdir(type_dir):
+                    continue
+                for filename in sorted(os.listdir(type_dir)):
+                    if filename.lower().endswith(image_variants.SOURCE_EXTENSIONS):
+                        yield os.path.join(type_dir, filename)
+
+
+def load_manifest(path: str) -> dict:
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else {}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(path: str, manifest: dict):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def is_done(manifest: dict, key: str, original_path: str) -> bool:
+    """True if the manifest entry matches the original on disk and every variant still exists."""
+    entry = manifest.get(key)
+    if not entry:
+        return False
+    stat = os.stat(original_path)
+    if entry.get("size") != stat.st_size or entry.get("mtime") != int(stat.st_mtime):
+        return False
+    return set(image_variants.existing_variants(original_path)) == set(image_variants.VARIANT_SIZES)
+
+
+def process_image(original_path: str, overwrite: bool) -> dict:
+    """Worker: generates the variants for one original and returns its manifest entry."""
+    variants = image_variants.generate_variants(original_path, overwrite=overwrite)
+    stat = os.stat(original_path)
+    return {
+        "size": stat.st_size,
+        "mtime": int(stat.st_mtime),
+        "variants": {name: os.path.getsize(path) for name, path in variants.items()},
+    }
+
+
+def format_bytes(num: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(num) < 1024:
+            return f"{num:.1f} {unit}"
+        num /= 1024
+    return f"{num:.1f} TB"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate thumb/medium/full variants for existing customer photos.")
+    parser.add_argument("--data-dir", default=CUSTOMER_DATA_DIR, help="Customer data directory to walk.")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="Where progress is recorded between runs.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Number of worker processes.")
+    parser.add_argument("--overwrite", action="store_true", help="Regenerate variants even if they already exist.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    manifest = {} if args.overwrite else load_manifest(args.manifest)
+    pending = []
+    skipped = 0
+    for original_path in find_originals(args.data_dir):
+        key = os.path.relpath(original_path, args.data_dir).replace(os.sep, '/')
+        if not args.overwrite and is_done(manifest, key, original_path):
+            skipped += 1
+        else:
+            pending.append((key, original_path))
+
+    logger.info(f"{len(pending)} image(s) to process, {skipped} already done.")
+
+    failed = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(process_image, path, args.overwrite): key for key, path in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                key = futures[future]
+                try:
+                    manifest[key] = future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"[{done}/{len(pending)}] Failed {key}: {e}")
+                    continue
+                save_manifest(args.manifest, manifest)
+                logger.info(f"[{done}/{len(pending)}] {key}")
+    except KeyboardInterrupt:
+        save_manifest(args.manifest, manifest)
+        logger.info("Interrupted. Progress saved; rerun the command to continue.")
+        return 130
+
+    # Report over the whole manifest so reruns show the cumulative result.
+    original_bytes = sum(entry["size"] for entry in manifest.values())
+    full_bytes = sum(entry["variants"].get("full", entry["size"]) for entry in manifest.values())
+    thumb_bytes = sum(entry["variants"].get("thumb", 0) for entry in manifest.values())
+    logger.info(
+        f"\nImages with variants: {len(manifest)} ({failed} failed this run)\n"
+        f"Originals:      {format_bytes(original_bytes)}\n"
+        f"Full variants:  {format_bytes(full_bytes)}\n"
+        f"Thumbnails:     {format_bytes(thumb_bytes)}\n"
+        f"Bytes saved per full-gallery load: {format_bytes(original_bytes - full_bytes)}"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
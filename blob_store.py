@@ -0,0 +1,264 @@
+"""
+Content-addressed storage for customer photos.
+
+Every unique image is kept once under bot_data/blobs/<sha256[:2]>/<sha256><ext> and hard-linked
+into the per-service before/after folders, so the existing URLs and folder listings keep
+working while re-uploads of the same photo cost no extra disk. A SQLite index counts the
+links to each blob; when a customer is deleted their links are released and blobs nobody
+links to any more are removed.
+
+To deduplicate photos that were stored before the blob store existed:
+    python blob_store.py --adopt [--data-dir customer_data]
+"""
+import argparse
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOBS_DIR = os.path.join("bot_data", "blobs")
+CUSTOMER_DATA_DIR = "customer_data"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.heic')
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """
+    Stores each unique file once and hard-links it into place. All methods are blocking;
+    call them through file_io.run() from async code.
+    """
+
+    def __init__(self, blobs_dir: str = DEFAULT_BLOBS_DIR):
+        self.blobs_dir = blobs_dir
+        self.db_path = os.path.join(blobs_dir, "index.sqlite")
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.blobs_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    blob_path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS links (
+                    path TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL REFERENCES blobs (sha256),
+                    contact_id TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_links_contact_id ON links (contact_id);
+            """)
+            self._conn = conn
+        return self._conn
+
+    def blob_path(self, sha256: str, extension: str = "") -> str:
+        return os.path.join(self.blobs_dir, sha256[:2], f"{sha256}{extension.lower()}")
+
+    @staticmethod
+    def _link(blob_path: str, path: str):
+        """Hard-links the blob into place, or copies it if the two paths are on different filesystems."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.link"
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(blob_path, tmp_path)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            shutil.copy2(blob_path, tmp_path)
+        os.replace(tmp_path, path)
+
+    def store(self, src_path: str, sha256: str, path: str, contact_id: str | None = None) -> bool:
+        """
+        Files `src_path` (whose content hashes to `sha256`) under the blob store and links it
+        at `path`. If the content is already stored, `src_path` is discarded and the existing
+        blob is linked instead. Returns True if this content was new.
+        """
+        path = os.path.normpath(path)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT blob_path FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            is_new = row is None or not os.path.exists(row["blob_path"])
+            if is_new:
+                blob_path = self.blob_path(sha256, os.path.splitext(path)[1])
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                shutil.move(src_path, blob_path)
+            else:
+                blob_path = row["blob_path"]
+                os.remove(src_path)
+            self._link(blob_path, path)
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO blobs (sha256, blob_path, size, refcount, created_at) VALUES (?, ?, ?, 0, ?)",
+                        (sha256, blob_path, os.path.getsize(blob_path), time.time()),
+                    )
+                elif is_new:
+                    conn.execute("UPDATE blobs SET blob_path = ? WHERE sha256 = ?", (blob_path, sha256))
+                self._add_link(conn, path, sha256, contact_id)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return is_new
+
+    def _add_link(self, conn: sqlite3.Connection, path: str, sha256: str, contact_id: str | None):
+        previous = conn.execute("SELECT sha256 FROM links WHERE path = ?", (path,)).fetchone()
+        if previous is not None:
+            if previous["sha256"] == sha256:
+                return
+            conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", (previous["sha256"],))
+        conn.execute(
+            "INSERT OR REPLACE INTO links (path, sha256, contact_id) VALUES (?, ?, ?)",
+            (path, sha256, contact_id),
+        )
+        conn.execute("UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?", (sha256,))
+
+    def adopt(self, path: str, contact_id: str | None = None) -> bool:
+        """
+        Brings an existing file under the blob store, replacing it with a link to the blob.
+        Returns True if the file was a duplicate of content already stored (its bytes were freed).
+        """
+        path = os.path.normpath(path)
+        with self._lock:
+            if self._connect().execute("SELECT 1 FROM links WHERE path = ?", (path,)).fetchone():
+                return False
+        staging_path = f"{path}.adopt"
+        os.replace(path, staging_path)
+        try:
+            return not self.store(staging_path, file_sha256(staging_path), path, contact_id)
+        except Exception:
+            if os.path.exists(staging_path):
+                os.replace(staging_path, path)
+            raise
+
+    def _release_links(self, conn: sqlite3.Connection, rows: list[sqlite3.Row]) -> int:
+        """Drops link rows and deletes blobs that are no longer linked. Returns bytes freed."""
+        freed = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for row in rows:
+                conn.execute("DELETE FROM links WHERE path = ?", (row["path"],))
+                conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", (row["sha256"],))
+            # Unlinked blobs are deleted right away, so this only ever finds the ones just released.
+            orphans = conn.execute("SELECT sha256, blob_path, size FROM blobs WHERE refcount <= 0").fetchall()
+            for orphan in orphans:
+                conn.execute("DELETE FROM blobs WHERE sha256 = ?", (orphan["sha256"],))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        for orphan in orphans:
+            try:
+                os.remove(orphan["blob_path"])
+                freed += orphan["size"]
+            except FileNotFoundError:
+                pass
+        return freed
+
+    def release(self, path: str) -> int:
+        """Releases one linked path (the caller removes the file itself). Returns bytes freed."""
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute("SELECT path, sha256 FROM links WHERE path = ?", (os.path.normpath(path),)).fetchall()
+            return self._release_links(conn, rows)
+
+    def release_contact(self, contact_id: str) -> int:
+        """Releases every link belonging to a deleted customer. Returns bytes freed."""
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute("SELECT path, sha256 FROM links WHERE contact_id = ?", (contact_id,)).fetchall()
+            freed = self._release_links(conn, rows)
+        if rows:
+            logger.info(f"Released {len(rows)} image link(s) for contact {contact_id}; freed {freed} bytes")
+        return freed
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            blobs = conn.execute("SELECT COUNT(*) AS count, COALESCE(SUM(size), 0) AS size FROM blobs").fetchone()
+            links = conn.execute(
+                "SELECT COUNT(*) AS count, COALESCE(SUM(b.size), 0) AS size FROM links l JOIN blobs b ON b.sha256 = l.sha256"
+            ).fetchone()
+        return {
+            "blobs": blobs["count"],
+            "blobBytes": blobs["size"],
+            "links": links["count"],
+            "linkedBytes": links["size"],
+        }
+
+
+def find_images(data_dir: str):
+    """Yields (contact ID, path) for every before/after original under the customer data directory."""
+    for contact_id in sorted(os.listdir(data_dir)):
+        images_dir = os.path.join(data_dir, contact_id, "images")
+        if not os.path.isdir(images_dir):
+            continue
+        for service_apt_dir in sorted(os.listdir(images_dir)):
+            for image_type in ("before", "after"):
+                type_dir = os.path.join(images_dir, service_apt_dir, image_type)
+                if not os.path.isdir(type_dir):
+                    continue
+                for filename in sorted(os.listdir(type_dir)):
+                    if filename.lower().endswith(IMAGE_EXTENSIONS):
+                        yield contact_id, os.path.join(type_dir, filename)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Content-addressed photo storage maintenance.")
+    parser.add_argument("--adopt", action="store_true", help="Move existing photos into the blob store, linking duplicates.")
+    parser.add_argument("--data-dir", default=CUSTOMER_DATA_DIR, help="Customer data directory to walk.")
+    parser.add_argument("--blobs-dir", default=DEFAULT_BLOBS_DIR, help="Where blobs and their index are kept.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    store = BlobStore(args.blobs_dir)
+
+    if args.adopt:
+        adopted = duplicates = failed = 0
+        for contact_id, path in find_images(args.data_dir):
+            try:
+                if store.adopt(path, contact_id):
+                    duplicates += 1
+                adopted += 1
+            except OSError as e:
+                failed += 1
+                logger.error(f"Failed to adopt {path}: {e}")
+        logger.info(f"Checked {adopted} photo(s); {duplicates} duplicate(s) replaced by links; {failed} failed.")
+
+    stats = store.stats()
+    logger.info(
+        f"{stats['links']} linked photo(s) backed by {stats['blobs']} blob(s): "
+        f"{stats['blobBytes']} bytes on disk for {stats['linkedBytes']} bytes of photos."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
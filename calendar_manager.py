@@ -1,131 +1,433 @@
+import bisect
+import hashlib
 import json
+import logging
+import math
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import pytz
 import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 CALENDAR_FILE = "calendar.json"
 TIMEZONE = pytz.timezone("America/Los_Angeles")
 BUSINESS_START_HOUR = 7  # 7 AM
-BUSINESS_END_HOUR = 21   # Last slot starts at 8 PM, ends at 9 PM
-APPOINTMENT_DURATION_HOURS = 1
+BUSINESS_END_HOUR = 21   # Every job must be finished by 9 PM
+APPOINTMENT_DURATION_HOURS = 1  # Minimum job length, and the length when panel_count is unknown
+SLOT_INCREMENT_MINUTES = 30     # Jobs start on this grid
+SETUP_MINUTES = 30
+MINUTES_PER_PANEL = 2
+# Crews that can take jobs. Appointments saved before crews existed belong to the first one.
+CREWS = ["crew_1", "crew_2"]
+FIRST_FIT = "first_fit"  # Take the first crew (in CREWS order) that is free
+BEST_FIT = "best_fit"    # Take the free crew whose surrounding gap is tightest, keeping long gaps open
+DAY_START_MINUTE = BUSINESS_START_HOUR * 60
+DAY_END_MINUTE = BUSINESS_END_HOUR * 60
+
+# --- Calendar Store ---
+class CalendarStore:
+    """
+    In-memory index of calendar.json keyed by local (business timezone) date.
+
+    Each appointment is parsed once, when the file is loaded, into a per-day, per-crew
+    list of busy (start minute, end minute) intervals sorted by start. A crew's
+    intervals never overlap, so a free/busy check is one bisect. Every read
+    checks the file's mtime and size and reloads only if the file changed on disk,
+    so edits made outside this process are still picked up.
+
+    Writes go through transaction(), which holds an in-process lock plus an exclusive
+    flock on calendar.json.lock, so several uvicorn workers can book concurrently
+    without double-booking. The file is replaced atomically (temp file, fsync, rename),
+    so readers never see a partial write.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._lock = threading.RLock()
+        self._signature = None
+        self._appointments: list[dict] = []
+        self._by_day: dict = {}
+        self._busy: dict = {}
+        self._reloads = 0
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # The inode changes on every atomic replace, even within one mtime tick.
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _index(self, appointments: list):
+        by_day = {}
+        busy = {}
+        for appt in appointments:
+            try:
+                local_start = datetime.fromisoformat(appt["start_time"]).astimezone(TIMEZONE)
+            except (KeyError, TypeError, ValueError):
+                logger.warning(f"Skipping calendar entry with an invalid start_time: {appt}")
+                continue
+            try:
+                local_end = datetime.fromisoformat(appt["end_time"]).astimezone(TIMEZONE)
+            except (KeyError, TypeError, ValueError):
+                local_end = local_start + timedelta(hours=APPOINTMENT_DURATION_HOURS)
+
+            day = local_start.date()
+            start_minute = local_start.hour * 60 + local_start.minute
+            end_minute = start_minute + max(int((local_end - local_start).total_seconds() // 60), 1)
+            crew = appt.get("crew") or CREWS[0]
+            by_day.setdefault(day, []).append((local_start, appt))
+            busy.setdefault(day, {}).setdefault(crew, []).append((start_minute, end_minute))
+
+        for day_appointments in by_day.values():
+            day_appointments.sort(key=lambda item: item[0])
+        for crews in busy.values():
+            for intervals in crews.values():
+                intervals.sort()
+        self._appointments = appointments
+        self._by_day = by_day
+        self._busy = busy
+
+    def _refresh(self):
+        """Reloads the index if calendar.json changed since it was last read. Caller holds the lock."""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        appointments = []
+        if signature is not None:
+            try:
+                with open(self.path, "r") as f:
+                    appointments = json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                appointments = []
+        self._index(appointments)
+        self._signature = signature
+        self._reloads += 1
+
+    def state(self) -> tuple[int, tuple | None]:
+        """
+        Returns (reload count, file signature) after checking the file for changes.
+        The reload count only moves when the file was changed by someone else (another
+        worker or a manual edit); this process's own saves leave it alone.
+        """
+        with self._lock:
+            self._refresh()
+            return self._reloads, self._signature
+
+    def appointments(self) -> list:
+        """Returns a copy of every appointment, in file order."""
+        with self._lock:
+            self._refresh()
+            return list(self._appointments)
+
+    def for_day(self, target_date: datetime.date) -> list:
+        """Returns the appointments starting on a local date, sorted by start time."""
+        with self._lock:
+            self._refresh()
+            return [appt for _, appt in self._by_day.get(target_date, [])]
+
+    def busy(self, target_date: datetime.date) -> dict:
+        """Returns {crew: sorted busy (start minute, end minute) intervals} for a local date."""
+        with self._lock:
+            self._refresh()
+            return {crew: list(intervals) for crew, intervals in self._busy.get(target_date, {}).items()}
+
+    def busy_by_day(self, first_day: datetime.date, days: int) -> dict:
+        """Returns {date: {crew: busy intervals}} for the dates in the window."""
+        with self._lock:
+            self._refresh()
+            return {
+                day: {crew: list(intervals) for crew, intervals in crews.items()}
+                for day, crews in self._busy.items()
+                if 0 <= (day - first_day).days < days
+            }
+
+    @contextmanager
+    def transaction(self):
+        """
+        Serializes a read-check-write against other threads and other processes.
+        The index is refreshed after the locks are taken, so checks inside the block
+        see every booking committed before it.
+        """
+        with self._lock:
+            with open(self.lock_path, "a") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield self
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def save(self, appointments: list):
+        """
+        Atomically writes the full appointment list and re-indexes it without reading the
+        file back. Call inside transaction() when the write depends on what was read.
+        """
+        with self._lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".calendar-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(appointments, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            if hasattr(os, "O_DIRECTORY"):
+                # Persist the rename itself.
+                dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            self._index(appointments)
+            self._signature = self._file_signature()
+
+
+_store = CalendarStore(CALENDAR_FILE)
 
 # --- Helper Functions ---
 def _load_appointments() -> list:
     """Loads all appointments from the JSON file."""
-    if not os.path.exists(CALENDAR_FILE):
-        return []
-    try:
-        with open(CALENDAR_FILE, "r") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+    return _store.appointments()
 
 def _save_appointments(appointments: list):
     """Saves a list of appointments to the JSON file."""
-    with open(CALENDAR_FILE, "w") as f:
-        json.dump(appointments, f, indent=4)
+    _store.save(appointments)
 
 def get_appointments_for_day(target_date: datetime.date) -> list:
     """
     Returns a list of all appointments scheduled for a specific date, normalized to the business timezone.
     """
-    appointments = _load_appointments()
-    daily_appointments = []
-
-    for appt in appointments:
-        appt_time = datetime.fromisoformat(appt["start_time"])
-        # Normalize to the business's timezone before comparing the date
-        if appt_time.astimezone(TIMEZONE).date() == target_date:
-            daily_appointments.append(appt)
+    return _store.for_day(target_date)
 
-    # Sort appointments by start time
-    daily_appointments.sort(key=lambda x: x["start_time"])
-    return daily_appointments
+def job_duration_minutes(panel_count: int | None = None) -> int:
+    """
+    Returns how long a job takes: setup plus a fixed time per panel, rounded up to the
+    slot grid and never shorter than APPOINTMENT_DURATION_HOURS.
+    """
+    minimum = APPOINTMENT_DURATION_HOURS * 60
+    if not panel_count or panel_count <= 0:
+        return minimum
+    raw = SETUP_MINUTES + panel_count * MINUTES_PER_PANEL
+    return max(minimum, math.ceil(raw / SLOT_INCREMENT_MINUTES) * SLOT_INCREMENT_MINUTES)
 
-def get_available_slots(target_date: datetime.date) -> list[str]:
+def _find_crew(busy: dict, start_minute: int, end_minute: int, crews: list[str], strategy: str = BEST_FIT) -> str | None:
     """
-    Generates a list of available 1-hour appointment slots for a given date
-    within business hours (7 AM - 7 PM PST).
+    Returns a crew that is free for [start_minute, end_minute), or None.
+    `busy` is {crew: sorted non-overlapping intervals} for the day.
     """
-    booked_start_times = {
-        datetime.fromisoformat(appt["start_time"]).astimezone(TIMEZONE)
-        for appt in get_appointments_for_day(target_date)
-    }
+    best_crew = None
+    best_slack = None
+    for crew in crews:
+        intervals = busy.get(crew, [])
+        # First job that starts at or after our end; only the one before it can overlap.
+        position = bisect.bisect_left(intervals, (end_minute,))
+        previous_end = intervals[position - 1][1] if position else DAY_START_MINUTE
+        if previous_end > start_minute:
+            continue
+        if strategy == FIRST_FIT:
+            return crew
+        next_start = intervals[position][0] if position < len(intervals) else DAY_END_MINUTE
+        slack = (start_minute - previous_end) + (next_start - end_minute)
+        if best_slack is None or slack < best_slack:
+            best_crew, best_slack = crew, slack
+    return best_crew
 
-    available_slots = []
-    
-    # Start from the beginning of the business day in the specified timezone
-    day_start = TIMEZONE.localize(datetime(
-        target_date.year, target_date.month, target_date.day, BUSINESS_START_HOUR
-    ))
+def _day_slot_times(target_date: datetime.date, busy: dict, duration: int) -> tuple[list[float], list[str]]:
+    """
+    Returns (timestamps, ISO strings) of the start times on the slot grid where at least
+    one crew is free for `duration` minutes, in order. Past slots are not filtered here.
+    """
+    timestamps = []
+    isos = []
 
-    # Iterate through all possible slots in the day
-    for i in range(BUSINESS_START_HOUR, BUSINESS_END_HOUR):
+    # Iterate through the slot grid of the day, in the business timezone
+    for start_minute in range(DAY_START_MINUTE, DAY_END_MINUTE - duration + 1, SLOT_INCREMENT_MINUTES):
+        if _find_crew(busy, start_minute, start_minute + duration, CREWS, FIRST_FIT) is None:
+            continue
         slot_time = TIMEZONE.localize(datetime(
-            target_date.year, target_date.month, target_date.day, i
+            target_date.year, target_date.month, target_date.day, start_minute // 60, start_minute % 60
         ))
+        timestamps.append(slot_time.timestamp())
+        isos.append(slot_time.isoformat())
+
+    return timestamps, isos
+
+
+class AvailabilityCache:
+    """
+    Computed availability per (local date, job duration).
+
+    Entries are built on first request and dropped only for the day a booking or
+    cancellation touched, or all at once when calendar.json is changed by another
+    process. Past slots are trimmed on read with a bisect, so cached days stay
+    correct as time passes without being recomputed.
+    """
+
+    def __init__(self, store: CalendarStore):
+        self._store = store
+        self._lock = threading.Lock()
+        self._days: dict = {}
+        self._reloads = None
+
+    def slots(self, first_day: datetime.date, days: int, duration: int, now: datetime) -> dict:
+        """Returns {YYYY-MM-DD: [ISO start times after `now`]} for `days` days from `first_day`."""
+        window = [first_day + timedelta(days=i) for i in range(days)]
+        with self._lock:
+            reloads, _ = self._store.state()
+            if reloads != self._reloads:
+                self._days.clear()
+                self._reloads = reloads
+            else:
+                # Days that have passed will never be asked for again.
+                today = now.date()
+                for key in [key for key in self._days if key[0] < today]:
+                    del self._days[key]
+
+            missing = [day for day in window if (day, duration) not in self._days]
+            if missing:
+                busy_by_day = self._store.busy_by_day(missing[0], (missing[-1] - missing[0]).days + 1)
+                for day in missing:
+                    self._days[(day, duration)] = _day_slot_times(day, busy_by_day.get(day, {}), duration)
+
+            cutoff = now.timestamp()
+            available = {}
+            for day in window:
+                timestamps, isos = self._days[(day, duration)]
+                available[day.isoformat()] = isos[bisect.bisect_right(timestamps, cutoff):]
+            return available
+
+    def invalidate(self, target_date: datetime.date):
+        """Drops every cached entry for a date after a booking or cancellation on it."""
+        with self._lock:
+            for key in [key for key in self._days if key[0] == target_date]:
+                del self._days[key]
+
 
-        # Check if the slot is in the future and not already booked
-        if slot_time > datetime.now(TIMEZONE) and slot_time not in booked_start_times:
-            available_slots.append(slot_time.isoformat())
-            
-    return available_slots
+_availability = AvailabilityCache(_store)
 
-def get_bulk_available_slots(days_in_advance: int) -> dict:
+def get_available_slots(target_date: datetime.date, panel_count: int | None = None) -> list[str]:
+    """
+    Generates a list of available start times for a given date within business hours,
+    for a job sized by `panel_count`. A slot is available if any crew can take the whole job.
+    """
+    slots = _availability.slots(target_date, 1, job_duration_minutes(panel_count), datetime.now(TIMEZONE))
+    return slots[target_date.isoformat()]
+
+def get_bulk_available_slots(days_in_advance: int, panel_count: int | None = None) -> dict:
     """
     Generates a dictionary of available slots for a specified number of days in advance.
     The keys are dates (YYYY-MM-DD) and values are lists of available ISO time strings.
+    Served from the availability cache; only days changed since the last call are recomputed.
     """
-    all_available_slots = {}
-    today = datetime.now(TIMEZONE).date()
-
-    for i in range(days_in_advance):
-        target_date = today + timedelta(days=i)
-        date_str = target_date.isoformat()
-        all_available_slots[date_str] = get_available_slots(target_date)
+    now = datetime.now(TIMEZONE)
+    return _availability.slots(now.date(), days_in_advance, job_duration_minutes(panel_count), now)
 
-    return all_available_slots
+def availability_etag(days_in_advance: int, panel_count: int | None = None) -> str:
+    """
+    Returns an ETag for get_bulk_available_slots(days_in_advance, panel_count) without computing it.
+    It changes when calendar.json changes and whenever a slot boundary passes (so expired slots
+    roll off), and is the same in every worker process serving the same file.
+    """
+    now = datetime.now(TIMEZONE)
+    _, signature = _store.state()
+    slot_bucket = int(now.timestamp() // (SLOT_INCREMENT_MINUTES * 60))
+    key = f"{signature}|{now.date()}|{slot_bucket}|{days_in_advance}|{job_duration_minutes(panel_count)}"
+    return f'"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
 
-def book_appointment(contact_id: str, start_time_iso: str) -> (bool, str):
+def book_appointment(
+    contact_id: str,
+    start_time_iso: str,
+    panel_count: int | None = None,
+    crew: str | None = None,
+    strategy: str = BEST_FIT,
+) -> (bool, str):
     """
-    Books an appointment for a contact if the slot is available.
-    This function now contains more robust, atomic-like checking.
+    Books an appointment for a contact if a crew is free for the whole job.
+    The job length comes from `panel_count`; pass `crew` to require a specific crew,
+    otherwise one is picked with `strategy` (BEST_FIT or FIRST_FIT).
+    The availability check and the write run in one calendar transaction, so concurrent
+    bookings (across threads or worker processes) cannot both take the same crew.
     """
     try:
         start_time = datetime.fromisoformat(start_time_iso).astimezone(TIMEZONE)
     except ValueError:
         return False, "Invalid ISO date format provided."
+    if crew is not None and crew not in CREWS:
+        return False, f"Unknown crew: {crew}."
+
+    duration = job_duration_minutes(panel_count)
+    start_minute = start_time.hour * 60 + start_time.minute
+    end_minute = start_minute + duration
 
     # --- Direct Booking Validation ---
 
-    # 1. Check if it's a valid time within business hours (on the hour)
-    if start_time.minute != 0 or start_time.second != 0 or start_time.microsecond != 0:
-        return False, "Appointments can only be booked on the hour."
-    if not (BUSINESS_START_HOUR <= start_time.hour < BUSINESS_END_HOUR):
+    # 1. Check that the job starts on the slot grid and fits within business hours
+    if start_minute % SLOT_INCREMENT_MINUTES or start_time.second != 0 or start_time.microsecond != 0:
+        return False, f"Appointments can only start on a {SLOT_INCREMENT_MINUTES}-minute boundary."
+    if start_minute < DAY_START_MINUTE or end_minute > DAY_END_MINUTE:
         return False, "The requested time is outside of business hours."
     if start_time < datetime.now(TIMEZONE):
         return False, "Cannot book appointments in the past."
 
-    # 2. Load the most current appointment data and check for a direct collision
-    appointments = _load_appointments()
-    is_booked = any(
-        datetime.fromisoformat(appt["start_time"]).astimezone(TIMEZONE) == start_time
-        for appt in appointments
-    )
+    with _store.transaction():
+        # 2. Find a crew that is free for the whole job
+        assigned_crew = _find_crew(
+            _store.busy(start_time.date()), start_minute, end_minute, [crew] if crew else CREWS, strategy
+        )
+        if assigned_crew is None:
+            return False, "The requested time slot is not available."
 
-    if is_booked:
-        return False, "The requested time slot is not available."
+        # 3. If all checks pass, create and save the appointment
+        new_appointment = {
+            "contact_id": contact_id,
+            "start_time": start_time.isoformat(),
+            "end_time": (start_time + timedelta(minutes=duration)).isoformat(),
+            "crew": assigned_crew,
+            "panel_count": panel_count,
+            "booked_at": datetime.now(TIMEZONE).isoformat()
+        }
 
-    # 3. If all checks pass, create and save the appointment
-    new_appointment = {
-        "contact_id": contact_id,
-        "start_time": start_time.isoformat(),
-        "end_time": (start_time + timedelta(hours=APPOINTMENT_DURATION_HOURS)).isoformat(),
-        "booked_at": datetime.now(TIMEZONE).isoformat()
-    }
+        appointments = _load_appointments()
+        appointments.append(new_appointment)
+        _save_appointments(appointments)
+
+    _availability.invalidate(start_time.date())
+    return True, f"Appointment successfully booked for {contact_id} with {assigned_crew} at {start_time.strftime('%Y-%m-%d %I:%M %p %Z')}."
+
+def cancel_appointment(contact_id: str, start_time_iso: str) -> (bool, str):
+    """Cancels a contact's appointment at the given start time and frees the slot."""
+    try:
+        start_time = datetime.fromisoformat(start_time_iso).astimezone(TIMEZONE)
+    except ValueError:
+        return False, "Invalid ISO date format provided."
 
-    appointments.append(new_appointment)
-    _save_appointments(appointments)
+    with _store.transaction():
+        # The day index holds the same dicts as the full list, so matches are removed by identity.
+        cancelled = {
+            id(appt) for appt in _store.for_day(start_time.date())
+            if appt.get("contact_id") == contact_id
+            and datetime.fromisoformat(appt["start_time"]).astimezone(TIMEZONE) == start_time
+        }
+        if not cancelled:
+            return False, "No matching appointment was found."
+        _save_appointments([appt for appt in _load_appointments() if id(appt) not in cancelled])
 
-    return True, f"Appointment successfully booked for {contact_id} at {start_time.strftime('%Y-%m-%d %I:%M %p %Z')}." 
\ No newline at end of file
+    _availability.invalidate(start_time.date())
+    return True, f"Appointment for {contact_id} at {start_time.strftime('%Y-%m-%d %I:%M %p %Z')} was cancelled."
@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+import threading
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelMap:
+    """
+    Persistent Discord channel_id -> contact_id map.
+
+    The map lives in a small JSON file so slash commands can resolve their customer with a
+    single dict lookup. It is only rebuilt from the customer files when the map file is
+    missing or cannot be parsed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._map: dict[int, str] = {}
+
+    def load(self, customers: Iterable[dict]) -> int:
+        """
+        Loads the map from disk. If the file is missing or corrupt, rebuilds it from the
+        given customer documents and saves it. Returns the number of mapped channels.
+        """
+        try:
+            with open(self.path, "r") as f:
+                raw = json.load(f)
+            if not isinstance(raw, dict):
+                raise ValueError("channel map must be a JSON object")
+            channel_map = {int(channel_id): contact_id for channel_id, contact_id in raw.items()}
+        except FileNotFoundError:
+            logger.info(f"Channel map {self.path} not found. Rebuilding from customer data.")
+            return self.rebuild(customers)
+        except (json.JSONDecodeError, ValueError, TypeError) as e:
+            logger.warning(f"Channel map {self.path} is corrupt ({e}). Rebuilding from customer data.")
+            return self.rebuild(customers)
+
+        with self._lock:
+            self._map = channel_map
+        return len(channel_map)
+
+    def rebuild(self, customers: Iterable[dict]) -> int:
+        """Rebuilds the map from customer documents, skipping channels that were archived."""
+        channel_map = {}
+        for data in customers:
+            channel_id = data.get("discord_channel_id")
+            contact_id = data.get("client_id")
+            if channel_id and contact_id and not data.get("archived_in_thread_id"):
+                channel_map[int(channel_id)] = contact_id
+
+        with self._lock:
+            self._map = channel_map
+            self._save()
+        return len(channel_map)
+
+    def _save(self):
+        """Writes the map to a temp file and renames it over the old one. Caller holds the lock."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({str(channel_id): contact_id for channel_id, contact_id in self._map.items()}, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def get(self, channel_id: int) -> str | None:
+        return self._map.get(channel_id)
+
+    def set(self, channel_id: int, contact_id: str):
+        with self._lock:
+            if self._map.get(channel_id) == contact_id:
+                return
+            self._map[channel_id] = contact_id
+            self._save()
+
+    def remove(self, channel_id: int):
+        with self._lock:
+            if self._map.pop(channel_id, None) is not None:
+                self._save()
+
+    def remove_contact(self, contact_id: str):
+        """Removes every channel mapped to the given contact."""
+        with self._lock:
+            stale = [channel_id for channel_id, mapped in self._map.items() if mapped == contact_id]
+            for channel_id in stale:
+                del self._map[channel_id]
+            if stale:
+                self._save()
@@ -0,0 +1,357 @@
+import asyncio
+import bisect
+import copy
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from datetime import datetime
+from typing import Callable
+
+import file_io
+
+logger = logging.getLogger(__name__)
+
+CUSTOMER_FILE_NAME = "customer_data.json"
+VERSION_FIELD = "record_version"
+
+
+class ConcurrentUpdateError(Exception):
+    """Raised when a write was based on an older version of the customer document."""
+
+    def __init__(self, contact_id: str, expected_version: int, current_version: int):
+        super().__init__(
+            f"Customer {contact_id} was changed by someone else "
+            f"(expected version {expected_version}, found {current_version})."
+        )
+        self.contact_id = contact_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+
+def write_json_atomic(path: str, data, indent: int = 4):
+    """
+    Writes JSON to a temp file in the same directory, fsyncs it and renames it over `path`,
+    so readers see either the old or the new document, never a truncated one.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _job_summary(data: dict) -> dict | None:
+    """Builds the /jobs row for a customer, or None if they have no service history yet."""
+    p_info = data.get("personal_info", {})
+    s_history = data.get("service_history", [])
+    if not p_info or not s_history:
+        return None
+    return {
+        "contactId": data.get("client_id"),
+        "fullName": f"{p_info.get('first_name', '')} {p_info.get('last_name', '')}".strip(),
+        "address": p_info.get("address"),
+        "phoneNumber": p_info.get("phone_number"),
+        "lastServiceDate": s_history[-1].get("service_date"),
+    }
+
+
+def _job_search_text(job: dict) -> str:
+    return " ".join(
+        value for value in (
+            (job.get("fullName") or "").lower(),
+            (job.get("address") or "").lower(),
+            re.sub(r'\D', '', job.get("phoneNumber") or ""),
+        ) if value
+    )
+
+
+def parse_job_cursor(cursor: str) -> tuple[str, str]:
+    """Splits a "<lastServiceDate>|<contactId>" cursor into its sort key. Raises ValueError if malformed."""
+    service_date, sep, contact_id = cursor.rpartition("|")
+    if not sep or not contact_id:
+        raise ValueError(f"Malformed jobs cursor: {cursor}")
+    return (service_date, contact_id)
+
+
+class CustomerRepository:
+    """
+    In-memory view of every customer_data.json file under the customer data directory.
+
+    The directory is scanned once by load(). After that, every code path that writes a
+    customer file calls upsert() (or remove() when the folder is deleted) so that the
+    indexes stay current and lookups never have to touch the disk.
+
+    Customers with a service history are also kept in a job index sorted by
+    (last service date, contact ID), so a page of /jobs is a bisect plus a short walk.
+    Channel and phone lookups are not indexed here: channels resolve through ChannelMap and
+    phone numbers through CustomerSearchIndex, both built from customers().
+
+    Writes should go through update() or save(): they serialize per contact with an
+    asyncio lock, stamp a record_version, write the file atomically off the event loop
+    and then refresh the indexes.
+
+    With a CustomerStore, SQLite is the only source of truth: load() reads from it (importing
+    the customer_data tree only while the database is empty), update() reads the current
+    document from it and every commit writes it before exporting the customer_data.json file
+    the dashboard reads. A failed export is logged and does not fail the write, so the indexes
+    always follow the database. Edits made directly to those files are not picked up; re-import
+    them with `python customer_store.py --migrate` while the server is stopped.
+
+    Listeners added with add_listener() are called as listener(contact_id, data) after every
+    upsert() and with data=None after remove(). load() does not notify them; build derived
+    indexes from customers() after loading.
+    """
+
+    def __init__(self, data_dir: str, store=None):
+        self.data_dir = data_dir
+        self.store = store
+        self._lock = threading.RLock()
+        self._customers: dict[str, dict] = {}
+        self._job_keys: list[tuple[str, str]] = []
+        self._jobs: dict[str, tuple[tuple[str, str], dict, str]] = {}
+        self._write_locks: dict[str, asyncio.Lock] = {}
+        self._listeners: list[Callable[[str, dict | None], None]] = []
+
+    def customer_file(self, contact_id: str) -> str:
+        return os.path.join(self.data_dir, contact_id, CUSTOMER_FILE_NAME)
+
+    def load(self) -> int:
+        """Reads every customer and rebuilds every index. Returns the number of customers loaded."""
+        customers = {}
+        source = self.data_dir
+        if self.store is not None and self.store.count():
+            customers = {data["client_id"]: data for data in self.store.all()}
+            source = self.store.db_path
+        elif os.path.isdir(self.data_dir):
+            for contact_id in os.listdir(self.data_dir):
+                customer_file = self.customer_file(contact_id)
+                if not os.path.isfile(customer_file):
+                    continue
+                try:
+                    with open(customer_file, "r") as f:
+                        data = json.load(f)
+                except (json.JSONDecodeError, IOError) as e:
+                    logger.warning(f"Skipping unreadable customer file {customer_file}: {e}")
+                    continue
+                customers[data.get("client_id") or contact_id] = data
+            if self.store is not None and customers:
+                for contact_id, data in customers.items():
+                    data.setdefault("client_id", contact_id)
+                self.store.put_many(customers.values())
+                logger.info(f"Imported {len(customers)} customers from {self.data_dir} into the customer store")
+
+        with self._lock:
+            self._customers = {}
+            self._job_keys = []
+            self._jobs = {}
+            for data in customers.values():
+                self._index(data)
+
+        logger.info(f"Customer repository loaded {len(customers)} customers from {source}")
+        return len(customers)
+
+    def _index(self, data: dict):
+        contact_id = data.get("client_id")
+        if not contact_id:
+            return
+        self._customers[contact_id] = data
+
+        job = _job_summary(data)
+        if job:
+            key = (job["lastServiceDate"] or "", contact_id)
+            bisect.insort(self._job_keys, key)
+            self._jobs[contact_id] = (key, job, _job_search_text(job))
+
+    def _unindex(self, contact_id: str) -> dict | None:
+        data = self._customers.pop(contact_id, None)
+        if data is None:
+            return None
+
+        indexed_job = self._jobs.pop(contact_id, None)
+        if indexed_job:
+            position = bisect.bisect_left(self._job_keys, indexed_job[0])
+            if position < len(self._job_keys) and self._job_keys[position] == indexed_job[0]:
+                del self._job_keys[position]
+        return data
+
+    def add_listener(self, listener: Callable[[str, dict | None], None]):
+        """Registers a callback for customer changes. Listeners must treat the document as read-only."""
+        self._listeners.append(listener)
+
+    def _notify(self, contact_id: str, data: dict | None):
+        for listener in self._listeners:
+            try:
+                listener(contact_id, data)
+            except Exception as e:
+                logger.error(f"Customer repository listener failed for {contact_id}: {e}")
+
+    def upsert(self, customer_data: dict):
+        """Records a customer document that has just been written to disk."""
+        contact_id = customer_data.get("client_id")
+        if not contact_id:
+            return
+        data = copy.deepcopy(customer_data)
+        with self._lock:
+            self._unindex(contact_id)
+            self._index(data)
+        self._notify(contact_id, data)
+
+    async def remove(self, contact_id: str):
+        """Drops a customer whose folder has been deleted, waiting for any write in progress."""
+        async with self._write_lock(contact_id):
+            with self._lock:
+                self._unindex(contact_id)
+            if self.store is not None:
+                await file_io.run(self.store.delete, contact_id)
+        self._write_locks.pop(contact_id, None)
+        self._notify(contact_id, None)
+
+    # --- Writes ---
+    def _write_lock(self, contact_id: str) -> asyncio.Lock:
+        lock = self._write_locks.get(contact_id)
+        if lock is None:
+            lock = self._write_locks[contact_id] = asyncio.Lock()
+        return lock
+
+    def _read_file(self, contact_id: str) -> dict | None:
+        if self.store is not None:
+            data = self.store.get(contact_id)
+            if data is not None:
+                return data
+        try:
+            with open(self.customer_file(contact_id), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _commit(self, contact_id: str, customer_data: dict, current: dict | None, expected_version: int | None) -> dict:
+        """Checks the version, stamps the document and writes it. Runs in a worker thread."""
+        current_version = (current or {}).get(VERSION_FIELD, 0)
+        if expected_version is not None and expected_version != current_version:
+            raise ConcurrentUpdateError(contact_id, expected_version, current_version)
+        customer_data[VERSION_FIELD] = current_version + 1
+        customer_data["updated_at"] = datetime.utcnow().isoformat()
+        if self.store is None:
+            write_json_atomic(self.customer_file(contact_id), customer_data)
+            return customer_data
+
+        self.store.put(customer_data)
+        # The per-customer JSON file is only an export for the dashboard. The write has already
+        # committed, so a failed export is logged and left for `customer_store.py --export`.
+        try:
+            write_json_atomic(self.customer_file(contact_id), customer_data)
+        except OSError as e:
+            logger.error(f"Saved customer {contact_id} but failed to export {self.customer_file(contact_id)}: {e}")
+        return customer_data
+
+    async def update(
+        self,
+        contact_id: str,
+        mutate: Callable[[dict], dict | None],
+        expected_version: int | None = None,
+    ) -> dict:
+        """
+        Read-modify-write of one customer document. `mutate` receives the current document
+        from disk and changes it in place (or returns a replacement); any exception it raises
+        aborts the write. Raises FileNotFoundError if the customer has no file and
+        ConcurrentUpdateError if `expected_version` is given and no longer current.
+        Returns a copy of the stored document.
+        """
+        async with self._write_lock(contact_id):
+            current = await file_io.run(self._read_file, contact_id)
+            if current is None:
+                raise FileNotFoundError(f"Customer file not found for contact ID: {contact_id}")
+            customer_data = copy.deepcopy(current)
+            customer_data = mutate(customer_data) or customer_data
+            stored = await file_io.run(self._commit, contact_id, customer_data, current, expected_version)
+            self.upsert(stored)
+            return copy.deepcopy(stored)
+
+    async def save(self, customer_data: dict, expected_version: int | None = None) -> dict:
+        """
+        Writes a whole customer document, creating the file if needed, with the same locking
+        and versioning as update(). Returns a copy of the stored document.
+        """
+        contact_id = customer_data["client_id"]
+        async with self._write_lock(contact_id):
+            current = await file_io.run(self._read_file, contact_id)
+            stored = await file_io.run(self._commit, contact_id, copy.deepcopy(customer_data), current, expected_version)
+            self.upsert(stored)
+            return copy.deepcopy(stored)
+
+    def get(self, contact_id: str) -> dict | None:
+        """Returns a copy of the customer document, or None if the contact is unknown."""
+        with self._lock:
+            data = self._customers.get(contact_id)
+            return copy.deepcopy(data) if data is not None else None
+
+    def __contains__(self, contact_id: str) -> bool:
+        return contact_id in self._customers
+
+    def __len__(self) -> int:
+        return len(self._customers)
+
+    def contact_ids(self) -> list[str]:
+        with self._lock:
+            return list(self._customers)
+
+    def customers(self) -> list[dict]:
+        """
+        Returns the stored customer documents without copying them.
+        Callers must treat the result as read-only.
+        """
+        with self._lock:
+            return list(self._customers.values())
+
+    def jobs(
+        self,
+        limit: int | None,
+        cursor: str | None = None,
+        search: str | None = None,
+        start: str | None = None,
+        end: str | None = None,
+    ) -> tuple[list[dict], str | None]:
+        """
+        Returns one page of jobs, newest service first, and the cursor for the next page
+        (None on the last page). A `limit` of None returns every matching job.
+
+        `cursor` is the value returned with the previous page. `search` matches name, address
+        or phone number (case-insensitive substring). `start`/`end` bound the last service
+        date; both are ISO dates or datetimes and a date-only `end` includes the whole day.
+        """
+        needle = (search or "").strip().lower()
+        digits = re.sub(r'\D', '', needle)
+
+        with self._lock:
+            keys = self._job_keys
+            low = bisect.bisect_left(keys, (start,)) if start else 0
+            # "\uffff" sorts after any time suffix, so an end date includes that whole day.
+            high = bisect.bisect_right(keys, (end + "\uffff",)) if end else len(keys)
+            if cursor:
+                high = min(high, bisect.bisect_left(keys, parse_job_cursor(cursor)))
+
+            page = []
+            position = high - 1
+            while position >= low and (limit is None or len(page) < limit):
+                key = keys[position]
+                _, job, search_text = self._jobs[key[1]]
+                position -= 1
+                if needle and needle not in search_text and not (digits and len(digits) >= 3 and digits in search_text):
+                    continue
+                page.append(dict(job))
+
+            next_cursor = None
+            if limit is not None and len(page) == limit and position >= low:
+                last = page[-1]
+                next_cursor = f"{last['lastServiceDate'] or ''}|{last['contactId']}"
+        return page, next_cursor
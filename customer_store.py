@@ -0,0 +1,273 @@
+"""
+SQLite store for customer records.
+
+Each customer document is split across three tables: customers (contact and Discord
+fields), services (one row per service_history entry) and membership (membership_info).
+The Discord channel, phone and service date columns are indexed for ad-hoc queries; every
+table also keeps its part of the original JSON, so a document reads back exactly as it was written.
+
+Once the database has rows it is the only source of truth. customer_data/<id>/customer_data.json
+files are still written for the dashboard on a best-effort basis and can be regenerated with
+--export, but they are never read back on their own: after editing them by hand, stop the server and run --migrate.
+
+One-time import of an existing customer_data tree (also done automatically on first start):
+    python customer_store.py --migrate [--data-dir customer_data]
+Write every customer back out in the per-customer JSON layout:
+    python customer_store.py --export [--data-dir customer_data]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+from typing import Iterable
+
+from customer_repository import CUSTOMER_FILE_NAME, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join("bot_data", "customers.sqlite")
+CUSTOMER_DATA_DIR = "customer_data"
+
+
+def phone_key(phone: str | None) -> str:
+    """Last 10 digits of a phone number, matching CustomerRepository's phone index."""
+    if not phone:
+        return ""
+    return re.sub(r'\D', '', phone)[-10:]
+
+
+class CustomerStore:
+    """
+    Customer documents in SQLite (WAL mode). All methods are blocking; call them from a
+    worker thread (file_io.run) when on the event loop.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS customers (
+                    contact_id TEXT PRIMARY KEY,
+                    first_name TEXT,
+                    last_name TEXT,
+                    email TEXT,
+                    phone TEXT,
+                    phone_key TEXT,
+                    address TEXT,
+                    city TEXT,
+                    source TEXT,
+                    discord_channel_id INTEGER,
+                    archived_in_thread_id INTEGER,
+                    record_version INTEGER,
+                    created_at TEXT,
+                    updated_at TEXT,
+                    document TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_customers_discord_channel_id ON customers (discord_channel_id);
+                CREATE INDEX IF NOT EXISTS idx_customers_phone_key ON customers (phone_key);
+
+                CREATE TABLE IF NOT EXISTS services (
+                    contact_id TEXT NOT NULL REFERENCES customers (contact_id) ON DELETE CASCADE,
+                    position INTEGER NOT NULL,
+                    service_date TEXT,
+                    follow_up_date TEXT,
+                    quote_amount REAL,
+                    status TEXT,
+                    document TEXT NOT NULL,
+                    PRIMARY KEY (contact_id, position)
+                );
+                CREATE INDEX IF NOT EXISTS idx_services_service_date ON services (service_date);
+
+                CREATE TABLE IF NOT EXISTS membership (
+                    contact_id TEXT PRIMARY KEY REFERENCES customers (contact_id) ON DELETE CASCADE,
+                    status TEXT,
+                    quoted_price REAL,
+                    plan_basis_months INTEGER,
+                    invite_sent_date TEXT,
+                    document TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_membership_status ON membership (status);
+            """)
+            self._conn = conn
+        return self._conn
+
+    # --- Writes ---
+    def _put(self, conn: sqlite3.Connection, customer_data: dict):
+        """Replaces one customer's rows. Caller owns the transaction."""
+        contact_id = customer_data["client_id"]
+        p_info = customer_data.get("personal_info") or {}
+        # The nested parts live in their own tables; the base document keeps a placeholder so
+        # the key order is unchanged when the document is put back together.
+        base = {
+            key: (None if key in ("service_history", "membership_info") else value)
+            for key, value in customer_data.items()
+        }
+        # Deleting the old row cascades to its services and membership rows.
+        conn.execute("DELETE FROM customers WHERE contact_id = ?", (contact_id,))
+        conn.execute(
+            "INSERT INTO customers (contact_id, first_name, last_name, email, phone, phone_key, address, city, "
+            "source, discord_channel_id, archived_in_thread_id, record_version, created_at, updated_at, document) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                contact_id, p_info.get("first_name"), p_info.get("last_name"), p_info.get("email"),
+                p_info.get("phone_number"), phone_key(p_info.get("phone_number")), p_info.get("address"),
+                p_info.get("city"), customer_data.get("source"), customer_data.get("discord_channel_id"),
+                customer_data.get("archived_in_thread_id"), customer_data.get("record_version"),
+                customer_data.get("created_at"), customer_data.get("updated_at"), json.dumps(base),
+            ),
+        )
+
+        for position, service in enumerate(customer_data.get("service_history") or []):
+            conn.execute(
+                "INSERT INTO services (contact_id, position, service_date, follow_up_date, quote_amount, status, document) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    contact_id, position, service.get("service_date"), service.get("follow_up_date"),
+                    service.get("quote_amount"), service.get("status"), json.dumps(service),
+                ),
+            )
+
+        membership = customer_data.get("membership_info")
+        if membership is not None:
+            conn.execute(
+                "INSERT INTO membership (contact_id, status, quoted_price, plan_basis_months, invite_sent_date, document) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    contact_id, membership.get("status"), membership.get("quoted_price"),
+                    membership.get("plan_basis_months"), membership.get("invite_sent_date"), json.dumps(membership),
+                ),
+            )
+
+    def put(self, customer_data: dict):
+        """Stores (or replaces) one customer document."""
+        self.put_many([customer_data])
+
+    def put_many(self, customers: Iterable[dict]) -> int:
+        """Stores several customer documents in one transaction. Returns the number stored."""
+        count = 0
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for customer_data in customers:
+                    self._put(conn, customer_data)
+                    count += 1
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return count
+
+    def delete(self, contact_id: str):
+        with self._lock:
+            self._connect().execute("DELETE FROM customers WHERE contact_id = ?", (contact_id,))
+
+    # --- Reads ---
+    def _assemble(self, conn: sqlite3.Connection, row: sqlite3.Row) -> dict:
+        document = json.loads(row["document"])
+        if "service_history" in document:
+            document["service_history"] = [
+                json.loads(service["document"]) for service in conn.execute(
+                    "SELECT document FROM services WHERE contact_id = ? ORDER BY position", (row["contact_id"],)
+                )
+            ]
+        if "membership_info" in document:
+            membership = conn.execute("SELECT document FROM membership WHERE contact_id = ?", (row["contact_id"],)).fetchone()
+            document["membership_info"] = json.loads(membership["document"]) if membership else None
+        return document
+
+    def get(self, contact_id: str) -> dict | None:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT contact_id, document FROM customers WHERE contact_id = ?", (contact_id,)).fetchone()
+            return self._assemble(conn, row) if row is not None else None
+
+    def all(self) -> list[dict]:
+        """Returns every customer document, reading each table once."""
+        with self._lock:
+            conn = self._connect()
+            documents = {row["contact_id"]: json.loads(row["document"]) for row in conn.execute("SELECT contact_id, document FROM customers")}
+            services: dict[str, list] = {}
+            for row in conn.execute("SELECT contact_id, document FROM services ORDER BY contact_id, position"):
+                services.setdefault(row["contact_id"], []).append(json.loads(row["document"]))
+            memberships = {row["contact_id"]: json.loads(row["document"]) for row in conn.execute("SELECT contact_id, document FROM membership")}
+
+        for contact_id, document in documents.items():
+            if "service_history" in document:
+                document["service_history"] = services.get(contact_id, [])
+            if "membership_info" in document:
+                document["membership_info"] = memberships.get(contact_id)
+        return list(documents.values())
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM customers").fetchone()[0]
+
+    # --- Migration and export ---
+    def migrate_from_tree(self, data_dir: str = CUSTOMER_DATA_DIR) -> int:
+        """Imports every customer_data.json under `data_dir`. Returns the number imported."""
+        customers = []
+        if os.path.isdir(data_dir):
+            for contact_id in sorted(os.listdir(data_dir)):
+                customer_file = os.path.join(data_dir, contact_id, CUSTOMER_FILE_NAME)
+                if not os.path.isfile(customer_file):
+                    continue
+                try:
+                    with open(customer_file, "r") as f:
+                        data = json.load(f)
+                except (json.JSONDecodeError, IOError) as e:
+                    logger.warning(f"Skipping unreadable customer file {customer_file}: {e}")
+                    continue
+                data.setdefault("client_id", contact_id)
+                customers.append(data)
+        count = self.put_many(customers)
+        logger.info(f"Imported {count} customers from {data_dir} into {self.db_path}")
+        return count
+
+    def export_to_tree(self, data_dir: str = CUSTOMER_DATA_DIR) -> int:
+        """Writes every customer back out as <data_dir>/<id>/customer_data.json. Returns the number written."""
+        customers = self.all()
+        for customer_data in customers:
+            customer_dir = os.path.join(data_dir, customer_data["client_id"])
+            os.makedirs(customer_dir, exist_ok=True)
+            write_json_atomic(os.path.join(customer_dir, CUSTOMER_FILE_NAME), customer_data)
+        logger.info(f"Exported {len(customers)} customers from {self.db_path} to {data_dir}")
+        return len(customers)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Import or export the SQLite customer store.")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--migrate", action="store_true", help="Import customer_data/<id>/customer_data.json files.")
+    action.add_argument("--export", action="store_true", help="Write every customer out as customer_data/<id>/customer_data.json.")
+    parser.add_argument("--data-dir", default=CUSTOMER_DATA_DIR, help="Customer data directory.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path of the SQLite database.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    store = CustomerStore(args.db)
+    if args.migrate:
+        store.migrate_from_tree(args.data_dir)
+    else:
+        store.export_to_tree(args.data_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
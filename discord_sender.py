@@ -0,0 +1,134 @@
+import asyncio
+import collections
+import logging
+import time
+from dataclasses import dataclass, field
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+MESSAGE_CHAR_LIMIT = 2000
+MERGE_SEPARATOR = "\n\n"
+# Discord allows 5 messages per 5 seconds in a channel and 50 requests a second per bot.
+# Staying under both means sends are paced here instead of being bounced with 429s.
+CHANNEL_RATE = (5, 5.0)
+GLOBAL_RATE = (40, 1.0)
+
+
+class RateBucket:
+    """Sliding-window limiter: at most `limit` acquisitions in any `period` seconds."""
+
+    def __init__(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self._times: collections.deque[float] = collections.deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._times and now - self._times[0] >= self.period:
+                    self._times.popleft()
+                if len(self._times) < self.limit:
+                    self._times.append(now)
+                    return
+                await asyncio.sleep(self.period - (now - self._times[0]))
+
+    @property
+    def idle(self) -> bool:
+        now = time.monotonic()
+        return not self._times or now - self._times[-1] >= self.period
+
+
+@dataclass
+class _Outgoing:
+    content: str | None
+    kwargs: dict
+    merge: bool
+    futures: list[asyncio.Future] = field(default_factory=list)
+
+
+class DiscordSendScheduler:
+    """
+    Central outbound queue for bot messages.
+
+    Each channel has its own FIFO queue and worker, so messages to one channel keep their
+    order while different channels are sent to concurrently (at most `concurrency` sends in
+    flight). Before each send the worker waits for the channel's rate bucket and the global
+    one. Plain-text messages queued back to back for the same channel are merged into one
+    message when they fit; pass merge=False for a message that must stand alone (e.g. an
+    address meant to be copied on its own).
+    """
+
+    def __init__(self, concurrency: int = 8):
+        self._slots = asyncio.Semaphore(concurrency)
+        self._global_bucket = RateBucket(*GLOBAL_RATE)
+        self._queues: dict[int, collections.deque[_Outgoing]] = {}
+        self._buckets: dict[int, RateBucket] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+
+    def post(self, channel: discord.abc.Messageable, content: str | None = None, *, merge: bool = True, **kwargs) -> asyncio.Future:
+        """
+        Queues a message and returns a future for the sent discord.Message. Messages that were
+        merged resolve to the same Message. Queue several posts before awaiting any of them to
+        let them merge.
+        """
+        future = asyncio.get_running_loop().create_future()
+        # Files, embeds and views go out exactly as given.
+        mergeable = merge and not kwargs and bool(content)
+        self._queues.setdefault(channel.id, collections.deque()).append(_Outgoing(content, kwargs, mergeable, [future]))
+        if channel.id not in self._workers:
+            self._workers[channel.id] = asyncio.create_task(self._drain(channel))
+        return future
+
+    async def send(self, channel: discord.abc.Messageable, content: str | None = None, *, merge: bool = True, **kwargs) -> discord.Message:
+        """Queues a message and waits until it has been sent."""
+        return await self.post(channel, content, merge=merge, **kwargs)
+
+    def _next_batch(self, queue: collections.deque[_Outgoing]) -> _Outgoing:
+        outgoing = queue.popleft()
+        if not outgoing.merge:
+            return outgoing
+        content, futures = outgoing.content, list(outgoing.futures)
+        while queue and queue[0].merge:
+            candidate = queue[0].content
+            if len(content) + len(MERGE_SEPARATOR) + len(candidate) > MESSAGE_CHAR_LIMIT:
+                break
+            content += MERGE_SEPARATOR + candidate
+            futures.extend(queue.popleft().futures)
+        return _Outgoing(content, {}, True, futures)
+
+    async def _drain(self, channel: discord.abc.Messageable):
+        queue = self._queues[channel.id]
+        bucket = self._buckets.setdefault(channel.id, RateBucket(*CHANNEL_RATE))
+        try:
+            while queue:
+                await bucket.acquire()
+                await self._global_bucket.acquire()
+                # Merge whatever queued up while waiting for the buckets.
+                outgoing = self._next_batch(queue)
+                async with self._slots:
+                    try:
+                        message = await channel.send(outgoing.content, **outgoing.kwargs)
+                    except Exception as e:
+                        logger.warning(f"Failed to send message to channel {channel.id}: {e}")
+                        for future in outgoing.futures:
+                            if not future.done():
+                                future.set_exception(e)
+                        continue
+                for future in outgoing.futures:
+                    if not future.done():
+                        future.set_result(message)
+        finally:
+            # Nothing is awaited between the last queue check and here, so a post() arriving
+            # after this point finds no worker and starts a fresh one.
+            del self._workers[channel.id]
+            del self._queues[channel.id]
+            for outgoing in queue:
+                for future in outgoing.futures:
+                    future.cancel()
+            if bucket.idle:
+                self._buckets.pop(channel.id, None)
@@ -0,0 +1,53 @@
+import asyncio
+import functools
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Disk work from async code runs on this many threads. Keeping the pool small bounds how
+# many file handles and how much buffered data can be in flight at once.
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="file-io")
+    return _executor
+
+
+async def run(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Runs a blocking function on the I/O pool and waits for its result without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+# --- Helpers ---
+async def makedirs(path: str):
+    await run(os.makedirs, path, exist_ok=True)
+
+
+async def exists(path: str) -> bool:
+    return await run(os.path.exists, path)
+
+
+async def isdir(path: str) -> bool:
+    return await run(os.path.isdir, path)
+
+
+async def rmtree(path: str):
+    await run(shutil.rmtree, path)
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import logging
+import random
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Methods that are safe to resend after a timeout or a 5xx because repeating them has no extra effect.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GHLRequestError(Exception):
+    """Raised when a GHL / leadconnector request fails after all retries."""
+
+    def __init__(self, message: str, status: int | None = None, details=None, retryable: bool | None = None):
+        super().__init__(message)
+        self.status = status
+        self.details = details if details is not None else "No response body"
+        self._retryable = retryable
+
+    @property
+    def retryable(self) -> bool:
+        """
+        True for failures that may succeed later (network errors, 429 and 5xx). A request
+        that may already have reached the server is marked retryable=False explicitly, so
+        the outbound queue does not send it again.
+        """
+        if self._retryable is not None:
+            return self._retryable
+        return self.status is None or self.status in RETRYABLE_STATUSES
+
+
+class GHLResponse:
+    def __init__(self, status: int, data):
+        self.status = status
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class GHLClient:
+    """
+    Async HTTP client for GoHighLevel, leadconnector webhooks and the dashboard sync API.
+
+    All calls share one pooled aiohttp session (keep-alive, per-host connection limits and
+    timeouts), so a slow GHL round trip only suspends the awaiting coroutine instead of the
+    whole event loop. Transient failures are retried with exponential backoff. Non-idempotent
+    requests (POST) are only retried when the request could not have reached the server
+    (connection refused) or GHL explicitly asked us to back off (429), so an SMS is never
+    sent twice because a response was slow.
+    """
+
+    def __init__(
+        self,
+        total_timeout: float = 20,
+        connect_timeout: float = 5,
+        limit: int = 50,
+        limit_per_host: int = 10,
+        keepalive_timeout: float = 30,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8,
+    ):
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # The session must be created inside the running loop, so it is built lazily.
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _backoff(self, attempt: int, retry_after: str | None = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def request(self, method: str, url: str, *, headers: dict | None = None, json_body=None, params: dict | None = None) -> GHLResponse:
+        """
+        Sends a request and returns the parsed response.
+        Raises GHLRequestError for non-2xx responses and network failures once retries are exhausted.
+        """
+        method = method.upper()
+        idempotent = method in IDEMPOTENT_METHODS
+        session = self._get_session()
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                async with session.request(method, url, headers=headers, json=json_body, params=params) as resp:
+                    text = await resp.text()
+                    try:
+                        data = json.loads(text) if text else None
+                    except json.JSONDecodeError:
+                        data = text
+
+                    if resp.status < 400:
+                        return GHLResponse(resp.status, data)
+
+                    can_retry = resp.status == 429 or (idempotent and resp.status in RETRYABLE_STATUSES)
+                    if can_retry and not last_attempt:
+                        delay = self._backoff(attempt, resp.headers.get("Retry-After"))
+                        logger.warning(f"{method} {url} returned {resp.status}. Retrying in {delay:.1f}s.")
+                        await asyncio.sleep(delay)
+                        continue
+                    raise GHLRequestError(f"{resp.status} error for {method} {url}", status=resp.status, details=data or text)
+
+            except aiohttp.ClientConnectorError as e:
+                # The connection was never established, so even a POST is safe to resend.
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not idempotent:
+                    # The request may have been delivered; sending it again could duplicate an SMS.
+                    raise GHLRequestError(f"{method} {url} failed: {e}", retryable=False) from e
+                error = e
+
+            if last_attempt:
+                raise GHLRequestError(f"{method} {url} failed after {self.max_retries + 1} attempts: {error}") from error
+            delay = self._backoff(attempt)
+            logger.warning(f"{method} {url} failed ({error}). Retrying in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+
+    async def get(self, url: str, **kwargs) -> GHLResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> GHLResponse:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> GHLResponse:
+        return await self.request("PUT", url, **kwargs)
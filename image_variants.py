@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Variant name -> longest edge in pixels. Originals smaller than a variant are not upscaled.
+VARIANT_SIZES = {
+    "thumb": 320,
+    "medium": 1024,
+    "full": 2048,
+}
+VARIANT_FORMAT = "WEBP"
+VARIANT_EXTENSION = ".webp"
+VARIANT_QUALITY = 80
+# Derivatives live in a sub-folder next to the original so directory listings of
+# before/after only ever see the originals.
+VARIANTS_DIR = "variants"
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def variant_path(original_path: str, name: str) -> str:
+    """Returns where the given variant of an original image is stored."""
+    directory, filename = os.path.split(original_path)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, VARIANTS_DIR, f"{stem}_{name}{VARIANT_EXTENSION}")
+
+
+def existing_variants(original_path: str) -> dict[str, str]:
+    """Returns {variant name: path} for the variants that have been generated for an image."""
+    variants = {}
+    for name in VARIANT_SIZES:
+        path = variant_path(original_path, name)
+        if os.path.exists(path):
+            variants[name] = path
+    return variants
+
+
+def generate_variants(original_path: str, overwrite: bool = False) -> dict[str, str]:
+    """
+    Writes every configured variant of an image and returns {variant name: path}.
+    This is CPU bound and is meant to run in a worker process.
+    """
+    if not original_path.lower().endswith(SOURCE_EXTENSIONS):
+        return {}
+
+    variants = {}
+    with Image.open(original_path) as img:
+        # Phone photos are usually stored sideways with an EXIF orientation flag.
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+
+        for name, size in VARIANT_SIZES.items():
+            path = variant_path(original_path, name)
+            if not overwrite and os.path.exists(path):
+                variants[name] = path
+                continue
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            resized = img.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+            # Write to a temp file first so a crash never leaves a half-written variant behind.
+            tmp_path = f"{path}.tmp"
+            resized.save(tmp_path, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+            os.replace(tmp_path, path)
+            variants[name] = path
+
+    return variants
+
+
+def build_srcset(variant_urls: dict[str, str]) -> str:
+    """Builds an HTML srcset string ("url 320w, url 1024w, ...") from {variant name: url}."""
+    return ", ".join(
+        f"{variant_urls[name]} {size}w"
+        for name, size in VARIANT_SIZES.items()
+        if name in variant_urls
+    )
+
+
+class VariantGenerator:
+    """Generates image variants in a process pool so resizing never blocks the event loop."""
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._pool: ProcessPoolExecutor | None = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    async def generate(self, paths: list[str]) -> dict[str, dict[str, str]]:
+        """
+        Generates variants for every path concurrently. Returns {original path: {variant name: path}}.
+        Images that fail to process are logged and map to an empty dict.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(pool, generate_variants, path) for path in paths),
+            return_exceptions=True,
+        )
+
+        variants = {}
+        for path, result in zip(paths, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to generate variants for {path}: {result}")
+                variants[path] = {}
+            else:
+                variants[path] = result
+        return variants
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -1,16 +1,38 @@
-from fastapi import FastAPI, Request, HTTPException, Query
+from fastapi import FastAPI, Request, HTTPException, Query, Header, Depends
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta, date, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 import uuid
 import os
+import secrets
 import json
-import requests
+import sqlite3
 import re
 import time
 import calendar_manager
+from customer_repository import CustomerRepository, ConcurrentUpdateError, VERSION_FIELD, write_json_atomic
+from customer_store import CustomerStore
+from channel_map import ChannelMap
+from ghl_client import GHLClient, GHLRequestError
+from outbound_queue import OutboundQueue
+from provisioning import ProvisioningTracker
+import image_variants
+from image_variants import VariantGenerator
+from after_image_catalog import AfterImageCatalog
+from payments_ledger import PaymentsLedger
+import route_planner
+import transcript
+from archive_jobs import ArchiveJobQueue
+from discord_sender import DiscordSendScheduler
+from search_index import CustomerSearchIndex
+from blob_store import BlobStore
+import file_io
 import asyncio
+import hashlib
+import aiohttp
 import discord
 from discord import app_commands
 from urllib.parse import quote_plus
@@ -43,6 +65,9 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 # Dashboard sync configuration
 DASHBOARD_BASE_URL = os.getenv("DASHBOARD_BASE_URL", "http://your-dashboard-domain.com")
 SERVER_BASE_URL = os.getenv("SERVER_BASE_URL", "https://ssh.agencydevworks.ai:8000")
+# Shared secret for internal endpoints (calendar writes, route planning), sent as X-API-Key.
+# Those endpoints refuse every request while it is unset.
+INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY")
 
 # --- Token Validation ---
 if not all([GHL_API_TOKEN, GHL_CONVERSATIONS_TOKEN, BOT_TOKEN, OPENAI_API_KEY]):
@@ -54,6 +79,64 @@ jobstores = {
 }
 scheduler = AsyncIOScheduler(jobstores=jobstores)
 
+# --- Customer Repository ---
+# Customers are stored in SQLite (bot_data/customers.sqlite); the existing customer_data tree is
+# imported on first start, and each write still exports customer_data/<id>/customer_data.json.
+customer_store = CustomerStore(os.path.join("bot_data", "customers.sqlite"))
+# Loaded once at startup; every write to a customer file must be mirrored with upsert()/remove().
+customer_repo = CustomerRepository(CUSTOMER_DATA_DIR, store=customer_store)
+
+# Name/phone/address/city search behind /find and /api/search, kept current by the repository.
+customer_search = CustomerSearchIndex(lambda phone: clean_and_format_phone(phone))
+customer_repo.add_listener(customer_search.on_customer_change)
+
+# Persistent channel_id -> contact_id map used by every slash command.
+channel_map = ChannelMap(os.path.join("bot_data", "channel_map.json"))
+
+# Shared async client for every GHL, leadconnector and dashboard request.
+ghl_client = GHLClient()
+
+# Durable queue for outbound webhooks and SMS; deliveries are sent by background workers.
+outbound_queue = OutboundQueue(os.path.join("bot_data", "outbound.sqlite"))
+GHL_SMS_URL = "https://services.leadconnectorhq.com/conversations/messages"
+
+# Append-only payments ledger with revenue rollups. Imports bot_data/payments.json on first use.
+payments_ledger = PaymentsLedger(os.path.join("bot_data", "payments.sqlite"), legacy_json_path=os.path.join("bot_data", "payments.json"))
+
+# Background Discord channel provisioning started by /customer/create; unfinished jobs resume after a restart.
+provisioning_tracker = ProvisioningTracker(os.path.join("bot_data", "provisioning.sqlite"))
+
+# Paces and merges bot messages per channel so bursts of provisioning don't run into Discord's rate limits.
+discord_sender = DiscordSendScheduler()
+
+# Resizes uploaded photos into thumb/medium/full WebP variants in a process pool.
+variant_generator = VariantGenerator()
+
+# Offline address -> coordinates lookup for the daily route planner.
+geocode_cache = route_planner.GeocodeCache(os.path.join("bot_data", "geocode_cache.json"))
+
+# Channel archives run as background jobs and checkpoint their progress, so they resume after a restart.
+archive_jobs = ArchiveJobQueue(os.path.join("bot_data", "archive_jobs.sqlite"))
+ARCHIVE_CHANNEL_ID = 1392404258338373703 # The ID for the "archived-customers" channel
+ARCHIVE_PROGRESS_INTERVAL = 3  # Seconds between edits of an archive job's progress message
+
+# Discord attachment downloads share one session; at most this many run at once per upload
+# (a Discord message carries up to 10 attachments, so a full upload downloads in one wave).
+ATTACHMENT_DOWNLOAD_CONCURRENCY = 10
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Each unique photo is stored once in the blob store and hard-linked into its before/after folder.
+blob_store = BlobStore(os.path.join("bot_data", "blobs"))
+# Per-folder {sha256: filename} records used to skip photos that were already uploaded. They are
+# kept under bot_data/ (mirroring the images layout) so they are never served from /images.
+CHECKSUMS_DIR = os.path.join("bot_data", "checksums")
+attachment_session: aiohttp.ClientSession | None = None
+
+def get_attachment_session() -> aiohttp.ClientSession:
+    global attachment_session
+    if attachment_session is None or attachment_session.closed:
+        attachment_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300, sock_read=60))
+    return attachment_session
+
 app = FastAPI()
 
 # Mount the static directory to serve vCard files
@@ -85,6 +168,9 @@ tree = app_commands.CommandTree(client)
 async def on_ready():
     """Event that runs when the bot is ready and connected to Discord."""
     logger.info(f"Logged in as {client.user} (ID: {client.user.id})")
+    # Resume archive jobs interrupted by the last restart (no-op on reconnects)
+    await archive_jobs.start(run_archive_job)
+    await provisioning_tracker.start(provision_customer_channel)
     
     # Sync commands to a specific guild for instant updates.
     # This process first clears all commands from the guild and then adds the current ones back,
@@ -139,17 +225,21 @@ async def on_message(message: discord.Message):
             if not downloaded_files:
                 await processing_msg.edit(content="⚠️ No valid images were found in your message. Please try the command again.")
                 return
+
+            saved_count = sum(1 for file_info in downloaded_files if not file_info['duplicate'])
+            duplicate_count = len(downloaded_files) - saved_count
+            duplicate_note = f" ({duplicate_count} duplicate(s) already on file were skipped)" if duplicate_count else ""
             
             # Handle 'before' upload confirmation
             if upload_type == 'before':
-                await processing_msg.edit(content=f"✅ Successfully saved {len(downloaded_files)} 'before' image(s) for client `{contact_id}`.")
+                await processing_msg.edit(content=f"✅ Successfully saved {saved_count} 'before' image(s) for client `{contact_id}`{duplicate_note}.")
             
             # Handle 'after' upload, confirmation, and SMS
             elif upload_type == 'after':
                 service_apt_num = downloaded_files[0]['service_appointment']
                 success, result_msg = await send_gallery_link_to_client(contact_id, service_apt_num)
 
-                response_message = f"✅ Successfully saved {len(downloaded_files)} 'after' image(s) for `{contact_id}`.\n"
+                response_message = f"✅ Successfully saved {saved_count} 'after' image(s) for `{contact_id}`{duplicate_note}.\n"
                 if success:
                     response_message += f"✉️ Gallery link sent to client. View it here: {result_msg}"
                 else:
@@ -181,15 +271,12 @@ class ReviewRequestView(discord.ui.View):
         button.label = "Review Link Sent!"
         await interaction.message.edit(view=self)
 
-        customer_file = os.path.join(CUSTOMER_DATA_DIR, self.contact_id, "customer_data.json")
-        if not os.path.exists(customer_file):
+        customer_data = customer_repo.get(self.contact_id)
+        if customer_data is None:
             await interaction.followup.send("❌ Could not find customer data file.", ephemeral=True)
             return
 
         try:
-            with open(customer_file, "r") as f:
-                customer_data = json.load(f)
-            
             p_info = customer_data.get("personal_info", {})
             first_name = p_info.get("first_name")
             phone_number = p_info.get("phone_number")
@@ -209,10 +296,13 @@ class ReviewRequestView(discord.ui.View):
             await interaction.followup.send(f"❌ An unexpected error occurred: {e}", ephemeral=True)
 
 class UpdateValueModal(discord.ui.Modal):
-    def __init__(self, contact_id: str, field_to_update: str):
+    def __init__(self, contact_id: str, field_to_update: str, record_version: int | None = None):
         super().__init__(title=f"Update {field_to_update}")
         self.contact_id = contact_id
         self.field_to_update = field_to_update
+        # Version of the record when the modal was opened; the update is refused if the
+        # record was edited while the user was typing.
+        self.record_version = record_version
         self.new_value_input = discord.ui.TextInput(
             label=f"New {field_to_update}",
             placeholder=f"Enter the new {field_to_update}...",
@@ -224,34 +314,35 @@ class UpdateValueModal(discord.ui.Modal):
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         new_value = self.new_value_input.value
-        customer_file = os.path.join(CUSTOMER_DATA_DIR, self.contact_id, "customer_data.json")
+
+        def apply_update(customer_data: dict):
+            # Update logic based on the field
+            if self.field_to_update == "Name":
+                parts = new_value.split(" ", 1)
+                customer_data["personal_info"]["first_name"] = parts[0]
+                customer_data["personal_info"]["last_name"] = parts[1] if len(parts) > 1 else ""
+            elif self.field_to_update == "Phone Number":
+                customer_data["personal_info"]["phone_number"] = clean_and_format_phone(new_value)
+            elif self.field_to_update == "Price Per Panel":
+                customer_data["service_history"][-1]["service_details"]["price_per_panel"] = float(new_value)
+            elif self.field_to_update == "# of Panels":
+                customer_data["service_history"][-1]["service_details"]["panel_count"] = int(new_value)
+            elif self.field_to_update == "Quoted Price":
+                customer_data["service_history"][-1]["quote_amount"] = float(new_value)
 
         try:
-            with open(customer_file, "r+") as f:
-                customer_data = json.load(f)
-                
-                # Update logic based on the field
-                if self.field_to_update == "Name":
-                    parts = new_value.split(" ", 1)
-                    customer_data["personal_info"]["first_name"] = parts[0]
-                    customer_data["personal_info"]["last_name"] = parts[1] if len(parts) > 1 else ""
-                elif self.field_to_update == "Phone Number":
-                    customer_data["personal_info"]["phone_number"] = clean_and_format_phone(new_value)
-                elif self.field_to_update == "Price Per Panel":
-                    customer_data["service_history"][-1]["service_details"]["price_per_panel"] = float(new_value)
-                elif self.field_to_update == "# of Panels":
-                    customer_data["service_history"][-1]["service_details"]["panel_count"] = int(new_value)
-                elif self.field_to_update == "Quoted Price":
-                    customer_data["service_history"][-1]["quote_amount"] = float(new_value)
-
-                # Write changes back
-                f.seek(0)
-                json.dump(customer_data, f, indent=4)
-                f.truncate()
+            await customer_repo.update(self.contact_id, apply_update, expected_version=self.record_version)
             
             await interaction.followup.send(f"✅ Successfully updated `{self.field_to_update}` for contact `{self.contact_id}`.", ephemeral=True)
             await interaction.channel.send(f"ℹ️ **{interaction.user.mention} updated the following field:**\n- **{self.field_to_update}** was updated to `{new_value}`.")
 
+        except ConcurrentUpdateError:
+            await interaction.followup.send(
+                f"⚠️ This client's record changed while you were editing, so `{self.field_to_update}` was not updated. Please run `/update` again.",
+                ephemeral=True,
+            )
+        except FileNotFoundError:
+            await interaction.followup.send(f"❌ No customer record was found for contact `{self.contact_id}`.", ephemeral=True)
         except (IOError, json.JSONDecodeError, ValueError, IndexError) as e:
             await interaction.followup.send(f"❌ An error occurred: {e}. Please ensure the value is in the correct format.", ephemeral=True)
 
@@ -273,7 +364,12 @@ class UpdateSelectView(discord.ui.View):
     )
     async def select_callback(self, interaction: discord.Interaction, select: discord.ui.Select):
         field_to_update = select.values[0]
-        modal = UpdateValueModal(contact_id=self.contact_id, field_to_update=field_to_update)
+        customer_data = customer_repo.get(self.contact_id) or {}
+        modal = UpdateValueModal(
+            contact_id=self.contact_id,
+            field_to_update=field_to_update,
+            record_version=customer_data.get(VERSION_FIELD, 0),
+        )
         await interaction.response.send_modal(modal)
 
 # --- Pydantic Models ---
@@ -299,6 +395,7 @@ class VercelWebhookPayload(BaseModel):
 class AppointmentBooking(BaseModel):
     contact_id: str
     start_time_iso: str
+    panel_count: int | None = None
 
 class MembershipUpgrade(BaseModel):
     contactId: str
@@ -339,16 +436,12 @@ class ConfirmUpdateView(discord.ui.View):
 
     @discord.ui.button(label="Use New Information", style=discord.ButtonStyle.success)
     async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
-        customer_file = os.path.join(CUSTOMER_DATA_DIR, self.contact_id, "customer_data.json")
         try:
-            with open(customer_file, "r") as f:
-                current_data = json.load(f)
-            
             # Update the personal info with the new data
-            current_data["personal_info"] = self.new_data
-            
-            with open(customer_file, "w") as f:
-                json.dump(current_data, f, indent=4)
+            await customer_repo.update(
+                self.contact_id,
+                lambda current_data: current_data.update(personal_info=self.new_data),
+            )
 
             await interaction.response.send_message(f"✅ Contact `{self.contact_id}` has been **updated** with the new information by {interaction.user.mention}.", ephemeral=True)
             # Disable buttons after use
@@ -388,15 +481,12 @@ async def review(interaction: discord.Interaction):
         await interaction.followup.send("❌ This command can only be used in a client's dedicated channel.", ephemeral=True)
         return
 
-    customer_file = os.path.join(CUSTOMER_DATA_DIR, contact_id, "customer_data.json")
-    if not os.path.exists(customer_file):
+    customer_data = customer_repo.get(contact_id)
+    if customer_data is None:
         await interaction.followup.send(f"❌ Customer data file not found for contact ID: `{contact_id}`.", ephemeral=True)
         return
 
     try:
-        with open(customer_file, "r") as f:
-            customer_data = json.load(f)
-
         p_info = customer_data.get("personal_info", {})
         first_name = p_info.get("first_name")
         phone_number = p_info.get("phone_number")
@@ -418,89 +508,194 @@ async def review(interaction: discord.Interaction):
         await interaction.followup.send("❌ An error occurred while reading the client's data file.", ephemeral=True)
 
 async def archive_channel(interaction: discord.Interaction, contact_id: str):
-    """Handles the logic for archiving a channel and creating a transcript thread."""
+    """Queues the current channel for archiving; the transcript export runs as a background job."""
     original_channel = interaction.channel
-    channel_name = original_channel.name
-    ARCHIVE_CHANNEL_ID = 1392404258338373703 # The ID for the "archived-customers" channel
+
+    archive_channel_obj = interaction.client.get_channel(ARCHIVE_CHANNEL_ID)
+    if not archive_channel_obj or not isinstance(archive_channel_obj, discord.TextChannel):
+        await interaction.followup.send(f"Archive channel with ID `{ARCHIVE_CHANNEL_ID}` not found or is not a text channel.", ephemeral=True)
+        return
 
     try:
-        archive_channel_obj = interaction.client.get_channel(ARCHIVE_CHANNEL_ID)
-        if not archive_channel_obj or not isinstance(archive_channel_obj, discord.TextChannel):
-            await interaction.followup.send(f"Archive channel with ID `{ARCHIVE_CHANNEL_ID}` not found or is not a text channel.", ephemeral=True)
-            return
+        job, created = await file_io.run(
+            archive_jobs.submit, original_channel.id, original_channel.name, contact_id, interaction.user.mention
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to queue archive job for channel {original_channel.id}: {e}")
+        await interaction.followup.send("❌ An error occurred while queueing the archive.", ephemeral=True)
+        return
+
+    if not created:
+        await interaction.followup.send(f"⏳ This channel is already being archived (job `{job['id']}`).", ephemeral=True)
+        return
 
-        transcript_parts = []
-        current_part = (
-            f"## Transcript for channel `#{channel_name}`\n"
-            f"**Archived by:** {interaction.user.mention} on {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}\n"
-            f"**Channel ID:** `{original_channel.id}`\n---\n\n"
+    try:
+        progress_message = await original_channel.send(
+            f"🗄️ Archive job `{job['id']}` queued by {interaction.user.mention}.",
+            allowed_mentions=discord.AllowedMentions.none(),
         )
+        await file_io.run(archive_jobs.update, job["id"], progress_message_id=progress_message.id)
+    except discord.HTTPException as e:
+        # The archive still runs; it just has nowhere to report progress.
+        logger.warning(f"Could not post progress message for archive job {job['id']}: {e}")
+
+    archive_jobs.schedule(job["id"])
+    action = "Resuming the archive of" if job["bytes_written"] or job["stage"] != "export" else "Archiving"
+    await interaction.followup.send(
+        f"🗄️ {action} `#{original_channel.name}` in the background (job `{job['id']}`). Progress is shown in this channel.",
+        ephemeral=True,
+    )
 
-        messages = [msg async for msg in original_channel.history(limit=None)]
-        for message in reversed(messages):
-            timestamp = message.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            author_display = message.author.name
-            
-            entry = f"**{author_display}** `({timestamp})`:\n{message.content or ' '}\n"
-
-            if message.embeds:
-                for i, embed in enumerate(message.embeds):
-                    entry += f"\\n> `--- Embed Start ---`\\n"
-                    if embed.title: entry += f"> **{embed.title}**\\n"
-                    if embed.description: entry += f"> {embed.description.replace(chr(10), chr(10) + '> ')}\\n"
-                    for field in embed.fields:
-                        entry += f"> **{field.name}**: {field.value.replace(chr(10), chr(10) + '> ')}\\n"
-                    entry += f"> `--- Embed End ---`\\n"
-
-            if message.attachments:
-                for att in message.attachments:
-                    entry += f"📎 **Attachment:** `{att.filename}` - {att.url}\\n"
-            
-            entry += "\\n"
+def _archive_job_progress(job: dict) -> transcript.TranscriptProgress:
+    return transcript.TranscriptProgress(job["message_count"], job["last_message_id"], job["bytes_written"], job["text_length"])
 
-            if len(current_part) + len(entry) > 1900:
-                transcript_parts.append(current_part)
-                current_part = ""
-            
-            current_part += entry
+async def _transcript_already_posted(thread: discord.Thread, filename: str) -> bool:
+    """True if an earlier attempt at the job already posted the transcript file to the thread."""
+    async for message in thread.history(limit=20, oldest_first=True):
+        if message.author == client.user and any(att.filename == filename for att in message.attachments):
+            return True
+    return False
 
-        if current_part:
-            transcript_parts.append(current_part)
-        
-        thread_name = f"{channel_name}-{datetime.now().strftime('%Y%m%d-%H%M')}"
-        if len(thread_name) > 100:
-            thread_name = thread_name[:100]
+async def run_archive_job(job: dict):
+    """
+    Runs one archive job: exports the transcript, uploads it to a thread in the archive
+    channel, then deletes the customer channel. Each stage is checkpointed, so a job
+    interrupted by a restart, or failed and submitted again, picks up where it stopped
+    instead of starting over.
+    """
+    job_id = job["id"]
+    channel_name = job["channel_name"]
+    transcript_path = os.path.join(transcript.TRANSCRIPT_DIR, f"{job_id}.md.gz")
+    original_channel = client.get_channel(job["channel_id"])
+    progress_message = None
+    if original_channel is not None and job["progress_message_id"]:
+        progress_message = original_channel.get_partial_message(job["progress_message_id"])
+    last_report = 0.0
+
+    async def report(text: str, force: bool = False):
+        # Edits are throttled; every one is a Discord API call on the channel's rate limit.
+        nonlocal last_report
+        if progress_message is None or (not force and time.monotonic() - last_report < ARCHIVE_PROGRESS_INTERVAL):
+            return
+        last_report = time.monotonic()
+        try:
+            await progress_message.edit(content=text)
+        except discord.HTTPException as e:
+            logger.warning(f"Could not update progress for archive job {job_id}: {e}")
 
-        thread = await archive_channel_obj.create_thread(name=thread_name)
-        
-        for part in transcript_parts:
-            await thread.send(part, allowed_mentions=discord.AllowedMentions.none())
-        
-        await interaction.followup.send(f"Channel `#{channel_name}` has been successfully archived in {thread.mention}. Deleting original channel...", ephemeral=True)
+    try:
+        archive_channel_obj = client.get_channel(ARCHIVE_CHANNEL_ID)
+        if not archive_channel_obj or not isinstance(archive_channel_obj, discord.TextChannel):
+            raise RuntimeError(f"Archive channel with ID {ARCHIVE_CHANNEL_ID} not found or is not a text channel")
+
+        if job["stage"] in ("export", "upload") and job["bytes_written"] and not await file_io.exists(transcript_path):
+            # The partial transcript is gone (e.g. removed by hand); export again from the start.
+            reset = {"stage": "export", "message_count": 0, "last_message_id": None, "bytes_written": 0, "text_length": 0}
+            job.update(reset)
+            await file_io.run(archive_jobs.update, job_id, **reset)
+
+        if job["stage"] == "export":
+            if original_channel is None:
+                raise RuntimeError(f"Channel {job['channel_id']} no longer exists")
+            header = (
+                f"## Transcript for channel `#{channel_name}`\n"
+                f"**Archived by:** {job['requested_by']} on {datetime.utcfromtimestamp(job['created_at']).strftime('%Y-%m-%d %H:%M:%S UTC')}\n"
+                f"**Channel ID:** `{job['channel_id']}`\n---\n\n"
+            )
 
-        await original_channel.delete(reason=f"Archived to thread {thread.id} by {interaction.user.name}")
-        
-        data_file = os.path.join(CUSTOMER_DATA_DIR, contact_id, "customer_data.json")
-        if os.path.exists(data_file):
-            try:
-                with open(data_file, "r+") as f:
-                    customer_data = json.load(f)
-                    customer_data['archived_in_thread_id'] = thread.id
-                    f.seek(0)
-                    json.dump(customer_data, f, indent=4)
-                    f.truncate()
-            except Exception as e:
-                logger.error(f"Could not update customer file for {contact_id} with archive thread ID: {e}")
-
-        await thread.send(f"✅ This is a complete archive of the deleted channel `#{channel_name}`.")
-
-    except discord.Forbidden:
-        await interaction.followup.send("❌ **Permission Error:** I lack permissions. I need `Read Message History`, `Manage Channels`, and `Create Threads`.", ephemeral=True)
-    except discord.HTTPException as e:
-        await interaction.followup.send(f"❌ **API Error:** {e}", ephemeral=True)
+            async def checkpoint(progress: transcript.TranscriptProgress):
+                await file_io.run(
+                    archive_jobs.update, job_id,
+                    message_count=progress.message_count, last_message_id=progress.last_message_id,
+                    bytes_written=progress.bytes_written, text_length=progress.text_length,
+                )
+                await report(f"🗄️ Archive job `{job_id}`: exported {progress.message_count:,} messages…")
+
+            await report(f"🗄️ Archive job `{job_id}`: exporting messages…", force=True)
+            progress = await transcript.build_transcript(
+                original_channel, header, transcript_path, _archive_job_progress(job), checkpoint
+            )
+            transcript_size = await file_io.run(os.path.getsize, transcript_path)
+            if transcript_size > archive_channel_obj.guild.filesize_limit:
+                # Keep the channel: deleting it would lose the only copy of the history.
+                raise RuntimeError(
+                    f"The compressed transcript is {transcript_size / 1024 / 1024:.1f} MB, over this server's upload limit. The channel was kept."
+                )
+            job.update(
+                stage="upload", message_count=progress.message_count, last_message_id=progress.last_message_id,
+                bytes_written=progress.bytes_written, text_length=progress.text_length,
+            )
+            await file_io.run(archive_jobs.update, job_id, stage="upload")
+
+        if job["stage"] == "upload":
+            await report(f"🗄️ Archive job `{job_id}`: uploading the transcript of {job['message_count']:,} messages…", force=True)
+            thread = None
+            if job["thread_id"]:
+                try:
+                    thread = await client.fetch_channel(job["thread_id"])
+                except discord.NotFound:
+                    thread = None
+            if thread is None:
+                thread_name = f"{channel_name}-{datetime.now().strftime('%Y%m%d-%H%M')}"
+                if len(thread_name) > 100:
+                    thread_name = thread_name[:100]
+                thread = await archive_channel_obj.create_thread(name=thread_name)
+                job["thread_id"] = thread.id
+                await file_io.run(archive_jobs.update, job_id, thread_id=thread.id)
+
+            transcript_filename = f"{channel_name}-transcript.md.gz"
+            if await _transcript_already_posted(thread, transcript_filename):
+                # An earlier attempt got as far as posting; don't post the transcript twice.
+                logger.info(f"Archive job {job_id}: transcript is already in thread {thread.id}")
+            else:
+                # The full transcript goes up as one compressed file; short ones are also posted inline.
+                parts = await transcript.inline_parts(transcript_path, _archive_job_progress(job))
+                if parts:
+                    first_part, more_parts = parts[0], parts[1:]
+                else:
+                    first_part, more_parts = f"## Transcript for channel `#{channel_name}`\n📄 {job['message_count']:,} messages; the full transcript is attached.", []
+                transcript_file = discord.File(transcript_path, filename=transcript_filename)
+                await asyncio.gather(
+                    discord_sender.post(thread, first_part, file=transcript_file, allowed_mentions=discord.AllowedMentions.none()),
+                    *(discord_sender.post(thread, part, allowed_mentions=discord.AllowedMentions.none()) for part in more_parts),
+                )
+            job["stage"] = "cleanup"
+            await file_io.run(archive_jobs.update, job_id, stage="cleanup")
+
+        if job["stage"] == "cleanup":
+            if original_channel is not None:
+                await report(f"🗄️ Archive job `{job_id}`: transcript saved. Deleting this channel…", force=True)
+                try:
+                    await original_channel.delete(reason=f"Archived to thread {job['thread_id']} (job {job_id})")
+                except discord.NotFound:
+                    pass
+            await file_io.run(channel_map.remove, job["channel_id"])
+
+            contact_id = job["contact_id"]
+            if contact_id:
+                try:
+                    await customer_repo.update(contact_id, lambda customer_data: customer_data.update(archived_in_thread_id=job["thread_id"]))
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    logger.error(f"Could not update customer file for {contact_id} with archive thread ID: {e}")
+
+            thread = client.get_channel(job["thread_id"]) or await client.fetch_channel(job["thread_id"])
+            await discord_sender.send(thread, f"✅ This is a complete archive of the deleted channel `#{channel_name}`.")
+            if await file_io.exists(transcript_path):
+                await file_io.run(os.remove, transcript_path)
+
+    except asyncio.CancelledError:
+        # Shutting down; the checkpoint and partial transcript are kept for the next run.
+        raise
     except Exception as e:
-        await interaction.followup.send(f"❌ **An unexpected error occurred:** {e}", ephemeral=True)
-        logger.error(f"Error during channel archival/deletion: {e}\\n{traceback.format_exc()}")
+        if isinstance(e, discord.Forbidden):
+            reason = "I need `Read Message History`, `Manage Channels`, and `Create Threads`."
+        else:
+            reason = str(e)
+        # The transcript and checkpoint are kept so archiving the channel again resumes this job.
+        await report(f"❌ Archive job `{job_id}` failed: {reason}\nArchive the channel again to resume it.", force=True)
+        raise
 
 @tree.command(name="paid", description="Logs a payment for the client and shows updated revenue totals.")
 @app_commands.describe(amount="The payment amount received.")
@@ -513,33 +708,11 @@ async def paid(interaction: discord.Interaction, amount: float):
         await interaction.followup.send("❌ This command can only be used in a client's dedicated channel.", ephemeral=True)
         return
 
-    payments_file = os.path.join("bot_data", "payments.json")
-
-    # --- Load existing payments ---
+    # --- Record the payment ---
     try:
-        if os.path.exists(payments_file) and os.path.getsize(payments_file) > 0:
-            with open(payments_file, "r") as f:
-                payments_data = json.load(f)
-        else:
-            payments_data = []
-    except (IOError, json.JSONDecodeError):
-        payments_data = []
-
-    # --- Add new payment ---
-    new_payment = {
-        "contact_id": contact_id,
-        "amount": amount,
-        "channel_id": interaction.channel.id,
-        "date": datetime.utcnow().isoformat()
-    }
-    payments_data.append(new_payment)
-
-    # --- Save updated payments ---
-    try:
-        with open(payments_file, "w") as f:
-            json.dump(payments_data, f, indent=4)
-    except IOError as e:
-        logger.error(f"Failed to write to payments.json: {e}")
+        await file_io.run(payments_ledger.record, contact_id, amount, interaction.channel.id)
+    except sqlite3.Error as e:
+        logger.error(f"Failed to record payment in the ledger: {e}")
         await interaction.followup.send("❌ An error occurred while saving the payment record.", ephemeral=True)
         return
 
@@ -547,16 +720,14 @@ async def paid(interaction: discord.Interaction, amount: float):
     try:
         paid_webhook_url = "https://services.leadconnectorhq.com/hooks/cWEwz6JBFHPY0LeC3ry3/webhook-trigger/67e86b2f-a4b4-4e33-b38a-521a95fe73ad"
         payload = {"contact_id": contact_id, "paid_amount": amount}
-        logger.info(f"Sending 'paid' webhook for contact {contact_id} with amount {amount}")
-        response = requests.post(paid_webhook_url, json=payload)
-        response.raise_for_status()
-        logger.info(f"Successfully sent 'paid' webhook for {contact_id}. Status: {response.status_code}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to send 'paid' webhook for {contact_id}. Error: {e}")
+        logger.info(f"Queueing 'paid' webhook for contact {contact_id} with amount {amount}")
+        await queue_ghl_webhook("paid", paid_webhook_url, payload)
+    except sqlite3.Error as e:
+        logger.error(f"Failed to queue 'paid' webhook for {contact_id}. Error: {e}")
         await interaction.channel.send(f"⚠️ **GHL Sync Failed:** Could not update GHL with the payment of ${amount:,.2f}.")
 
     # --- Calculate and display stats ---
-    stats = get_dashboard_stats()
+    stats = await file_io.run(get_dashboard_stats)
 
     response_message = (
         f"✅ **Payment Logged!**\n\n"
@@ -590,6 +761,29 @@ async def archive(interaction: discord.Interaction):
         
     await archive_channel(interaction, contact_id)
 
+@tree.command(name="find", description="Finds a client by name, phone number, address or city.")
+@app_commands.describe(query="Part of a name, phone number, address or city. Small typos are OK.")
+async def find(interaction: discord.Interaction, query: str):
+    """Searches the customer index and lists the best matches with links to their channels."""
+    results = search_customers(query, limit=10)["results"]
+    if not results:
+        await interaction.response.send_message(f"🔍 No clients match `{query}`.", ephemeral=True)
+        return
+
+    lines = [f"🔍 **{len(results)} match(es) for** `{query}`:"]
+    for result in results:
+        if result["discordChannelId"] and client.get_channel(result["discordChannelId"]):
+            where = f"<#{result['discordChannelId']}>"
+        elif result["archivedInThreadId"]:
+            where = f"archived in <#{result['archivedInThreadId']}>"
+        else:
+            where = "no channel"
+        lines.append(
+            f"- **{result['fullName'] or 'Unnamed'}** · {format_phone_for_display(result['phoneNumber'])} · "
+            f"{result['address'] or 'No address'} · {where}"
+        )
+    await interaction.response.send_message("\n".join(lines)[:2000], ephemeral=True)
+
 @tree.command(name="dead", description="Marks the client as a dead lead in GoHighLevel.")
 async def dead(interaction: discord.Interaction):
     """Sends a webhook to GHL to mark the contact as a dead lead."""
@@ -622,11 +816,8 @@ async def dead(interaction: discord.Interaction):
     }
 
     try:
-        logger.info(f"Sending dead lead webhook for contact {contact_id}")
-        response = requests.post(webhook_url, json=payload)
-        response.raise_for_status()
-        
-        logger.info(f"Successfully sent dead lead webhook for {contact_id}. Status: {response.status_code}")
+        logger.info(f"Queueing dead lead webhook for contact {contact_id}")
+        await queue_ghl_webhook("dead_lead", webhook_url, payload)
         
         await interaction.followup.send(
             f"✅ Successfully marked client `{contact_id}` as a dead lead in GHL.",
@@ -639,11 +830,11 @@ async def dead(interaction: discord.Interaction):
         # Automatically archive the channel after marking as dead
         await archive_channel(interaction, contact_id)
 
-    except requests.exceptions.RequestException as e:
-        error_message = f"Failed to send dead lead webhook for {contact_id}. Error: {e}"
+    except sqlite3.Error as e:
+        error_message = f"Failed to queue dead lead webhook for {contact_id}. Error: {e}"
         logger.error(error_message)
         await interaction.followup.send(
-            f"❌ An error occurred while contacting the webhook: {e}",
+            f"❌ An error occurred while queueing the webhook: {e}",
             ephemeral=True
         )
 
@@ -703,22 +894,7 @@ async def after(interaction: discord.Interaction):
 
 def _get_contact_id_from_channel(channel_id: int) -> str | None:
     """Finds the contact ID associated with a given Discord channel ID."""
-    if not os.path.exists(CUSTOMER_DATA_DIR):
-        return None
-        
-    for customer_dir in os.listdir(CUSTOMER_DATA_DIR):
-        customer_path = os.path.join(CUSTOMER_DATA_DIR, customer_dir)
-        if os.path.isdir(customer_path):
-            customer_file = os.path.join(customer_path, "customer_data.json")
-            if os.path.exists(customer_file):
-                try:
-                    with open(customer_file, "r") as f:
-                        data = json.load(f)
-                    if data.get("discord_channel_id") == channel_id:
-                        return data.get("client_id")
-                except (json.JSONDecodeError, IOError):
-                    continue
-    return None
+    return channel_map.get(channel_id)
 
 def clean_and_format_phone(phone: str) -> str:
     """
@@ -776,7 +952,37 @@ def format_phone_for_display(phone: str) -> str:
     return phone
 
 # --- Helper Functions ---
-def update_ghl_contact(contact_id: str, first_name: str, last_name: str, phone: str, address: str, city: str) -> bool:
+async def queue_ghl_webhook(name: str, url: str, body: dict) -> int:
+    """Queues a leadconnector webhook for background delivery. Returns the delivery ID."""
+    return await file_io.run(outbound_queue.enqueue, "ghl_webhook", {"name": name, "url": url, "body": body})
+
+async def queue_ghl_sms(contact_id: str, to_number: str, message: str) -> int:
+    """Queues an SMS through the GHL conversations API. Returns the delivery ID."""
+    return await file_io.run(outbound_queue.enqueue, "ghl_sms", {
+        "type": "SMS",
+        "contactId": contact_id,
+        "fromNumber": GHL_SMS_FROM_NUMBER,
+        "toNumber": to_number,
+        "message": message
+    })
+
+async def deliver_ghl_webhook(delivery: dict):
+    """Outbound queue handler for leadconnector webhooks."""
+    response = await ghl_client.post(delivery["url"], json_body=delivery["body"])
+    logger.info(f"Delivered '{delivery['name']}' webhook. Status: {response.status}")
+
+async def deliver_ghl_sms(payload: dict):
+    """Outbound queue handler for GHL SMS messages."""
+    headers = {
+        "Authorization": f"Bearer {GHL_CONVERSATIONS_TOKEN}",
+        "Version": "2021-04-15",
+        "Content-Type": "application/json",
+        "Accept": "application/json"
+    }
+    await ghl_client.post(GHL_SMS_URL, headers=headers, json_body=payload)
+    logger.info(f"Delivered SMS to contact {payload['contactId']}")
+
+async def update_ghl_contact(contact_id: str, first_name: str, last_name: str, phone: str, address: str, city: str) -> bool:
     """Updates an existing contact in GHL using their contact ID."""
     
     headers = {
@@ -798,21 +1004,14 @@ def update_ghl_contact(contact_id: str, first_name: str, last_name: str, phone:
     update_url = f"{GHL_API_BASE_URL}/contacts/{contact_id}"
     
     try:
-        response = requests.put(update_url, headers=headers, json=payload)
-        response.raise_for_status()
+        await ghl_client.put(update_url, headers=headers, json_body=payload)
         logger.info(f"Successfully updated GHL contact with ID: {contact_id}")
         return True
-    except requests.exceptions.RequestException as e:
-        error_details = "No response body"
-        if hasattr(e, 'response') and e.response is not None:
-            try:
-                error_details = e.response.json()
-            except json.JSONDecodeError:
-                error_details = e.response.text
-        logger.error(f"Failed to update GHL contact {contact_id}. Error: {e}, Details: {error_details}")
+    except GHLRequestError as e:
+        logger.error(f"Failed to update GHL contact {contact_id}. Error: {e}, Details: {e.details}")
         return False
 
-def create_ghl_contact(first_name: str, last_name: str, phone: str, address: str, city: str) -> tuple[str | None, bool]:
+async def create_ghl_contact(first_name: str, last_name: str, phone: str, address: str, city: str) -> tuple[str | None, bool]:
     """
     Creates a contact in GHL.
     Returns a tuple of (contact_id, is_new).
@@ -839,10 +1038,9 @@ def create_ghl_contact(first_name: str, last_name: str, phone: str, address: str
     }
     
     try:
-        response = requests.post("https://services.leadconnectorhq.com/contacts/", headers=headers, json=payload)
-        response.raise_for_status()
+        response = await ghl_client.post("https://services.leadconnectorhq.com/contacts/", headers=headers, json_body=payload)
         
-        data = response.json()
+        data = response.json() or {}
         
         contact_id = data.get("contact", {}).get("id")
         if contact_id:
@@ -852,22 +1050,17 @@ def create_ghl_contact(first_name: str, last_name: str, phone: str, address: str
             logger.error(f"GHL contact creation succeeded but no ID was returned. Response: {data}")
             return None, False
             
-    except requests.exceptions.RequestException as e:
-        error_details = "No response body"
-        if hasattr(e, 'response') and e.response is not None:
-            try:
-                error_details = e.response.json()
-                if e.response.status_code == 400 and 'This location does not allow duplicated contacts' in error_details.get('message', ''):
-                    contact_id = error_details.get('meta', {}).get('contactId')
-                    if contact_id:
-                        logger.info(f"Duplicate contact detected. Found existing GHL contact with ID: {contact_id}")
-                        return contact_id, False # It's an existing contact
-            except json.JSONDecodeError:
-                error_details = e.response.text
+    except GHLRequestError as e:
+        error_details = e.details
+        if e.status == 400 and isinstance(error_details, dict) and 'This location does not allow duplicated contacts' in error_details.get('message', ''):
+            contact_id = error_details.get('meta', {}).get('contactId')
+            if contact_id:
+                logger.info(f"Duplicate contact detected. Found existing GHL contact with ID: {contact_id}")
+                return contact_id, False # It's an existing contact
         logger.error(f"Failed to create GHL contact. Error: {e}, Details: {error_details}")
         return None, False
 
-def get_ghl_contact_id(phone: str) -> str | None:
+async def get_ghl_contact_id(phone: str) -> str | None:
     """Looks up a contact in GHL by phone number and returns their ID."""
     formatted_phone = clean_and_format_phone(phone)
     if not formatted_phone:
@@ -882,10 +1075,9 @@ def get_ghl_contact_id(phone: str) -> str | None:
     }
     
     try:
-        response = requests.get(f"{GHL_API_BASE_URL}/contacts/lookup", headers=headers, params=params)
-        response.raise_for_status()  # Raises an exception for bad status codes (4xx or 5xx)
+        response = await ghl_client.get(f"{GHL_API_BASE_URL}/contacts/lookup", headers=headers, params=params)
         
-        data = response.json()
+        data = response.json() or {}
 
         if data.get("contacts") and len(data["contacts"]) > 0:
             contact_id = data["contacts"][0].get("id")
@@ -893,9 +1085,45 @@ def get_ghl_contact_id(phone: str) -> str | None:
         else:
             return None
             
-    except requests.exceptions.RequestException as e:
+    except GHLRequestError as e:
         return None
 
+def build_image_entry(relative_path: str) -> dict:
+    """
+    Builds the public URL of an image under CUSTOMER_DATA_DIR together with the URLs of its
+    resized variants and a srcset string, so clients can fetch only the size they need.
+    """
+    relative_path = relative_path.replace(os.sep, '/')
+    original_path = os.path.join(CUSTOMER_DATA_DIR, relative_path)
+
+    variant_urls = {}
+    for name, path in image_variants.existing_variants(original_path).items():
+        variant_relative_path = os.path.relpath(path, CUSTOMER_DATA_DIR).replace(os.sep, '/')
+        variant_urls[name] = f"{SERVER_BASE_URL}/images/{variant_relative_path}"
+
+    return {
+        "url": f"{SERVER_BASE_URL}/images/{relative_path}",
+        "filename": os.path.basename(relative_path),
+        "variants": variant_urls,
+        "srcset": image_variants.build_srcset(variant_urls),
+    }
+
+# Catalog of every 'after' photo for the public random-image endpoints; built at startup.
+after_image_catalog = AfterImageCatalog(CUSTOMER_DATA_DIR, build_image_entry)
+
+def _scan_customer_images(contact_dir: str) -> list[dict]:
+    """Walks a contact's images folder and builds an entry per image. Blocking; run it on the I/O pool."""
+    images = []
+    for root, dirs, files in os.walk(contact_dir):
+        # Resized variants are reported alongside their original, not as separate images
+        dirs[:] = [d for d in dirs if d != image_variants.VARIANTS_DIR]
+        for filename in files:
+            if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
+                # Construct the path relative to the CUSTOMER_DATA_DIR for the URL
+                relative_path = os.path.relpath(os.path.join(root, filename), CUSTOMER_DATA_DIR)
+                images.append(build_image_entry(relative_path))
+    return images
+
 async def get_customer_images(contact_id: str):
     """
     Scans the directory for a given contact ID and returns a list of all
@@ -907,22 +1135,13 @@ async def get_customer_images(contact_id: str):
     contact_dir = os.path.abspath(os.path.join(CUSTOMER_DATA_DIR, contact_id, "images"))
     logger.info(f"Checking for image directory at absolute path: {contact_dir}")
 
-    if not os.path.isdir(contact_dir):
+    if not await file_io.isdir(contact_dir):
         logger.warning(f"Directory not found for contact {contact_id} at path: {contact_dir}")
         raise HTTPException(status_code=404, detail=f"Image directory not found for contact {contact_id}")
 
     logger.info(f"Directory found. Scanning for images in: {contact_dir}")
-    image_urls = []
-    for root, _, files in os.walk(contact_dir):
-        for filename in files:
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                # Construct the path relative to the CUSTOMER_DATA_DIR for the URL
-                relative_path = os.path.relpath(os.path.join(root, filename), CUSTOMER_DATA_DIR)
-                # Ensure forward slashes for the URL
-                url_path = relative_path.replace(os.sep, '/')
-                image_urls.append(f"{SERVER_BASE_URL}/images/{url_path}")
-    
-    return {"image_urls": image_urls}
+    images = await file_io.run(_scan_customer_images, contact_dir)
+    return {"image_urls": [image["url"] for image in images], "images": images}
 
 
 class ConfirmDeleteChannelView(discord.ui.View):
@@ -941,41 +1160,51 @@ class ConfirmDeleteChannelView(discord.ui.View):
         await interaction.message.delete()
         await interaction.response.send_message("Channel deletion cancelled.", ephemeral=True, delete_after=5)
 
-def get_all_jobs():
+def get_all_jobs(
+    limit: int | None = None,
+    cursor: str | None = None,
+    search: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+):
     """
-    Scans the customer_data directory and returns a list of all jobs,
-    sorted by the most recent service date.
+    Returns jobs from the repository's job index, sorted by the most recent service date,
+    plus the cursor for the next page. Paging is opt-in: without `limit` or `cursor` every
+    matching job is returned, as before; a `cursor` without a `limit` pages by 50.
     """
-    all_jobs = []
-    if not os.path.exists(CUSTOMER_DATA_DIR):
-        return {"jobs": []}
-
-    for contact_id in os.listdir(CUSTOMER_DATA_DIR):
-        customer_dir = os.path.join(CUSTOMER_DATA_DIR, contact_id)
-        if os.path.isdir(customer_dir):
-            customer_file = os.path.join(customer_dir, "customer_data.json")
-            if os.path.exists(customer_file):
-                try:
-                    with open(customer_file, "r") as f:
-                        data = json.load(f)
-                    
-                    p_info = data.get("personal_info", {})
-                    s_history = data.get("service_history", [])
-                    
-                    if p_info and s_history:
-                        job_data = {
-                            "contactId": data.get("client_id"),
-                            "fullName": f"{p_info.get('first_name', '')} {p_info.get('last_name', '')}".strip(),
-                            "address": p_info.get("address"),
-                            "phoneNumber": p_info.get("phone_number"),
-                            "lastServiceDate": s_history[-1].get("service_date")
-                        }
-                        all_jobs.append(job_data)
-                except (json.JSONDecodeError, IndexError):
-                    continue
-    
-    all_jobs.sort(key=lambda x: x.get("lastServiceDate") or "", reverse=True)
-    return {"jobs": all_jobs}
+    if limit is None and cursor:
+        limit = 50
+    for value in (start, end):
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid ISO date: {value}")
+    try:
+        jobs, next_cursor = customer_repo.jobs(limit, cursor=cursor, search=search, start=start, end=end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"jobs": jobs, "nextCursor": next_cursor}
+
+def search_customers(query: str, limit: int = 20) -> dict:
+    """Returns customers matching a name, phone, address or city query, best matches first."""
+    results = []
+    for contact_id, score in customer_search.search(query, limit):
+        customer_data = customer_repo.get(contact_id)
+        if customer_data is None:
+            continue
+        p_info = customer_data.get("personal_info", {})
+        results.append({
+            "contactId": contact_id,
+            "fullName": f"{p_info.get('first_name', '')} {p_info.get('last_name', '')}".strip(),
+            "phoneNumber": p_info.get("phone_number"),
+            "address": p_info.get("address"),
+            "city": p_info.get("city"),
+            "discordChannelId": customer_data.get("discord_channel_id"),
+            "archivedInThreadId": customer_data.get("archived_in_thread_id"),
+            "score": score,
+        })
+    return {"query": query, "results": results}
 
 def create_vcard_file(contact_id: str, customer_data: dict) -> str:
     """Creates a .vcf file for the customer and returns its URL."""
@@ -1042,94 +1271,164 @@ async def send_ghl_sms_invite(contact_id: str, first_name: str, to_number: str):
         f"Here's a link to where you can create your profile : {profile_link}"
     )
 
-    headers = {
-        "Authorization": f"Bearer {GHL_CONVERSATIONS_TOKEN}",
-        "Version": "2021-04-15",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+    try:
+        await queue_ghl_sms(contact_id, formatted_phone, message)
+        return True, "SMS invite queued for delivery."
+    except sqlite3.Error as e:
+        return False, f"Failed to queue SMS invite: {e}"
 
-    payload = {
-        "type": "SMS",
-        "contactId": contact_id,
-        "fromNumber": GHL_SMS_FROM_NUMBER,
-        "toNumber": formatted_phone,
-        "message": message
-    }
+def _checksums_path(images_dir: str) -> str:
+    """customer_data/<id>/images/service_aptN/before -> bot_data/checksums/<id>/images/service_aptN/before.json"""
+    return os.path.join(CHECKSUMS_DIR, os.path.relpath(images_dir, CUSTOMER_DATA_DIR) + ".json")
 
+def _load_folder_checksums(images_dir: str) -> dict[str, str]:
+    """
+    Returns {sha256: filename} for the images already in a folder. Images saved before
+    checksums were recorded are hashed once and added to the record. Blocking; run it on the I/O pool.
+    """
     try:
-        response = requests.post("https://services.leadconnectorhq.com/conversations/messages", headers=headers, json=payload)
-        response.raise_for_status()
-        return True, "SMS invite sent successfully."
-    except requests.exceptions.RequestException as e:
-        # Try to get more error details from the response body if available
-        error_details = e.response.json() if e.response else "No response body"
-        return False, f"Failed to send SMS invite: {error_details}"
+        with open(_checksums_path(images_dir), "r") as f:
+            checksums = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        checksums = {}
+
+    filenames = set(os.listdir(images_dir))
+    changed = False
+    # Forget photos that are no longer in the folder.
+    for sha256, filename in list(checksums.items()):
+        if filename not in filenames:
+            del checksums[sha256]
+            changed = True
+    recorded = set(checksums.values())
+    for filename in filenames:
+        if filename in recorded or not filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp', '.heic')):
+            continue
+        digest = hashlib.sha256()
+        with open(os.path.join(images_dir, filename), "rb") as f:
+            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        checksums.setdefault(digest.hexdigest(), filename)
+        changed = True
+    if changed:
+        _save_folder_checksums(images_dir, checksums)
+    return checksums
+
+def _save_folder_checksums(images_dir: str, checksums: dict[str, str]):
+    checksums_path = _checksums_path(images_dir)
+    os.makedirs(os.path.dirname(checksums_path), exist_ok=True)
+    write_json_atomic(checksums_path, checksums)
+
+async def _download_attachment(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, attachment, images_dir: str):
+    """
+    Streams one attachment to a temp file in `images_dir`, hashing it on the way.
+    Returns (temp path, sha256 hex digest), or None if the download failed.
+    """
+    tmp_path = os.path.join(images_dir, f".{uuid.uuid4().hex}.part")
+    async with semaphore:
+        try:
+            async with session.get(attachment.url) as resp:
+                if resp.status != 200:
+                    logger.warning(f"Failed to download attachment {attachment.filename}: HTTP {resp.status}")
+                    return None
+                digest = hashlib.sha256()
+                f = await file_io.run(open, tmp_path, "wb")
+                try:
+                    async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        digest.update(chunk)
+                        await file_io.run(f.write, chunk)
+                finally:
+                    await file_io.run(f.close)
+            return tmp_path, digest.hexdigest()
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            logger.warning(f"Failed to download attachment {attachment.filename}: {e}")
+            if await file_io.exists(tmp_path):
+                await file_io.run(os.remove, tmp_path)
+            return None
 
 async def download_and_store_images(attachments, contact_id: str, image_type: str):
-    """Downloads Discord attachments and stores them locally organized by service appointment."""
-    import aiohttp
-    
+    """
+    Downloads Discord attachments and stores them locally organized by service appointment.
+
+    Downloads run concurrently on a shared session and stream straight to disk. Each file is
+    named with a short content hash, and photos whose checksum is already in the folder are
+    not stored again; they are returned with 'duplicate': True. New files go through the
+    blob store, so content already stored for another folder only costs a hard link.
+    """
     # Get the current service appointment number for this contact
-    customer_file = os.path.join(CUSTOMER_DATA_DIR, contact_id, "customer_data.json")
-    if not os.path.exists(customer_file):
+    customer_data = customer_repo.get(contact_id)
+    if customer_data is None:
         raise Exception(f"Customer data not found for contact {contact_id}")
     
-    try:
-        with open(customer_file, "r") as f:
-            customer_data = json.load(f)
-        
-        # Get the number of service appointments (this will be the current service number)
-        service_history = customer_data.get("service_history", [])
-        current_service_num = len(service_history)  # This gives us the current service appointment number
-        
-    except (json.JSONDecodeError, IOError) as e:
-        raise Exception(f"Failed to read customer data: {e}")
+    # Get the number of service appointments (this will be the current service number)
+    service_history = customer_data.get("service_history", [])
+    current_service_num = len(service_history)  # This gives us the current service appointment number
     
     # Create directory structure: customer_data/{contact_id}/images/service_apt{num}/{before|after}/
     images_dir = os.path.join(CUSTOMER_DATA_DIR, contact_id, "images", f"service_apt{current_service_num}", image_type)
-    os.makedirs(images_dir, exist_ok=True)
-    
+    await file_io.makedirs(images_dir)
+    checksums = await file_io.run(_load_folder_checksums, images_dir)
+
+    images = [
+        attachment for attachment in attachments
+        if attachment.content_type and attachment.content_type.startswith('image/')
+    ]
+    semaphore = asyncio.Semaphore(ATTACHMENT_DOWNLOAD_CONCURRENCY)
+    session = get_attachment_session()
+    results = await asyncio.gather(
+        *(_download_attachment(session, semaphore, attachment, images_dir) for attachment in images)
+    )
+
     downloaded_files = []
-    
-    async with aiohttp.ClientSession() as session:
-        for i, attachment in enumerate(attachments):
-            if attachment.content_type and attachment.content_type.startswith('image/'):
-                try:
-                    # Generate filename with timestamp and index
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    file_extension = attachment.filename.split('.')[-1] if '.' in attachment.filename else 'jpg'
-                    filename = f"{image_type}_{timestamp}_{i+1}.{file_extension}"
-                    file_path = os.path.join(images_dir, filename)
-                    
-                    # Download the image
-                    async with session.get(attachment.url) as resp:
-                        if resp.status == 200:
-                            with open(file_path, 'wb') as f:
-                                f.write(await resp.read())
-                            downloaded_files.append({
-                                'filename': filename,
-                                'path': file_path,
-                                'original_name': attachment.filename,
-                                'service_appointment': current_service_num
-                            })
-                        else:
-                            pass
-                except Exception as e:
-                    pass
-    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    for i, (attachment, result) in enumerate(zip(images, results)):
+        if result is None:
+            continue
+        tmp_path, sha256 = result
+        file_info = {
+            'original_name': attachment.filename,
+            'service_appointment': current_service_num,
+            'sha256': sha256,
+        }
+
+        existing = checksums.get(sha256)
+        if existing:
+            await file_io.run(os.remove, tmp_path)
+            file_info.update(filename=existing, path=os.path.join(images_dir, existing), duplicate=True)
+            downloaded_files.append(file_info)
+            continue
+
+        file_extension = attachment.filename.rsplit('.', 1)[-1].lower() if '.' in attachment.filename else 'jpg'
+        file_extension = re.sub(r'[^a-z0-9]', '', file_extension) or 'jpg'
+        # The hash keeps names unique even when several uploads land in the same second.
+        filename = f"{image_type}_{timestamp}_{i+1}_{sha256[:12]}.{file_extension}"
+        file_path = os.path.join(images_dir, filename)
+        # Content seen elsewhere (another service or customer) is linked, not stored again.
+        is_new_content = await file_io.run(blob_store.store, tmp_path, sha256, file_path, contact_id)
+        checksums[sha256] = filename
+        file_info.update(filename=filename, path=file_path, duplicate=False, linked=not is_new_content)
+        downloaded_files.append(file_info)
+
+    new_files = [file_info for file_info in downloaded_files if not file_info['duplicate']]
+    if new_files:
+        await file_io.run(_save_folder_checksums, images_dir, checksums)
+
+    # Generate thumb/medium/full variants off the event loop
+    if new_files:
+        variants = await variant_generator.generate([file_info['path'] for file_info in new_files])
+        for file_info in new_files:
+            file_info['variants'] = variants.get(file_info['path'], {})
+            if image_type == 'after':
+                await file_io.run(after_image_catalog.add, os.path.relpath(file_info['path'], CUSTOMER_DATA_DIR))
+
     return downloaded_files
 
 async def send_gallery_link_to_client(contact_id: str, service_apt_num: int):
     """Sends the gallery link to the client via SMS."""
-    customer_file = os.path.join(CUSTOMER_DATA_DIR, contact_id, "customer_data.json")
-    if not os.path.exists(customer_file):
+    customer_data = customer_repo.get(contact_id)
+    if customer_data is None:
         return False, "Customer file not found."
     
     try:
-        with open(customer_file, "r") as f:
-            customer_data = json.load(f)
-        
         p_info = customer_data.get("personal_info", {})
         first_name = p_info.get("first_name", "")
         phone_number = p_info.get("phone_number", "")
@@ -1151,33 +1450,11 @@ async def send_gallery_link_to_client(contact_id: str, service_apt_num: int):
             f"Thank you for choosing Solar Detail!"
         )
 
-        headers = {
-            "Authorization": f"Bearer {GHL_CONVERSATIONS_TOKEN}",
-            "Version": "2021-04-15",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-
-        payload = {
-            "type": "SMS",
-            "contactId": contact_id,
-            "fromNumber": GHL_SMS_FROM_NUMBER,
-            "toNumber": formatted_phone,
-            "message": message
-        }
-
-        response = requests.post("https://services.leadconnectorhq.com/conversations/messages", headers=headers, json=payload)
-        response.raise_for_status()
+        await queue_ghl_sms(contact_id, formatted_phone, message)
         return True, service_gallery_url
         
-    except requests.exceptions.RequestException as e:
-        error_details = str(e)
-        if hasattr(e, 'response') and e.response:
-            try:
-                error_details = e.response.json()
-            except json.JSONDecodeError:
-                error_details = e.response.text
-        return False, f"Failed to send gallery link SMS: {error_details}"
+    except sqlite3.Error as e:
+        return False, f"Failed to queue gallery link SMS: {e}"
     except Exception as e:
         return False, f"An unexpected error occurred in send_gallery_link_to_client: {e}"
 
@@ -1196,85 +1473,39 @@ async def send_review_request_sms(contact_id: str, first_name: str, to_number: s
         "Your feedback helps us improve!"
     )
 
-    headers = {
-        "Authorization": f"Bearer {GHL_CONVERSATIONS_TOKEN}",
-        "Version": "2021-04-15",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-
-    payload = {
-        "type": "SMS",
-        "contactId": contact_id,
-        "fromNumber": GHL_SMS_FROM_NUMBER,
-        "toNumber": formatted_phone,
-        "message": message
-    }
-
     try:
-        response = requests.post("https://services.leadconnectorhq.com/conversations/messages", headers=headers, json=payload)
-        response.raise_for_status()
-        return True, "Review request SMS sent successfully."
-    except requests.exceptions.RequestException as e:
-        error_details = e.response.json() if e.response else "No response body"
-        return False, f"Failed to send review request SMS: {error_details}"
+        await queue_ghl_sms(contact_id, formatted_phone, message)
+        return True, "Review request SMS queued for delivery."
+    except sqlite3.Error as e:
+        return False, f"Failed to queue review request SMS: {e}"
 
 def get_dashboard_stats():
     """
-    Calculates total revenue and total clients from the payments.json file.
+    Returns daily, weekly, monthly and total revenue and total paying clients from the payments ledger.
     """
-    payments_file = os.path.join("bot_data", "payments.json")
-    
-    stats = {
-        "dailyRevenue": 0.0,
-        "weeklyRevenue": 0.0,
-        "monthlyRevenue": 0.0,
-        "totalRevenue": 0.0,
-        "totalClients": 0
-    }
-    paid_clients = set()
-
-    if not os.path.exists(payments_file):
-        logger.warning("payments.json not found. Returning zero stats.")
-        return stats
-
     try:
-        with open(payments_file, "r") as f:
-            payments_data = json.load(f)
-        
-        now = datetime.now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_start = today_start - timedelta(days=now.weekday())
-        month_start = today_start.replace(day=1)
-
-        for payment in payments_data:
-            amount = float(payment.get("amount", 0))
-            contact_id = payment.get("contact_id")
-            date_str = payment.get("date")
-
-            if amount > 0:
-                stats["totalRevenue"] += amount
-                if contact_id:
-                    paid_clients.add(contact_id)
-
-                if date_str:
-                    try:
-                        payment_time = datetime.fromisoformat(date_str)
-                        if payment_time >= today_start:
-                            stats["dailyRevenue"] += amount
-                        if payment_time >= week_start:
-                            stats["weeklyRevenue"] += amount
-                        if payment_time >= month_start:
-                            stats["monthlyRevenue"] += amount
-                    except ValueError:
-                        logger.warning(f"Could not parse date: {date_str}")
-
-    except (json.JSONDecodeError, IOError, ValueError) as e:
-        logger.error(f"Error processing payments.json: {e}")
-        return stats
-
-    stats["totalClients"] = len(paid_clients)
-    return stats
+        return payments_ledger.stats()
+    except sqlite3.Error as e:
+        logger.error(f"Error reading payment stats: {e}")
+        return {
+            "dailyRevenue": 0.0,
+            "weeklyRevenue": 0.0,
+            "monthlyRevenue": 0.0,
+            "totalRevenue": 0.0,
+            "totalClients": 0
+        }
+
+def _scan_service_images(contact_id: str, service_number: int, image_type: str) -> list[dict]:
+    """Lists one before/after folder of a service appointment. Blocking; run it on the I/O pool."""
+    image_dir = os.path.join(CUSTOMER_DATA_DIR, contact_id, "images", f"service_apt{service_number}", image_type)
+    if not os.path.isdir(image_dir):
+        return []
+    images = []
+    for filename in sorted(os.listdir(image_dir)):
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
+            relative_path = os.path.join(contact_id, "images", f"service_apt{service_number}", image_type, filename)
+            images.append(build_image_entry(relative_path))
+    return images
 
 async def get_service_images_and_details(contact_id: str, service_number: int):
     """
@@ -1282,15 +1513,12 @@ async def get_service_images_and_details(contact_id: str, service_number: int):
     """
     logger.info(f"Getting images and details for contact {contact_id}, service #{service_number}")
     
-    customer_file = os.path.join(CUSTOMER_DATA_DIR, contact_id, "customer_data.json")
-    if not os.path.exists(customer_file):
+    customer_data = customer_repo.get(contact_id)
+    if customer_data is None:
         raise HTTPException(status_code=404, detail="Customer data file not found.")
 
     service_details = {}
     try:
-        with open(customer_file, "r") as f:
-            customer_data = json.load(f)
-        
         if 0 < service_number <= len(customer_data.get("service_history", [])):
             service_record = customer_data["service_history"][service_number - 1]
             service_details = {
@@ -1299,33 +1527,17 @@ async def get_service_images_and_details(contact_id: str, service_number: int):
                 "quote_amount": service_record.get("quote_amount"),
                 "follow_up_date": service_record.get("follow_up_date")
             }
-    except (json.JSONDecodeError, IndexError) as e:
+    except (IndexError, KeyError) as e:
         logger.error(f"Error reading service history for {contact_id}: {e}")
         pass
 
     service_dir = os.path.join(CUSTOMER_DATA_DIR, contact_id, "images", f"service_apt{service_number}")
-    if not os.path.isdir(service_dir):
+    if not await file_io.isdir(service_dir):
         return {"service_details": service_details, "images": {"before_images": [], "after_images": []}}
 
-    before_urls = []
-    after_urls = []
-
-    before_dir = os.path.join(service_dir, "before")
-    if os.path.isdir(before_dir):
-        for filename in sorted(os.listdir(before_dir)):
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                relative_path = os.path.join(contact_id, "images", f"service_apt{service_number}", "before", filename).replace(os.sep, '/')
-                url = f"{SERVER_BASE_URL}/images/{relative_path}"
-                before_urls.append({"url": url, "filename": filename})
+    before_urls = await file_io.run(_scan_service_images, contact_id, service_number, "before")
+    after_urls = await file_io.run(_scan_service_images, contact_id, service_number, "after")
 
-    after_dir = os.path.join(service_dir, "after")
-    if os.path.isdir(after_dir):
-        for filename in sorted(os.listdir(after_dir)):
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                relative_path = os.path.join(contact_id, "images", f"service_apt{service_number}", "after", filename).replace(os.sep, '/')
-                url = f"{SERVER_BASE_URL}/images/{relative_path}"
-                after_urls.append({"url": url, "filename": filename})
-    
     return {
         "service_details": service_details,
         "images": {
@@ -1336,82 +1548,32 @@ async def get_service_images_and_details(contact_id: str, service_number: int):
 
 async def get_random_after_image():
     """
-    Scans all customer directories to find all 'after' images and returns a
-    randomly selected one.
+    Returns a randomly selected 'after' image from the in-memory catalog.
     """
-    import random
-    all_after_images = []
-    
-    if not os.path.exists(CUSTOMER_DATA_DIR):
-        raise HTTPException(status_code=500, detail="Customer data directory not found.")
-
-    for contact_id in os.listdir(CUSTOMER_DATA_DIR):
-        contact_dir = os.path.join(CUSTOMER_DATA_DIR, contact_id)
-        if os.path.isdir(contact_dir):
-            images_dir = os.path.join(contact_dir, "images")
-            if os.path.isdir(images_dir):
-                for service_apt_dir in os.listdir(images_dir):
-                    if os.path.isdir(os.path.join(images_dir, service_apt_dir)):
-                        after_dir = os.path.join(images_dir, service_apt_dir, "after")
-                        if os.path.isdir(after_dir):
-                            for filename in os.listdir(after_dir):
-                                if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                                    # Construct the full public URL
-                                    relative_path = os.path.join(contact_id, "images", service_apt_dir, "after", filename).replace(os.sep, '/')
-                                    url = f"{SERVER_BASE_URL}/images/{relative_path}"
-                                    all_after_images.append(url)
-
-    if not all_after_images:
+    random_image = after_image_catalog.choice()
+    if random_image is None:
         raise HTTPException(status_code=404, detail="No 'after' images found anywhere.")
 
-    random_image_url = random.choice(all_after_images)
-    
-    return {"imageUrl": random_image_url}
+    return {"imageUrl": random_image["url"], "image": random_image}
 
 async def get_random_after_images(count: int):
     """
-    Scans all customer directories to find all 'after' images and returns a
-    unique list of randomly selected ones.
+    Returns a unique list of randomly selected 'after' images from the in-memory catalog.
     """
-    import random
-    all_after_images = []
-    
-    if not os.path.exists(CUSTOMER_DATA_DIR):
-        raise HTTPException(status_code=500, detail="Customer data directory not found.")
-
-    # This logic is the same as the single image function
-    for contact_id in os.listdir(CUSTOMER_DATA_DIR):
-        contact_dir = os.path.join(CUSTOMER_DATA_DIR, contact_id)
-        if os.path.isdir(contact_dir):
-            images_dir = os.path.join(contact_dir, "images")
-            if os.path.isdir(images_dir):
-                for service_apt_dir in os.listdir(images_dir):
-                    if os.path.isdir(os.path.join(images_dir, service_apt_dir)):
-                        after_dir = os.path.join(images_dir, service_apt_dir, "after")
-                        if os.path.isdir(after_dir):
-                            for filename in os.listdir(after_dir):
-                                if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                                    relative_path = os.path.join(contact_id, "images", service_apt_dir, "after", filename).replace(os.sep, '/')
-                                    url = f"{SERVER_BASE_URL}/images/{relative_path}"
-                                    all_after_images.append(url)
-
-    if not all_after_images:
+    if len(after_image_catalog) == 0:
         raise HTTPException(status_code=404, detail="No 'after' images found.")
 
-    # Ensure we don't request more images than are available
-    num_to_sample = min(count, len(all_after_images))
+    # Sampling never returns more images than are available
+    random_images = after_image_catalog.sample(count)
     
-    # Use random.sample to get a unique list of images
-    random_image_urls = random.sample(all_after_images, num_to_sample)
-    
-    return {"imageUrls": random_image_urls}
+    return {"imageUrls": [image["url"] for image in random_images], "images": random_images}
 
 
 async def check_contact_exists_in_dashboard(contact_id: str):
     """Check if contactId exists in the customer dashboard system."""
     try:
-        response = requests.get(f"{DASHBOARD_BASE_URL}/api/backend/sync-pictures?contactId={contact_id}")
-        if response.status_code == 200:
+        response = await ghl_client.get(f"{DASHBOARD_BASE_URL}/api/backend/sync-pictures", params={"contactId": contact_id})
+        if response.status == 200 and isinstance(response.json(), dict):
             data = response.json()
             return data.get('exists', False), data
         else:
@@ -1428,10 +1590,10 @@ async def sync_service_to_dashboard(contact_id: str, service_apt_num: int, befor
         return False, "Contact not found in dashboard system"
     
     # Get customer data for service details
-    customer_file = os.path.join(CUSTOMER_DATA_DIR, contact_id, "customer_data.json")
     try:
-        with open(customer_file, "r") as f:
-            customer_data = json.load(f)
+        customer_data = customer_repo.get(contact_id)
+        if customer_data is None:
+            raise KeyError(contact_id)
         
         p_info = customer_data.get("personal_info", {})
         service_history = customer_data.get("service_history", [])
@@ -1480,20 +1642,24 @@ async def sync_service_to_dashboard(contact_id: str, service_apt_num: int, befor
     }
     
     try:
-        response = requests.post(f"{DASHBOARD_BASE_URL}/api/backend/sync-pictures", json=payload)
+        response = await ghl_client.post(f"{DASHBOARD_BASE_URL}/api/backend/sync-pictures", json_body=payload)
         
-        if response.status_code == 200:
+        if response.status == 200:
             result = response.json()
             return True, result
         else:
-            error_msg = f"Dashboard sync failed: HTTP {response.status_code} - {response.text}"
+            error_msg = f"Dashboard sync failed: HTTP {response.status} - {response.data}"
             return False, error_msg
             
+    except GHLRequestError as e:
+        error_msg = f"Dashboard sync failed: HTTP {e.status} - {e.details}"
+        return False, error_msg
     except Exception as e:
         error_msg = f"Error syncing to dashboard: {e}"
         return False, error_msg
 
-async def create_customer_channel_and_post(customer_data: dict):
+async def create_customer_channel_and_post(customer_data: dict) -> int | None:
+    """Creates the customer's Discord channel and posts the intro messages. Returns the channel ID, or None on failure."""
     try:
         # Find the guild (server) - assuming the bot is in only one server
         if not client.guilds:
@@ -1522,13 +1688,16 @@ async def create_customer_channel_and_post(customer_data: dict):
 
         # --- IMPORTANT: Save the channel ID to the customer's file ---
         customer_data["discord_channel_id"] = new_channel.id
-        customer_file_path = os.path.join(CUSTOMER_DATA_DIR, customer_data["client_id"], "customer_data.json")
         try:
-            with open(customer_file_path, "w") as f:
-                json.dump(customer_data, f, indent=4)
-        except IOError as e:
+            # Only set the channel ID so edits made since provisioning started are kept.
+            await customer_repo.update(
+                customer_data["client_id"],
+                lambda stored: stored.update(discord_channel_id=new_channel.id),
+            )
+        except (IOError, json.JSONDecodeError) as e:
             logger.error(f"Failed to save discord_channel_id to customer file. Error: {e}")
             # Continue anyway, but log the error
+        await file_io.run(channel_map.set, new_channel.id, customer_data["client_id"])
 
         # Prepare data for the message
         p_info = customer_data["personal_info"]
@@ -1543,7 +1712,7 @@ async def create_customer_channel_and_post(customer_data: dict):
         apple_maps_link = f"https://maps.apple.com/?q={quote_plus(full_address)}" if full_address != 'N/A' else "Not Available"
 
         # Generate the vCard and get its URL
-        vcard_url = create_vcard_file(customer_data["client_id"], customer_data)
+        vcard_url = await file_io.run(create_vcard_file, customer_data["client_id"], customer_data)
 
         # Determine if it's a natural booking or admin-created
         is_natural_booking = service_details.get("solar_cleaning") or service_details.get("pigeon_meshing")
@@ -1557,10 +1726,13 @@ async def create_customer_channel_and_post(customer_data: dict):
         message1_content += f"**Name:** {full_name}\n"
         message1_content += f"**Phone Number:** {format_phone_for_display(phone_number)}\n"
         message1_content += "**Address:**"
-        await new_channel.send(message1_content)
 
         # --- Message 2: Just the Address ---
-        await new_channel.send(full_address)
+        # Kept as its own message so it can be copied straight into a maps app.
+        sends = [
+            discord_sender.post(new_channel, message1_content, merge=False),
+            discord_sender.post(new_channel, full_address, merge=False),
+        ]
 
         # --- Message 3: Service Details, Contacts, Maps ---
         message3_content = ""
@@ -1583,20 +1755,79 @@ async def create_customer_channel_and_post(customer_data: dict):
 
         message3_content += f"**Add to Contacts:** [Click to Download]({vcard_url})\n"
         message3_content += f"**Apple Maps Link:** {apple_maps_link}"
-        await new_channel.send(message3_content)
+        sends.append(discord_sender.post(new_channel, message3_content))
 
         # --- Message 4: Warning if no phone number ---
+        # Merged into message 3 by the sender when it fits.
         if not phone_number:
-            await new_channel.send(
+            sends.append(discord_sender.post(
+                new_channel,
                 "⚠️ **Action Required**: This client was created without a phone number. "
                 "A phone number is required to send quotes and gallery links. "
                 "Please add one when available to sync with GoHighLevel."
-            )
+            ))
+        await asyncio.gather(*sends)
+
+        return new_channel.id
 
     except Exception as e:
         logger.error(f"An unexpected error occurred in create_customer_channel_and_post: {e}")
         logger.error(traceback.format_exc())
 
+async def provision_customer_channel(contact_id: str) -> dict:
+    """Background provisioning job for a newly stored customer."""
+    # The bot may still be connecting right after a restart.
+    await asyncio.wait_for(client.wait_until_ready(), timeout=120)
+
+    # Use the latest stored document so edits made since the webhook are not overwritten.
+    customer_data = customer_repo.get(contact_id)
+    if customer_data is None:
+        raise RuntimeError(f"Customer {contact_id} no longer exists.")
+    # A job resumed after a restart may already have created the channel.
+    if customer_data.get("discord_channel_id"):
+        logger.info(f"Customer {contact_id} already has channel {customer_data['discord_channel_id']}; skipping provisioning.")
+        return {"discord_channel_id": customer_data["discord_channel_id"]}
+
+    channel_id = await create_customer_channel_and_post(customer_data)
+    if channel_id is None:
+        raise RuntimeError("Discord channel could not be created. See server logs for details.")
+    return {"discord_channel_id": channel_id}
+
+async def get_provisioning_status(contact_id: str) -> dict:
+    """Returns the provisioning status for a contact created by /customer/create."""
+    status = await file_io.run(provisioning_tracker.status, contact_id)
+    if status is not None:
+        return status
+
+    # No job on record (e.g. the customer predates the provisioning queue); infer it from the stored record.
+    customer_data = customer_repo.get(contact_id)
+    if customer_data is None:
+        raise HTTPException(status_code=404, detail=f"Customer not found for contact ID: {contact_id}")
+    return {
+        "contact_id": contact_id,
+        "status": "completed" if customer_data.get("discord_channel_id") else "unknown",
+        "discord_channel_id": customer_data.get("discord_channel_id"),
+    }
+
+def get_archive_job(job_id: str) -> dict:
+    """Returns the status and progress of a channel archive job."""
+    job = archive_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Archive job not found: {job_id}")
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "channelId": job["channel_id"],
+        "channelName": job["channel_name"],
+        "contactId": job["contact_id"],
+        "messagesExported": job["message_count"],
+        "threadId": job["thread_id"],
+        "error": job["error"],
+        "createdAt": datetime.utcfromtimestamp(job["created_at"]).isoformat(),
+        "finishedAt": datetime.utcfromtimestamp(job["finished_at"]).isoformat() if job["finished_at"] else None,
+    }
+
 async def create_customer(payload: VercelWebhookPayload):
     """
     Webhook to create a GHL contact, then create a customer folder using the GHL ID.
@@ -1621,7 +1852,7 @@ async def create_customer(payload: VercelWebhookPayload):
                 raise HTTPException(status_code=400, detail="The provided phone number is invalid.")
             
             logger.info("Phone number provided. Attempting to create or find GHL contact...")
-            contact_id, is_new = create_ghl_contact(
+            contact_id, is_new = await create_ghl_contact(
                 first_name=form_data.firstName,
                 last_name=last_name_to_use,
                 phone=cleaned_phone,
@@ -1638,7 +1869,7 @@ async def create_customer(payload: VercelWebhookPayload):
 
             if not is_new:
                 logger.info(f"Contact {contact_id} already exists in GHL, attempting to update.")
-                update_success = update_ghl_contact(
+                update_success = await update_ghl_contact(
                     contact_id=contact_id,
                     first_name=form_data.firstName,
                     last_name=last_name_to_use,
@@ -1659,8 +1890,8 @@ async def create_customer(payload: VercelWebhookPayload):
 
         try:
             logger.info(f"Creating customer directory: {customer_dir}")
-            # Use exist_ok=True in case we are updating an existing customer's service.
-            os.makedirs(customer_dir, exist_ok=True)
+            # makedirs uses exist_ok=True in case we are updating an existing customer's service.
+            await file_io.makedirs(customer_dir)
         except OSError as e:
             logger.error(f"Failed to create customer directory: {customer_dir}. Error: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to create customer directory: {e}")
@@ -1699,13 +1930,11 @@ async def create_customer(payload: VercelWebhookPayload):
                 "panel_count": form_data.panelCount or 0,
             }
             try:
-                logger.info(f"Sending quote details to webhook for contact {contact_id}")
-                response = requests.post(quote_webhook_url, json=quote_payload)
-                response.raise_for_status()
-                logger.info(f"Successfully sent quote details for contact {contact_id}. Status: {response.status_code}")
-            except requests.exceptions.RequestException as e:
+                logger.info(f"Queueing quote details webhook for contact {contact_id}")
+                await queue_ghl_webhook("quote", quote_webhook_url, quote_payload)
+            except sqlite3.Error as e:
                 # Log the error but don't stop the process
-                logger.error(f"Failed to send quote details for contact {contact_id}. Error: {e}")
+                logger.error(f"Failed to queue quote details for contact {contact_id}. Error: {e}")
 
         customer_data = {
             "client_id": contact_id,  # GHL Contact ID is the main ID
@@ -1736,21 +1965,25 @@ async def create_customer(payload: VercelWebhookPayload):
             "created_at": datetime.utcnow().isoformat(),
         }
 
-        file_path = os.path.join(customer_dir, "customer_data.json")
+        file_path = customer_repo.customer_file(contact_id)
         try:
             logger.info(f"Writing customer data to {file_path}")
-            with open(file_path, "w") as f:
-                json.dump(customer_data, f, indent=4)
+            await customer_repo.save(customer_data)
         except IOError as e:
             logger.error(f"Failed to write customer data to {file_path}. Error: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to write customer data: {e}")
 
-        # Trigger the Discord bot to create the channel and post the message
-        logger.info("Triggering Discord channel creation...")
-        await create_customer_channel_and_post(customer_data)
-        logger.info("Successfully completed customer creation process.")
+        # Create the Discord channel and post the messages in the background
+        logger.info("Queueing Discord channel provisioning...")
+        provisioning = await file_io.run(provisioning_tracker.submit, contact_id)
+        provisioning_tracker.schedule(contact_id)
+        logger.info("Customer stored. Discord provisioning continues in the background.")
 
-        return {"message": "Customer folder created/updated successfully", "contact_id": contact_id}
+        return {
+            "message": "Customer folder created/updated successfully",
+            "contact_id": contact_id,
+            "provisioning_status": provisioning["status"],
+        }
 
     except Exception as e:
         logger.error(f"An unhandled exception occurred in /customer/create endpoint: {e}")
@@ -1760,63 +1993,139 @@ async def create_customer(payload: VercelWebhookPayload):
 async def add_new_service_to_customer(payload: NewServicePayload):
     """Adds a new service entry to an existing customer's file."""
     contact_id = payload.contactId
-    customer_file = os.path.join(CUSTOMER_DATA_DIR, contact_id, "customer_data.json")
-
-    if not os.path.exists(customer_file):
-        raise HTTPException(status_code=404, detail=f"Customer file not found for contact ID: {contact_id}")
-
     try:
-        with open(customer_file, "r+") as f:
-            customer_data = json.load(f)
-            
-            new_service = {
-                "service_date": datetime.utcnow().isoformat(),
-                "quote_amount": float(payload.totalAmount),
-                "service_details": {
-                    "price_per_panel": float(payload.pricePerPanel),
-                    "panel_count": int(payload.panelCount),
-                    # Since this is admin-created, we assume no specific services were booked
-                    "solar_cleaning": False,
-                    "pigeon_meshing": False,
-                },
-                "follow_up_date": (datetime.utcnow() + timedelta(days=90)).isoformat(),
-            }
-            
-            customer_data.get("service_history", []).append(new_service)
-            
-            # Rewind and write back
-            f.seek(0)
-            json.dump(customer_data, f, indent=4)
-            f.truncate()
-
-            # Post update to Discord
-            channel_id = customer_data.get("discord_channel_id")
-            if channel_id:
-                channel = client.get_channel(channel_id)
-                if channel:
-                    # Fetch full name for a more personalized message
-                    p_info = customer_data.get("personal_info", {})
-                    full_name = f"{p_info.get('first_name', '')} {p_info.get('last_name', '')}".strip()
-                    
-                    # Safely convert totalAmount to float for formatting
-                    total_amount_float = 0.0
-                    try:
-                        total_amount_float = float(payload.totalAmount)
-                    except (ValueError, TypeError):
-                        pass # Keep it 0.0 if conversion fails
-                    
-                    message_content = (
-                        f"**New Service Ticket Created for {full_name}**\n\n"
-                        f"**Price Per Panel:** ${payload.pricePerPanel} | **# of Panels:** {payload.panelCount}\n"
-                        f"**Quoted:** ${total_amount_float:.2f}\n"
-                    )
-                    await channel.send(message_content)
-            return customer_data
+        new_service = {
+            "service_date": datetime.utcnow().isoformat(),
+            "quote_amount": float(payload.totalAmount),
+            "service_details": {
+                "price_per_panel": float(payload.pricePerPanel),
+                "panel_count": int(payload.panelCount),
+                # Since this is admin-created, we assume no specific services were booked
+                "solar_cleaning": False,
+                "pigeon_meshing": False,
+            },
+            "follow_up_date": (datetime.utcnow() + timedelta(days=90)).isoformat(),
+        }
+
+        try:
+            customer_data = await customer_repo.update(
+                contact_id,
+                lambda stored: stored.setdefault("service_history", []).append(new_service),
+            )
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Customer file not found for contact ID: {contact_id}")
+
+        # Post update to Discord
+        channel_id = customer_data.get("discord_channel_id")
+        if channel_id:
+            channel = client.get_channel(channel_id)
+            if channel:
+                # Fetch full name for a more personalized message
+                p_info = customer_data.get("personal_info", {})
+                full_name = f"{p_info.get('first_name', '')} {p_info.get('last_name', '')}".strip()
+
+                # Safely convert totalAmount to float for formatting
+                total_amount_float = 0.0
+                try:
+                    total_amount_float = float(payload.totalAmount)
+                except (ValueError, TypeError):
+                    pass # Keep it 0.0 if conversion fails
+
+                message_content = (
+                    f"**New Service Ticket Created for {full_name}**\n\n"
+                    f"**Price Per Panel:** ${payload.pricePerPanel} | **# of Panels:** {payload.panelCount}\n"
+                    f"**Quoted:** ${total_amount_float:.2f}\n"
+                )
+                await discord_sender.send(channel, message_content)
+        return customer_data
 
     except (IOError, json.JSONDecodeError, ValueError) as e:
         logger.error(f"Error updating customer file for {contact_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to update customer service history.")
 
+def get_calendar_availability(request: Request, days: int, panel_count: int | None = None):
+    """
+    Returns {"days": {YYYY-MM-DD: [ISO start times]}} for the booking page.
+    The ETag is checked before any slots are computed, so an unchanged calendar costs one stat.
+    """
+    etag = calendar_manager.availability_etag(days, panel_count)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    slots = calendar_manager.get_bulk_available_slots(days, panel_count)
+    return Response(content=json.dumps({"days": slots}), media_type="application/json", headers=headers)
+
+def require_internal_api_key(x_api_key: str | None = Header(None, alias="X-API-Key")):
+    """Route dependency for internal endpoints: the X-API-Key header must match INTERNAL_API_KEY."""
+    if not INTERNAL_API_KEY:
+        raise HTTPException(status_code=503, detail="INTERNAL_API_KEY is not configured on the server.")
+    if not x_api_key or not secrets.compare_digest(x_api_key, INTERNAL_API_KEY):
+        raise HTTPException(status_code=401, detail="Missing or invalid X-API-Key header.")
+
+def book_calendar_appointment(payload: AppointmentBooking):
+    """Books an appointment through calendar_manager; a taken slot is a 409."""
+    success, message = calendar_manager.book_appointment(payload.contact_id, payload.start_time_iso, payload.panel_count)
+    if not success:
+        status_code = 409 if "not available" in message else 400
+        raise HTTPException(status_code=status_code, detail=message)
+    logger.info(message)
+    return {"status": "success", "message": message}
+
+def cancel_calendar_appointment(payload: AppointmentBooking):
+    success, message = calendar_manager.cancel_appointment(payload.contact_id, payload.start_time_iso)
+    if not success:
+        raise HTTPException(status_code=404 if "No matching" in message else 400, detail=message)
+    logger.info(message)
+    return {"status": "success", "message": message}
+
+def plan_calendar_routes(target_date: date, keep_crews: bool = False):
+    """
+    Plans driving routes for the day's appointments. By default jobs are regrouped by area
+    across crews; with keep_crews each crew keeps its bookings and only the order changes.
+    Returns suggested start times; the calendar itself is not modified.
+    """
+    stops = []
+    for appt in calendar_manager.get_appointments_for_day(target_date):
+        customer_data = customer_repo.get(appt.get("contact_id")) or {}
+        p_info = customer_data.get("personal_info", {})
+        address = p_info.get("address")
+        start = datetime.fromisoformat(appt["start_time"])
+        end = datetime.fromisoformat(appt["end_time"]) if appt.get("end_time") else start + timedelta(hours=calendar_manager.APPOINTMENT_DURATION_HOURS)
+        stops.append(route_planner.Stop(
+            contact_id=appt.get("contact_id"),
+            address=address,
+            duration_minutes=int((end - start).total_seconds() // 60),
+            location=geocode_cache.lookup(address, p_info.get("city")),
+            crew=appt.get("crew"),
+            extra={
+                "fullName": f"{p_info.get('first_name', '')} {p_info.get('last_name', '')}".strip(),
+                "bookedCrew": appt.get("crew"),
+                "bookedStart": appt["start_time"],
+            },
+        ))
+
+    plan = route_planner.plan_routes(
+        stops,
+        calendar_manager.CREWS,
+        calendar_manager.DAY_START_MINUTE,
+        calendar_manager.DAY_END_MINUTE,
+        calendar_manager.SLOT_INCREMENT_MINUTES,
+        keep_crews=keep_crews,
+    )
+
+    def to_local_iso(minute: int) -> str:
+        return calendar_manager.TIMEZONE.localize(
+            datetime(target_date.year, target_date.month, target_date.day) + timedelta(minutes=minute)
+        ).isoformat()
+
+    for route in plan["routes"]:
+        for stop in route["stops"]:
+            stop["start"] = to_local_iso(stop.pop("startMinute"))
+            stop["end"] = to_local_iso(stop.pop("endMinute"))
+    return {"date": target_date.isoformat(), **plan}
+
 
 # --- Final API Endpoint Definitions ---
 # It's good practice to define routes after the functions they call.
@@ -1831,7 +2140,7 @@ async def final_get_random_after_image():
 
 @app.get("/api/dashboard-stats")
 async def final_get_dashboard_stats():
-    return get_dashboard_stats()
+    return await file_io.run(get_dashboard_stats)
 
 @app.get("/membership/details")
 async def final_get_membership_details(contact_id: str = Query(..., alias="contactId")):
@@ -1842,26 +2151,135 @@ async def final_get_service_data(contact_id: str, service_number: int):
     """Unified endpoint to get both images and details for a service appointment."""
     return await get_service_images_and_details(contact_id, service_number)
 
+@app.get("/api/search")
+def final_search_customers(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+):
+    return search_customers(q, limit)
+
 @app.get("/api/payments")
-async def get_payments_data():
-    payments_file = os.path.join("bot_data", "payments.json")
-    if not os.path.exists(payments_file):
-        return []
-    with open(payments_file, "r") as f:
-        return json.load(f)
+async def get_payments_data(
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: int | None = None,
+    start: str | None = None,
+    end: str | None = None,
+    contact_id: str | None = Query(None, alias="contactId"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """
+    Returns payments in insertion order.
+
+    Without any paging or filter parameters, JSON mode returns every payment as a bare array,
+    as it always has. With `limit`, `cursor`, `start`, `end` or `contactId` it returns one page
+    ({"payments": [...], "nextCursor": ...}) of `limit` rows (default 100); pass `nextCursor`
+    back as `cursor` for the next page. NDJSON mode streams
+    one payment per line and only stops early if `limit` is given. `start`/`end` filter by
+    ISO date or datetime and `contactId` by client. Responses carry ETag and Last-Modified,
+    and an unchanged ledger answers conditional requests with 304.
+    """
+    for value in (start, end):
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid ISO date: {value}")
+
+    last_id, last_date = await file_io.run(payments_ledger.version)
+    etag = f'"payments-{last_id}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    last_modified = None
+    if last_date:
+        last_modified = datetime.fromisoformat(last_date).replace(microsecond=0, tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif last_modified and request.headers.get("if-modified-since"):
+        try:
+            if last_modified <= parsedate_to_datetime(request.headers["if-modified-since"]):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    filters = {"after_id": cursor, "start": start, "end": end, "contact_id": contact_id}
+
+    if format == "ndjson":
+        rows = payments_ledger.iter_payments(limit=limit, **filters)
+        return StreamingResponse((json.dumps(row) + "\n" for row in rows), media_type="application/x-ndjson", headers=headers)
+
+    if limit is None and all(value is None for value in filters.values()):
+        payments = await file_io.run(payments_ledger.all)
+        return Response(content=json.dumps(payments), media_type="application/json", headers=headers)
+
+    page_size = limit or 100
+    # Fetch one extra row to know whether another page exists
+    payments = await file_io.run(lambda: list(payments_ledger.iter_payments(limit=page_size + 1, **filters)))
+    next_cursor = None
+    if len(payments) > page_size:
+        payments = payments[:page_size]
+        next_cursor = payments[-1]["id"]
+
+    return Response(
+        content=json.dumps({"payments": payments, "nextCursor": next_cursor}),
+        media_type="application/json",
+        headers=headers,
+    )
 
 @app.get("/api/images/{contact_id}")
 async def final_get_customer_images(contact_id: str):
     return await get_customer_images(contact_id)
 
 @app.get("/jobs")
-def final_get_all_jobs():
-    return get_all_jobs()
+def final_get_all_jobs(
+    limit: int | None = Query(None, ge=1, le=500),
+    cursor: str | None = None,
+    search: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+):
+    return get_all_jobs(limit, cursor, search, start, end)
+
+# The calendar routes are plain `def` so FastAPI runs them in its thread pool:
+# booking may wait on the cross-process calendar lock.
+@app.get("/calendar/availability")
+def final_get_calendar_availability(
+    request: Request,
+    days: int = Query(30, ge=1, le=90),
+    panel_count: int | None = Query(None, alias="panelCount", ge=1),
+):
+    return get_calendar_availability(request, days, panel_count)
+
+@app.get("/calendar/routes", dependencies=[Depends(require_internal_api_key)])
+def final_plan_calendar_routes(
+    target_date: date = Query(..., alias="date"),
+    keep_crews: bool = Query(False, alias="keepCrews"),
+):
+    return plan_calendar_routes(target_date, keep_crews)
+
+@app.post("/calendar/book", dependencies=[Depends(require_internal_api_key)])
+def final_book_calendar_appointment(payload: AppointmentBooking):
+    return book_calendar_appointment(payload)
+
+@app.post("/calendar/cancel", dependencies=[Depends(require_internal_api_key)])
+def final_cancel_calendar_appointment(payload: AppointmentBooking):
+    return cancel_calendar_appointment(payload)
 
 @app.post("/customer/create")
 async def final_create_customer(payload: VercelWebhookPayload):
     return await create_customer(payload)
 
+@app.get("/customer/{contact_id}/provisioning")
+async def final_get_provisioning_status(contact_id: str):
+    return await get_provisioning_status(contact_id)
+
+@app.get("/archive/jobs/{job_id}")
+def final_get_archive_job(job_id: str):
+    return get_archive_job(job_id)
+
 @app.post("/customer/add-service")
 async def final_add_new_service(payload: NewServicePayload):
     return await add_new_service_to_customer(payload)
@@ -1869,10 +2287,32 @@ async def final_add_new_service(payload: NewServicePayload):
 
 @app.on_event("startup")
 async def startup_event():
+    # Index the customer files once so lookups don't rescan customer_data/
+    customer_repo.load()
+    customer_search.rebuild(customer_repo.customers())
+    channel_map.load(customer_repo.customers())
+    after_image_catalog.load(customer_repo.contact_ids())
     # Start the Discord bot in the background
     asyncio.create_task(client.start(BOT_TOKEN))
     # Start the scheduler
     scheduler.start()
+    # Start delivering queued webhooks and SMS, including any left over from the last run
+    outbound_queue.register("ghl_webhook", deliver_ghl_webhook)
+    outbound_queue.register("ghl_sms", deliver_ghl_sms)
+    await outbound_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Let in-flight deliveries finish, then close the pooled HTTP session
+    await outbound_queue.stop()
+    # Running archives stop here and continue from their checkpoint on the next start
+    await archive_jobs.stop()
+    await provisioning_tracker.stop()
+    await ghl_client.close()
+    if attachment_session is not None:
+        await attachment_session.close()
+    variant_generator.shutdown()
+    file_io.shutdown()
 
 class ConfirmDeleteView(discord.ui.View):
     def __init__(self, contact_id: str):
@@ -1885,11 +2325,18 @@ class ConfirmDeleteView(discord.ui.View):
         channel_name = interaction.channel.name
 
         try:
-            if os.path.exists(customer_dir):
-                import shutil
-                shutil.rmtree(customer_dir)
+            if await file_io.exists(customer_dir):
+                await file_io.rmtree(customer_dir)
+            checksums_dir = os.path.join(CHECKSUMS_DIR, self.contact_id)
+            if await file_io.exists(checksums_dir):
+                await file_io.rmtree(checksums_dir)
+            await customer_repo.remove(self.contact_id)
+            after_image_catalog.remove_contact(self.contact_id)
+            await file_io.run(blob_store.release_contact, self.contact_id)
             
             await interaction.channel.delete(reason=f"Deleted by {interaction.user.name}")
+            # The customer is gone, so drop every channel still mapped to them, not just this one.
+            await file_io.run(channel_map.remove_contact, self.contact_id)
             
             # Send a confirmation in the parent category or a log channel if possible
             # This part is optional and depends on where you want logs to go.
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable
+
+import file_io
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class PermanentDeliveryError(Exception):
+    """Raised by a handler when retrying the delivery cannot help."""
+
+    retryable = False
+
+
+class OutboundQueue:
+    """
+    Durable queue for outbound webhooks and SMS.
+
+    Callers enqueue a delivery and return immediately; a dispatcher task hands due deliveries
+    to their registered handler with at most `concurrency` in flight. A handler signals failure
+    by raising. Failures are retried with exponential backoff unless the exception has
+    `retryable = False`, and deliveries that run out of attempts are moved to the dead_letters
+    table. Everything is stored in SQLite, so pending deliveries survive a restart.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        concurrency: int = 4,
+        max_attempts: int = 6,
+        backoff_base: float = 2.0,
+        backoff_max: float = 300.0,
+        idle_poll_interval: float = 30.0,
+    ):
+        self.db_path = db_path
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.idle_poll_interval = idle_poll_interval
+        self._handlers: dict[str, Handler] = {}
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._in_flight: set[asyncio.Task] = set()
+
+    # --- Storage ---
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS deliveries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_deliveries_due ON deliveries (status, next_attempt_at);
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    delivery_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    failed_at REAL NOT NULL
+                );
+            """)
+            self._conn = conn
+        return self._conn
+
+    def register(self, kind: str, handler: Handler):
+        """Registers the coroutine that delivers payloads of the given kind."""
+        self._handlers[kind] = handler
+
+    def enqueue(self, kind: str, payload: dict) -> int:
+        """
+        Stores a delivery and wakes the dispatcher. Returns the delivery ID.
+        Blocking (SQLite write); may be called from a worker thread.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for outbound delivery kind '{kind}'")
+        now = time.time()
+        with self._lock:
+            cursor = self._connect().execute(
+                "INSERT INTO deliveries (kind, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(payload), now, now),
+            )
+            delivery_id = cursor.lastrowid
+        logger.info(f"Queued outbound {kind} delivery #{delivery_id}")
+        self._wake()
+        return delivery_id
+
+    def _wake(self):
+        """Wakes the dispatcher. Safe to call from worker threads as well as the event loop."""
+        if self._wakeup is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _claim_due(self) -> sqlite3.Row | None:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT * FROM deliveries WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT 1",
+                (time.time(),),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE deliveries SET status = 'in_flight', attempts = attempts + 1 WHERE id = ?", (row["id"],))
+            return row
+
+    def _seconds_until_next_due(self) -> float:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT MIN(next_attempt_at) AS next_at FROM deliveries WHERE status = 'pending'"
+            ).fetchone()
+        if row["next_at"] is None:
+            return self.idle_poll_interval
+        return max(0.0, min(row["next_at"] - time.time(), self.idle_poll_interval))
+
+    def _complete(self, delivery_id: int):
+        with self._lock:
+            self._connect().execute("DELETE FROM deliveries WHERE id = ?", (delivery_id,))
+
+    def _fail(self, row: sqlite3.Row, error: Exception):
+        attempts = row["attempts"] + 1
+        retryable = getattr(error, "retryable", True)
+        with self._lock:
+            conn = self._connect()
+            if retryable and attempts < self.max_attempts:
+                delay = min(self.backoff_base * (2 ** (attempts - 1)), self.backoff_max) * random.uniform(0.75, 1.0)
+                conn.execute(
+                    "UPDATE deliveries SET status = 'pending', next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    (time.time() + delay, str(error), row["id"]),
+                )
+                logger.warning(f"Outbound {row['kind']} delivery #{row['id']} failed (attempt {attempts}): {error}. Retrying in {delay:.0f}s.")
+                # The dispatcher may be sleeping on an older deadline; let it pick up the new one.
+                self._wake()
+                return
+
+            conn.execute("BEGIN")
+            conn.execute(
+                "INSERT INTO dead_letters (delivery_id, kind, payload, attempts, last_error, created_at, failed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (row["id"], row["kind"], row["payload"], attempts, str(error), row["created_at"], time.time()),
+            )
+            conn.execute("DELETE FROM deliveries WHERE id = ?", (row["id"],))
+            conn.execute("COMMIT")
+        logger.error(f"Outbound {row['kind']} delivery #{row['id']} moved to dead letters after {attempts} attempt(s): {error}")
+
+    # --- Workers ---
+    def _requeue_in_flight(self):
+        with self._lock:
+            self._connect().execute("UPDATE deliveries SET status = 'pending' WHERE status = 'in_flight'")
+
+    async def start(self):
+        """Requeues deliveries interrupted by a restart and starts the dispatcher."""
+        await file_io.run(self._requeue_in_flight)
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        # Let in-flight deliveries finish so they are not sent twice after the restart.
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def _dispatch(self):
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            await slots.acquire()
+            # Clear before claiming: the claim runs on a worker thread, and a delivery enqueued
+            # meanwhile must still find the event set when the dispatcher goes to sleep.
+            self._wakeup.clear()
+            row = await file_io.run(self._claim_due)
+            if row is None:
+                slots.release()
+                timeout = await file_io.run(self._seconds_until_next_due)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._deliver(row))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _deliver(self, row: sqlite3.Row):
+        handler = self._handlers.get(row["kind"])
+        try:
+            if handler is None:
+                raise PermanentDeliveryError(f"No handler registered for '{row['kind']}'")
+            await handler(json.loads(row["payload"]))
+        except Exception as e:
+            await file_io.run(self._fail, row, e)
+            return
+        await file_io.run(self._complete, row["id"])
+        logger.info(f"Delivered outbound {row['kind']} delivery #{row['id']}")
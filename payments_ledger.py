@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentsLedger:
+    """
+    Append-only payments ledger stored in SQLite.
+
+    Every insert runs in one transaction with the daily/monthly revenue rollups and the
+    running totals, so the dashboard stats are a handful of primary-key reads no matter how
+    long the payment history gets. On first use, an existing payments.json is imported.
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: str | None = None):
+        self.db_path = db_path
+        self.legacy_json_path = legacy_json_path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS payments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    contact_id TEXT,
+                    amount REAL NOT NULL,
+                    channel_id INTEGER,
+                    date TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_payments_date ON payments (date);
+                CREATE INDEX IF NOT EXISTS idx_payments_contact_id ON payments (contact_id);
+                CREATE TRIGGER IF NOT EXISTS payments_no_update BEFORE UPDATE ON payments
+                    BEGIN SELECT RAISE(ABORT, 'payments ledger is append-only'); END;
+                CREATE TRIGGER IF NOT EXISTS payments_no_delete BEFORE DELETE ON payments
+                    BEGIN SELECT RAISE(ABORT, 'payments ledger is append-only'); END;
+
+                CREATE TABLE IF NOT EXISTS daily_revenue (day TEXT PRIMARY KEY, total REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS monthly_revenue (month TEXT PRIMARY KEY, total REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS paid_clients (contact_id TEXT PRIMARY KEY);
+                CREATE TABLE IF NOT EXISTS ledger_totals (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total_revenue REAL NOT NULL,
+                    total_clients INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO ledger_totals (id, total_revenue, total_clients) VALUES (1, 0, 0);
+            """)
+            self._conn = conn
+            self._import_legacy_json()
+        return self._conn
+
+    def _import_legacy_json(self):
+        """Imports payments.json into an empty ledger, keeping the original order."""
+        if not self.legacy_json_path or not os.path.exists(self.legacy_json_path):
+            return
+        if self._conn.execute("SELECT 1 FROM payments LIMIT 1").fetchone():
+            return
+        try:
+            with open(self.legacy_json_path, "r") as f:
+                payments_data = json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            logger.error(f"Could not import {self.legacy_json_path} into the payments ledger: {e}")
+            return
+
+        imported = 0
+        self._conn.execute("BEGIN")
+        try:
+            for payment in payments_data:
+                # Without a date there is no day or month to credit, so the row is left out
+                # rather than counted as revenue on the day of the import.
+                if not payment.get("date"):
+                    logger.warning(f"Skipping undated payment in {self.legacy_json_path}: {payment}")
+                    continue
+                self._insert(
+                    payment.get("contact_id"),
+                    float(payment.get("amount", 0)),
+                    payment.get("channel_id"),
+                    payment["date"],
+                )
+                imported += 1
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Imported {imported} of {len(payments_data)} payments from {self.legacy_json_path}")
+
+    def _insert(self, contact_id: str | None, amount: float, channel_id: int | None, date_str: str) -> int:
+        """Inserts a payment and updates the rollups. Caller owns the transaction."""
+        cursor = self._conn.execute(
+            "INSERT INTO payments (contact_id, amount, channel_id, date) VALUES (?, ?, ?, ?)",
+            (contact_id, amount, channel_id, date_str),
+        )
+        # Only positive amounts count towards revenue, as before.
+        if amount > 0:
+            self._conn.execute(
+                "INSERT INTO daily_revenue (day, total) VALUES (?, ?) ON CONFLICT(day) DO UPDATE SET total = total + excluded.total",
+                (date_str[:10], amount),
+            )
+            self._conn.execute(
+                "INSERT INTO monthly_revenue (month, total) VALUES (?, ?) ON CONFLICT(month) DO UPDATE SET total = total + excluded.total",
+                (date_str[:7], amount),
+            )
+            new_clients = 0
+            if contact_id:
+                new_clients = self._conn.execute(
+                    "INSERT OR IGNORE INTO paid_clients (contact_id) VALUES (?)", (contact_id,)
+                ).rowcount
+            self._conn.execute(
+                "UPDATE ledger_totals SET total_revenue = total_revenue + ?, total_clients = total_clients + ? WHERE id = 1",
+                (amount, new_clients),
+            )
+        return cursor.lastrowid
+
+    def record(self, contact_id: str, amount: float, channel_id: int | None = None) -> dict:
+        """Appends a payment and returns it as stored."""
+        payment = {
+            "contact_id": contact_id,
+            "amount": float(amount),
+            "channel_id": channel_id,
+            "date": datetime.utcnow().isoformat(),
+        }
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                payment["id"] = self._insert(contact_id, payment["amount"], channel_id, payment["date"])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return payment
+
+    def stats(self, today: date | None = None) -> dict:
+        """Returns daily/weekly/monthly/total revenue and the number of paying clients."""
+        today = today or datetime.now().date()
+        week_start = today - timedelta(days=today.weekday())
+
+        with self._lock:
+            conn = self._connect()
+            daily = conn.execute("SELECT total FROM daily_revenue WHERE day = ?", (today.isoformat(),)).fetchone()
+            weekly = conn.execute(
+                "SELECT COALESCE(SUM(total), 0.0) AS total FROM daily_revenue WHERE day BETWEEN ? AND ?",
+                (week_start.isoformat(), today.isoformat()),
+            ).fetchone()
+            monthly = conn.execute("SELECT total FROM monthly_revenue WHERE month = ?", (today.isoformat()[:7],)).fetchone()
+            totals = conn.execute("SELECT total_revenue, total_clients FROM ledger_totals WHERE id = 1").fetchone()
+
+        return {
+            "dailyRevenue": daily["total"] if daily else 0.0,
+            "weeklyRevenue": weekly["total"],
+            "monthlyRevenue": monthly["total"] if monthly else 0.0,
+            "totalRevenue": totals["total_revenue"],
+            "totalClients": totals["total_clients"],
+        }
+
+    def all(self) -> list[dict]:
+        """Returns every payment in insertion order."""
+        return list(self.iter_payments())
+
+    def version(self) -> tuple[int, str | None]:
+        """
+        Returns (last payment ID, date of that payment). The ledger is append-only, so the
+        last ID changes exactly when the ledger does and works as a cache validator.
+        """
+        with self._lock:
+            row = self._connect().execute("SELECT id, date FROM payments ORDER BY id DESC LIMIT 1").fetchone()
+        return (row["id"], row["date"]) if row else (0, None)
+
+    def iter_payments(
+        self,
+        after_id: int | None = None,
+        limit: int | None = None,
+        start: str | None = None,
+        end: str | None = None,
+        contact_id: str | None = None,
+        batch_size: int = 500,
+    ) -> Iterator[dict]:
+        """
+        Yields payments in insertion order, reading them from SQLite in batches.
+
+        `after_id` is a pagination cursor (the ID of the last payment already seen).
+        `start` and `end` are ISO dates or datetimes; a date-only `end` includes that whole day.
+        Uses its own connection so a long-running stream never holds the shared lock.
+        """
+        clauses = []
+        params: list = []
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        if start:
+            clauses.append("date >= ?")
+            params.append(start)
+        if end:
+            if len(end) == 10:
+                clauses.append("date < ?")
+                params.append((date.fromisoformat(end) + timedelta(days=1)).isoformat())
+            else:
+                clauses.append("date <= ?")
+                params.append(end)
+        if contact_id:
+            clauses.append("contact_id = ?")
+            params.append(contact_id)
+
+        query = "SELECT id, contact_id, amount, channel_id, date FROM payments"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            self._connect()  # Make sure the schema exists and any legacy import has run.
+        # A StreamingResponse advances this generator from whichever threadpool worker is free,
+        # so the reader must not be tied to the thread that opened it.
+        reader = sqlite3.connect(self.db_path, check_same_thread=False)
+        reader.row_factory = sqlite3.Row
+        try:
+            cursor = reader.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            reader.close()
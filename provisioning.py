@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import traceback
+from datetime import datetime
+from typing import Awaitable, Callable
+
+import file_io
+
+logger = logging.getLogger(__name__)
+
+Runner = Callable[[str], Awaitable[dict | None]]
+
+
+class ProvisioningTracker:
+    """
+    Runs per-customer provisioning work (Discord channel creation and the intro messages)
+    as background tasks and records their status so the HTTP layer can return immediately.
+
+    Jobs are stored in SQLite when they are submitted, so provisioning that was queued or
+    running when the process stopped is picked up again on start(). At most `concurrency`
+    provisioning tasks talk to Discord at once; the rest wait in the "queued" state.
+    """
+
+    def __init__(self, db_path: str, concurrency: int = 2):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._slots = asyncio.Semaphore(concurrency)
+        self._runner: Runner | None = None
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    # --- Storage ---
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS provisioning_jobs (
+                    contact_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    queued_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    error TEXT,
+                    discord_channel_id INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_provisioning_jobs_status ON provisioning_jobs (status);
+            """)
+            self._conn = conn
+        return self._conn
+
+    def submit(self, contact_id: str) -> dict:
+        """
+        Stores a queued job for the contact, replacing any earlier one, and returns its status
+        record. Blocking (SQLite write).
+        """
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO provisioning_jobs (contact_id, status, queued_at) VALUES (?, 'queued', ?)",
+                (contact_id, datetime.utcnow().isoformat()),
+            )
+        return self.status(contact_id)
+
+    def status(self, contact_id: str) -> dict | None:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM provisioning_jobs WHERE contact_id = ?", (contact_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def _set(self, contact_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._connect().execute(
+                f"UPDATE provisioning_jobs SET {assignments} WHERE contact_id = ?",
+                (*fields.values(), contact_id),
+            )
+
+    # --- Workers ---
+    async def start(self, runner: Runner):
+        """
+        Registers the runner and resumes every job left queued or running by the last process.
+        Later calls (e.g. on a Discord reconnect) do nothing.
+        """
+        if self._runner is not None:
+            return
+        self._runner = runner
+
+        def pending() -> list[str]:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("UPDATE provisioning_jobs SET status = 'queued' WHERE status = 'running'")
+                return [row["contact_id"] for row in conn.execute(
+                    "SELECT contact_id FROM provisioning_jobs WHERE status = 'queued' ORDER BY queued_at"
+                )]
+
+        contact_ids = await file_io.run(pending)
+        for contact_id in contact_ids:
+            self.schedule(contact_id)
+        if contact_ids:
+            logger.info(f"Resuming provisioning for {len(contact_ids)} customer(s)")
+
+    def schedule(self, contact_id: str):
+        """
+        Starts a task for a submitted job. Must be called on the event loop. Before start()
+        the job stays queued in the database and is picked up by start().
+        """
+        if self._runner is None or contact_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(contact_id))
+        self._tasks[contact_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(contact_id, None))
+
+    async def stop(self):
+        """Cancels running jobs; they stay 'running' in the database and resume on the next start()."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, contact_id: str):
+        async with self._slots:
+            await file_io.run(self._set, contact_id, status="running", started_at=datetime.utcnow().isoformat())
+            try:
+                result = await self._runner(contact_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await file_io.run(self._set, contact_id, status="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+                logger.error(f"Provisioning failed for contact {contact_id}: {e}\n{traceback.format_exc()}")
+                return
+            fields = {"status": "completed", "error": None, "finished_at": datetime.utcnow().isoformat()}
+            if result and result.get("discord_channel_id"):
+                fields["discord_channel_id"] = result["discord_channel_id"]
+            await file_io.run(self._set, contact_id, **fields)
@@ -0,0 +1,359 @@
+"""
+Route suggestions for a day's calendar jobs.
+
+Exact coordinates for customer addresses can be loaded into the geocode cache from a CSV
+file with address,lat,lon columns (a header row is required):
+    python route_planner.py --import-geocodes geocodes.csv [--cache bot_data/geocode_cache.json]
+"""
+import argparse
+import csv
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Approximate city-centre coordinates for the service area. Jobs are placed at their
+# city's centroid unless the geocode cache has an exact entry for the address.
+CITY_CENTROIDS = {
+    "adelanto": (34.5828, -117.4092),
+    "alta loma": (34.1225, -117.5980),
+    "apple valley": (34.5008, -117.1859),
+    "banning": (33.9256, -116.8764),
+    "beaumont": (33.9295, -116.9773),
+    "bloomington": (34.0703, -117.3959),
+    "calimesa": (34.0039, -117.0620),
+    "canyon lake": (33.6850, -117.2731),
+    "chino": (34.0122, -117.6889),
+    "chino hills": (33.9898, -117.7326),
+    "claremont": (34.0967, -117.7198),
+    "colton": (34.0739, -117.3136),
+    "corona": (33.8753, -117.5664),
+    "diamond bar": (34.0286, -117.8103),
+    "eastvale": (33.9525, -117.5848),
+    "etiwanda": (34.1256, -117.5246),
+    "fontana": (34.0922, -117.4350),
+    "glendora": (34.1361, -117.8653),
+    "grand terrace": (34.0339, -117.3137),
+    "hemet": (33.7475, -116.9720),
+    "hesperia": (34.4264, -117.3009),
+    "highland": (34.1283, -117.2086),
+    "jurupa valley": (33.9972, -117.4855),
+    "la verne": (34.1008, -117.7678),
+    "lake elsinore": (33.6681, -117.3273),
+    "loma linda": (34.0483, -117.2612),
+    "menifee": (33.6971, -117.1853),
+    "mentone": (34.0700, -117.1345),
+    "mira loma": (33.9845, -117.5159),
+    "montclair": (34.0775, -117.6898),
+    "moreno valley": (33.9425, -117.2297),
+    "murrieta": (33.5539, -117.2139),
+    "norco": (33.9311, -117.5487),
+    "ontario": (34.0633, -117.6509),
+    "perris": (33.7825, -117.2286),
+    "pomona": (34.0551, -117.7500),
+    "rancho cucamonga": (34.1064, -117.5931),
+    "redlands": (34.0556, -117.1825),
+    "rialto": (34.1064, -117.3703),
+    "riverside": (33.9806, -117.3755),
+    "san bernardino": (34.1083, -117.2898),
+    "san dimas": (34.1067, -117.8067),
+    "san jacinto": (33.7839, -116.9589),
+    "temecula": (33.4936, -117.1484),
+    "upland": (34.0975, -117.6484),
+    "victorville": (34.5362, -117.2928),
+    "walnut": (34.0203, -117.8654),
+    "wildomar": (33.5989, -117.2800),
+    "yucaipa": (34.0336, -117.0431),
+}
+DEPOT_CITY = "ontario"          # Where crews start and end the day
+AVERAGE_SPEED_KMH = 45          # Door-to-door driving speed used for travel estimates
+ROAD_FACTOR = 1.3               # Roads are longer than the straight line
+MINUTES_ROUNDING = 5
+BALANCE_SLACK = 1.25            # A crew may take up to 25% more than an even share of the day's work
+GEOCODE_CACHE_FILE = os.path.join("bot_data", "geocode_cache.json")
+
+_STATE_OR_ZIP = re.compile(r'^(ca|california|usa|us|united states)?\s*(\d{5}(-\d{4})?)?$', re.IGNORECASE)
+
+
+# --- Geocoding ---
+def normalize_address(address: str) -> str:
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', address or '')).strip().lower()
+
+def city_from_address(address: str | None, city: str | None = None) -> str | None:
+    """
+    Returns the lower-case city for a customer. Uses `city` if given, otherwise the last
+    comma-separated part of the address that is not a state, ZIP or country.
+    """
+    if city and city.strip():
+        return normalize_address(city)
+    for part in reversed((address or "").split(",")[1:]):
+        part = part.strip()
+        if not part or _STATE_OR_ZIP.match(part):
+            continue
+        # "Ontario CA 91761" -> "ontario"
+        return normalize_address(re.sub(r'\s+(ca|california)\b.*$', '', part, flags=re.IGNORECASE))
+    return None
+
+
+class GeocodeCache:
+    """
+    Offline address -> (lat, lon) lookup. Exact coordinates recorded with set() or
+    set_many() (e.g. by --import-geocodes) are kept in a JSON file; everything else falls
+    back to the city centroid table. No network calls. The file is re-read when it changes,
+    so an import is picked up by a running server.
+    """
+
+    def __init__(self, path: str = GEOCODE_CACHE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[float, float]] | None = None
+        self._mtime: float | None = None
+
+    def _load(self) -> dict:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if self._entries is None or mtime != self._mtime:
+            try:
+                with open(self.path, "r") as f:
+                    self._entries = {key: tuple(value) for key, value in json.load(f).items()}
+            except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+                self._entries = {}
+            self._mtime = mtime
+        return self._entries
+
+    def lookup(self, address: str | None, city: str | None = None) -> tuple[float, float] | None:
+        with self._lock:
+            exact = self._load().get(normalize_address(address)) if address else None
+        if exact:
+            return exact
+        return CITY_CENTROIDS.get(city_from_address(address, city))
+
+    def set(self, address: str, lat: float, lon: float):
+        """Records exact coordinates for an address."""
+        self.set_many([(address, lat, lon)])
+
+    def set_many(self, entries: Iterable[tuple[str, float, float]]) -> int:
+        """Records exact coordinates for several addresses with one write. Returns the number recorded."""
+        with self._lock:
+            cached = self._load()
+            count = 0
+            for address, lat, lon in entries:
+                cached[normalize_address(address)] = (lat, lon)
+                count += 1
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(cached, f, indent=4)
+            os.replace(tmp_path, self.path)
+            self._mtime = os.path.getmtime(self.path)
+        return count
+
+    def import_csv(self, csv_path: str) -> tuple[int, int]:
+        """Loads address,lat,lon rows from a CSV file. Returns (rows imported, rows skipped)."""
+        entries, skipped = [], 0
+        with open(csv_path, "r", newline="", encoding="utf-8-sig") as f:
+            for line_number, row in enumerate(csv.DictReader(f), start=2):
+                try:
+                    address = (row.get("address") or "").strip()
+                    lat, lon = float(row["lat"]), float(row["lon"])
+                    if not address or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                        raise ValueError("missing address or coordinates out of range")
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"Skipping {csv_path} line {line_number}: {e}")
+                    skipped += 1
+                    continue
+                entries.append((address, lat, lon))
+        return self.set_many(entries), skipped
+
+
+# --- Routing ---
+@dataclass
+class Stop:
+    contact_id: str
+    address: str | None
+    duration_minutes: int
+    location: tuple[float, float] | None = None
+    crew: str | None = None
+    extra: dict = field(default_factory=dict)
+
+
+def distance_km(a: tuple[float, float], b: tuple[float, float]) -> float:
+    """Great-circle distance between two (lat, lon) points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+def travel_minutes(a: tuple[float, float], b: tuple[float, float]) -> int:
+    minutes = distance_km(a, b) * ROAD_FACTOR / AVERAGE_SPEED_KMH * 60
+    return int(math.ceil(minutes / MINUTES_ROUNDING) * MINUTES_ROUNDING)
+
+def _route_length(depot: tuple[float, float], route: list[Stop]) -> float:
+    points = [depot] + [stop.location for stop in route] + [depot]
+    return sum(distance_km(points[i], points[i + 1]) for i in range(len(points) - 1))
+
+def order_route(depot: tuple[float, float], stops: list[Stop]) -> list[Stop]:
+    """Orders a crew's stops as a round trip from the depot: nearest neighbour, then 2-opt."""
+    remaining = list(stops)
+    route = []
+    current = depot
+    while remaining:
+        nearest = min(remaining, key=lambda stop: distance_km(current, stop.location))
+        remaining.remove(nearest)
+        route.append(nearest)
+        current = nearest.location
+
+    # 2-opt: reverse any segment whose reversal shortens the loop, until nothing improves.
+    improved = True
+    while improved and len(route) > 2:
+        improved = False
+        points = [depot] + [stop.location for stop in route] + [depot]
+        for i in range(1, len(points) - 2):
+            for j in range(i + 1, len(points) - 1):
+                before = distance_km(points[i - 1], points[i]) + distance_km(points[j], points[j + 1])
+                after = distance_km(points[i - 1], points[j]) + distance_km(points[i], points[j + 1])
+                if after < before - 1e-9:
+                    route[i - 1:j] = reversed(route[i - 1:j])
+                    points[i:j + 1] = reversed(points[i:j + 1])
+                    improved = True
+    return route
+
+def cluster_stops(stops: list[Stop], crews: list[str], capacity_minutes: int, iterations: int = 10) -> dict[str, list[Stop]]:
+    """
+    Splits located stops into one geographic cluster per crew (k-means on lat/lon with
+    farthest-point seeding). Stops are assigned closest-first, and a crew whose day is
+    full (`capacity_minutes` of job time) is skipped, so no crew is handed more work than fits.
+    """
+    clusters = {crew: [] for crew in crews}
+    if not stops or not crews:
+        return clusters
+
+    # Seed with the stop farthest from the others so clusters start spread out.
+    centroids = [stops[0].location]
+    while len(centroids) < min(len(crews), len(stops)):
+        centroids.append(max(stops, key=lambda stop: min(distance_km(stop.location, c) for c in centroids)).location)
+    while len(centroids) < len(crews):
+        centroids.append(centroids[0])
+
+    for _ in range(iterations):
+        clusters = {crew: [] for crew in crews}
+        load = {crew: 0 for crew in crews}
+        # Stops closest to a centroid are placed first, so capacity spills over at the edges.
+        ranked = sorted(stops, key=lambda stop: min(distance_km(stop.location, c) for c in centroids))
+        for stop in ranked:
+            by_distance = sorted(range(len(crews)), key=lambda k: distance_km(stop.location, centroids[k]))
+            chosen = next(
+                (k for k in by_distance if load[crews[k]] + stop.duration_minutes <= capacity_minutes),
+                by_distance[0],
+            )
+            clusters[crews[chosen]].append(stop)
+            load[crews[chosen]] += stop.duration_minutes
+
+        new_centroids = []
+        for k, crew in enumerate(crews):
+            members = clusters[crew]
+            if members:
+                new_centroids.append((
+                    sum(stop.location[0] for stop in members) / len(members),
+                    sum(stop.location[1] for stop in members) / len(members),
+                ))
+            else:
+                new_centroids.append(centroids[k])
+        if new_centroids == centroids:
+            break
+        centroids = new_centroids
+    return clusters
+
+def plan_routes(
+    stops: list[Stop],
+    crews: list[str],
+    day_start_minute: int,
+    day_end_minute: int,
+    slot_increment_minutes: int = 30,
+    depot: tuple[float, float] | None = None,
+    keep_crews: bool = False,
+) -> dict:
+    """
+    Plans one day: clusters the located stops by crew, orders each crew's stops with a
+    TSP heuristic and packs them from the start of the day, adding travel time between
+    stops and rounding each start up to the slot grid.
+
+    With `keep_crews`, stops that already have a crew stay with it and only the order changes.
+    Returns {"routes": [...], "unlocated": [...]}; stops with no known location are listed
+    separately so a dispatcher can place them by hand.
+    """
+    depot = depot or CITY_CENTROIDS[DEPOT_CITY]
+    located = [stop for stop in stops if stop.location]
+    unlocated = [stop for stop in stops if not stop.location]
+
+    if keep_crews:
+        clusters = {crew: [] for crew in crews}
+        for stop in located:
+            clusters.setdefault(stop.crew or crews[0], []).append(stop)
+    else:
+        # Aim for an even share of the day's work per crew (with some slack for geography),
+        # never more than a full business day.
+        total_minutes = sum(stop.duration_minutes for stop in located)
+        capacity = min(day_end_minute - day_start_minute, math.ceil(total_minutes / max(len(crews), 1) * BALANCE_SLACK))
+        clusters = cluster_stops(located, crews, capacity)
+
+    routes = []
+    for crew, members in clusters.items():
+        route = order_route(depot, members)
+        clock = day_start_minute
+        position = depot
+        planned = []
+        for stop in route:
+            drive = travel_minutes(position, stop.location)
+            start = clock + drive
+            start = int(math.ceil(start / slot_increment_minutes) * slot_increment_minutes)
+            end = start + stop.duration_minutes
+            planned.append({
+                "contactId": stop.contact_id,
+                "address": stop.address,
+                "startMinute": start,
+                "endMinute": end,
+                "travelMinutes": drive,
+                "distanceKm": round(distance_km(position, stop.location) * ROAD_FACTOR, 1),
+                "fitsInDay": end <= day_end_minute,
+                **stop.extra,
+            })
+            clock = end
+            position = stop.location
+        routes.append({
+            "crew": crew,
+            "stops": planned,
+            "totalDistanceKm": round(_route_length(depot, route) * ROAD_FACTOR, 1),
+        })
+
+    return {
+        "routes": routes,
+        "unlocated": [{"contactId": stop.contact_id, "address": stop.address, **stop.extra} for stop in unlocated],
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Route planner maintenance.")
+    parser.add_argument("--import-geocodes", metavar="CSV", required=True, help="CSV file with address,lat,lon columns.")
+    parser.add_argument("--cache", default=GEOCODE_CACHE_FILE, help="Path of the geocode cache file.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    imported, skipped = GeocodeCache(args.cache).import_csv(args.import_geocodes)
+    logger.info(f"Imported {imported} address(es) into {args.cache}; skipped {skipped} row(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
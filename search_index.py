@@ -0,0 +1,182 @@
+import bisect
+import logging
+import re
+import threading
+from typing import Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+MIN_FUZZY_LENGTH = 4            # Shorter query words only match exactly or as a prefix
+MAX_PREFIX_EXPANSIONS = 200     # Caps how many indexed words one short prefix can pull in
+EXACT_SCORE, PREFIX_SCORE, FUZZY_SCORE = 3, 2, 1
+
+_WORD = re.compile(r"[a-z0-9]+")
+_PHONE_QUERY = re.compile(r"^[\d\s().+\-]+$")
+
+
+def _deletes(word: str) -> set[str]:
+    """Every string one deletion away from `word` (the symmetric-delete trick for edit distance 1)."""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if a and b differ by at most one insertion, deletion, substitution or adjacent swap."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    i = 0
+    while i < len(shorter) and shorter[i] == longer[i]:
+        i += 1
+    return shorter[i:] == longer[i + 1:]
+
+
+class CustomerSearchIndex:
+    """
+    In-memory inverted index over customer name, phone, address and city.
+
+    Each indexed word maps to the contacts that contain it. A sorted word list answers prefix
+    queries with a bisect, and a map from one-deletion variants to words finds typos (edit
+    distance 1) without comparing against every word. Every query word must match; results
+    are ranked by how closely they matched (exact, then prefix, then fuzzy).
+
+    Phone numbers are normalized with `normalize_phone` and indexed as the 10-digit number,
+    its last 7 and its last 4 digits, so "(909) 555-1234", "5551234" and "1234" all match.
+    The index is kept current by on_customer_change(), registered as a repository listener.
+    """
+
+    def __init__(self, normalize_phone: Callable[[str], str]):
+        self.normalize_phone = normalize_phone
+        self._lock = threading.Lock()
+        self._postings: dict[str, set[str]] = {}
+        self._words: list[str] = []
+        self._deletes: dict[str, set[str]] = {}
+        self._doc_words: dict[str, set[str]] = {}
+
+    # --- Indexing ---
+    def _phone_words(self, phone: str | None) -> set[str]:
+        digits = re.sub(r'\D', '', self.normalize_phone(phone) if phone else "")[-10:]
+        if len(digits) < 4:
+            return set()
+        return {digits, digits[-7:], digits[-4:]}
+
+    def _document_words(self, customer_data: dict) -> set[str]:
+        p_info = customer_data.get("personal_info", {})
+        text = " ".join(
+            p_info.get(key) or "" for key in ("first_name", "last_name", "address", "city")
+        ).lower()
+        return set(_WORD.findall(text)) | self._phone_words(p_info.get("phone_number"))
+
+    def _add_word(self, word: str, contact_id: str):
+        contacts = self._postings.get(word)
+        if contacts is None:
+            contacts = self._postings[word] = set()
+            bisect.insort(self._words, word)
+            if len(word) >= MIN_FUZZY_LENGTH - 1:
+                for variant in _deletes(word) | {word}:
+                    self._deletes.setdefault(variant, set()).add(word)
+        contacts.add(contact_id)
+
+    def _remove_word(self, word: str, contact_id: str):
+        contacts = self._postings.get(word)
+        if contacts is None:
+            return
+        contacts.discard(contact_id)
+        if contacts:
+            return
+        del self._postings[word]
+        del self._words[bisect.bisect_left(self._words, word)]
+        if len(word) >= MIN_FUZZY_LENGTH - 1:
+            for variant in _deletes(word) | {word}:
+                words = self._deletes.get(variant)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self._deletes[variant]
+
+    def _set_document(self, contact_id: str, words: set[str]):
+        old_words = self._doc_words.pop(contact_id, set())
+        for word in old_words - words:
+            self._remove_word(word, contact_id)
+        for word in words - old_words:
+            self._add_word(word, contact_id)
+        if words:
+            self._doc_words[contact_id] = words
+
+    def rebuild(self, customers: Iterable[dict]) -> int:
+        """Indexes every customer from scratch. Returns the number indexed."""
+        with self._lock:
+            self._postings, self._words, self._deletes, self._doc_words = {}, [], {}, {}
+            for customer_data in customers:
+                contact_id = customer_data.get("client_id")
+                if contact_id:
+                    self._set_document(contact_id, self._document_words(customer_data))
+            count = len(self._doc_words)
+        logger.info(f"Customer search index built for {count} customers ({len(self._postings)} words)")
+        return count
+
+    def on_customer_change(self, contact_id: str, customer_data: dict | None):
+        """Repository listener: re-indexes a stored customer, or drops one that was removed."""
+        words = self._document_words(customer_data) if customer_data is not None else set()
+        with self._lock:
+            self._set_document(contact_id, words)
+
+    # --- Queries ---
+    def _match_word(self, word: str) -> dict[str, int]:
+        """Returns {contact_id: score} for one query word."""
+        scores: dict[str, int] = {}
+
+        def credit(contacts: set[str], score: int):
+            for contact_id in contacts:
+                if scores.get(contact_id, 0) < score:
+                    scores[contact_id] = score
+
+        position = bisect.bisect_left(self._words, word)
+        for indexed in self._words[position:position + MAX_PREFIX_EXPANSIONS]:
+            if not indexed.startswith(word):
+                break
+            credit(self._postings[indexed], EXACT_SCORE if indexed == word else PREFIX_SCORE)
+
+        if len(word) >= MIN_FUZZY_LENGTH and not word.isdigit():
+            candidates = set()
+            for variant in _deletes(word) | {word}:
+                candidates |= self._deletes.get(variant, set())
+            for indexed in candidates:
+                if indexed != word and _within_one_edit(word, indexed):
+                    credit(self._postings[indexed], FUZZY_SCORE)
+        return scores
+
+    def _query_words(self, query: str) -> list[str]:
+        query = query.strip().lower()
+        if _PHONE_QUERY.match(query) and len(re.sub(r'\D', '', query)) >= 7:
+            # A whole phone number, however it is formatted.
+            digits = re.sub(r'\D', '', query)
+            if len(digits) >= 10:
+                digits = re.sub(r'\D', '', self.normalize_phone(digits))[-10:]
+            return [digits]
+        return _WORD.findall(query)
+
+    def search(self, query: str, limit: int = 20) -> list[tuple[str, int]]:
+        """Returns up to `limit` (contact_id, score) pairs, best matches first."""
+        words = self._query_words(query)
+        if not words:
+            return []
+        with self._lock:
+            totals: dict[str, int] | None = None
+            for word in words:
+                scores = self._match_word(word)
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {contact_id: total + scores[contact_id] for contact_id, total in totals.items() if contact_id in scores}
+                if not totals:
+                    return []
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
@@ -0,0 +1,77 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+import calendar_manager
+from calendar_manager import CREWS, TIMEZONE, AvailabilityCache, CalendarStore
+
+
+@pytest.fixture
+def calendar_file(tmp_path, monkeypatch):
+    path = tmp_path / "calendar.json"
+    store = CalendarStore(str(path))
+    monkeypatch.setattr(calendar_manager, "_store", store)
+    monkeypatch.setattr(calendar_manager, "_availability", AvailabilityCache(store))
+    return path
+
+
+def _slot(days_ahead: int = 7, hour: int = 10) -> str:
+    day = datetime.now(TIMEZONE).date() + timedelta(days=days_ahead)
+    return TIMEZONE.localize(datetime(day.year, day.month, day.day, hour, 0)).isoformat()
+
+
+def test_concurrent_bookings_never_exceed_crew_count(calendar_file):
+    start = _slot()
+    attempts = 4 * len(CREWS)
+    barrier = threading.Barrier(attempts)
+
+    def book(i):
+        barrier.wait()
+        return calendar_manager.book_appointment(f"contact-{i}", start)
+
+    with ThreadPoolExecutor(max_workers=attempts) as pool:
+        results = list(pool.map(book, range(attempts)))
+
+    successes = [message for ok, message in results if ok]
+    assert len(successes) <= len(CREWS)
+    assert len(successes) == len(CREWS)
+
+    # What was written matches what was reported: one appointment per crew, none doubled.
+    saved = json.loads(calendar_file.read_text())
+    assert len(saved) == len(successes)
+    assert sorted(appt["crew"] for appt in saved) == sorted(CREWS)
+
+
+def test_booking_a_full_slot_is_rejected(calendar_file):
+    start = _slot()
+    for i in range(len(CREWS)):
+        ok, _ = calendar_manager.book_appointment(f"contact-{i}", start)
+        assert ok
+
+    ok, message = calendar_manager.book_appointment("contact-late", start)
+    assert not ok
+    assert message == "The requested time slot is not available."
+    assert start not in calendar_manager.get_available_slots(datetime.fromisoformat(start).date())
+    assert len(json.loads(calendar_file.read_text())) == len(CREWS)
+
+    # Cancelling one booking frees a crew for the same slot.
+    assert calendar_manager.cancel_appointment("contact-0", start)[0]
+    assert calendar_manager.book_appointment("contact-late", start)[0]
+
+
+def test_invalid_requests_are_rejected_without_writing(calendar_file):
+    off_grid = datetime.fromisoformat(_slot()) + timedelta(minutes=10)
+    cases = [
+        ("not-a-date", "Invalid ISO date format provided."),
+        (off_grid.isoformat(), f"Appointments can only start on a {calendar_manager.SLOT_INCREMENT_MINUTES}-minute boundary."),
+        (_slot(hour=22), "The requested time is outside of business hours."),
+        (_slot(days_ahead=-7), "Cannot book appointments in the past."),
+    ]
+    for start, expected in cases:
+        assert calendar_manager.book_appointment("contact-1", start) == (False, expected)
+
+    assert calendar_manager.book_appointment("contact-1", _slot(), crew="crew_99") == (False, "Unknown crew: crew_99.")
+    assert not calendar_file.exists()
@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+import pytest
+
+import customer_repository
+from customer_repository import ConcurrentUpdateError, CustomerRepository
+from customer_store import CustomerStore
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def repo(request, tmp_path):
+    store = CustomerStore(str(tmp_path / "customers.sqlite")) if request.param == "sqlite" else None
+    repo = CustomerRepository(str(tmp_path / "customer_data"), store=store)
+    (tmp_path / "customer_data" / "c1").mkdir(parents=True)
+    asyncio.run(repo.save({
+        "client_id": "c1",
+        "personal_info": {"first_name": "Ada", "phone_number": "555-0100"},
+        "notes": [],
+    }))
+    return repo
+
+
+def _saved(repo, contact_id="c1") -> dict:
+    with open(repo.customer_file(contact_id)) as f:
+        return json.load(f)
+
+
+def test_interleaved_updates_keep_both_writes(repo):
+    def add_note(text):
+        def mutate(data):
+            data["notes"].append(text)
+        return mutate
+
+    async def scenario():
+        # Both updates are in flight at once; each yields to the loop while its read and write run on the I/O pool.
+        await asyncio.gather(
+            repo.update("c1", add_note("first")),
+            repo.update("c1", add_note("second")),
+        )
+
+    asyncio.run(scenario())
+
+    for document in (_saved(repo), repo.get("c1")):
+        assert sorted(document["notes"]) == ["first", "second"]
+        assert document["record_version"] == 3
+
+
+def test_stale_version_is_rejected_instead_of_overwriting(repo):
+    opened = repo.get("c1")["record_version"]
+
+    def rename(first_name):
+        def mutate(data):
+            data["personal_info"]["first_name"] = first_name
+        return mutate
+
+    def add_note(data):
+        data["notes"].append("called back")
+
+    async def scenario():
+        # Two editors open the record at the same version; the first one to save wins.
+        await repo.update("c1", add_note, expected_version=opened)
+        with pytest.raises(ConcurrentUpdateError) as excinfo:
+            await repo.update("c1", rename("Grace"), expected_version=opened)
+        assert (excinfo.value.expected_version, excinfo.value.current_version) == (opened, opened + 1)
+
+        # Retrying against the current version applies on top of the first write.
+        await repo.update("c1", rename("Grace"), expected_version=repo.get("c1")["record_version"])
+
+    asyncio.run(scenario())
+
+    document = _saved(repo)
+    assert document["notes"] == ["called back"]
+    assert document["personal_info"]["first_name"] == "Grace"
+    assert document == repo.get("c1")
+
+
+def test_failed_export_keeps_the_database_and_cache_in_step(tmp_path, monkeypatch):
+    store = CustomerStore(str(tmp_path / "customers.sqlite"))
+    repo = CustomerRepository(str(tmp_path / "customer_data"), store=store)
+
+    def fail_export(path, data, indent=4):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(customer_repository, "write_json_atomic", fail_export)
+    stored = asyncio.run(repo.save({"client_id": "c2", "personal_info": {"first_name": "Lin"}}))
+
+    assert store.get("c2") == stored == repo.get("c2")
+    assert not (tmp_path / "customer_data" / "c2").exists()
@@ -0,0 +1,54 @@
+import asyncio
+import sqlite3
+
+from aiohttp import web
+
+from ghl_client import GHLClient
+from outbound_queue import OutboundQueue
+
+
+def test_timed_out_post_is_not_redelivered(tmp_path):
+    db_path = str(tmp_path / "outbound.sqlite")
+    hits = []
+
+    async def slow_handler(request):
+        hits.append(await request.json())
+        await asyncio.sleep(1)
+        return web.json_response({"ok": True})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post("/sms", slow_handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        client = GHLClient(total_timeout=0.2)
+        queue = OutboundQueue(db_path, backoff_base=0.01, backoff_max=0.01)
+
+        async def deliver(payload):
+            await client.post(f"http://127.0.0.1:{port}/sms", json_body=payload)
+
+        queue.register("sms", deliver)
+        await queue.start()
+        try:
+            queue.enqueue("sms", {"message": "hello"})
+            await asyncio.sleep(1.0)
+        finally:
+            await queue.stop()
+            await client.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+
+    # The request reached the server before timing out, so it must not be sent again.
+    assert len(hits) == 1
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM deliveries").fetchone()[0] == 0
+        dead = conn.execute("SELECT attempts, last_error FROM dead_letters").fetchall()
+    finally:
+        conn.close()
+    assert len(dead) == 1
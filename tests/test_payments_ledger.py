@@ -0,0 +1,84 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from payments_ledger import PaymentsLedger
+
+
+def _ledger(tmp_path, count=50):
+    ledger = PaymentsLedger(str(tmp_path / "payments.sqlite"))
+    for i in range(count):
+        ledger.record(f"contact-{i % 5}", 10.0 + i)
+    return ledger
+
+
+def test_two_streams_advanced_from_different_threads(tmp_path):
+    """Mirrors StreamingResponse, which calls next() on whichever threadpool worker is free."""
+    ledger = _ledger(tmp_path)
+    streams = [ledger.iter_payments(batch_size=7), ledger.iter_payments(batch_size=3)]
+    seen: list[list[int]] = [[], []]
+    workers = [ThreadPoolExecutor(max_workers=1) for _ in range(3)]
+    try:
+        step = 0
+        active = {0, 1}
+        while active:
+            for index in sorted(active):
+                # Rotate through workers so consecutive next() calls land on different threads.
+                worker = workers[step % len(workers)]
+                step += 1
+                row = worker.submit(next, streams[index], None).result()
+                if row is None:
+                    active.discard(index)
+                else:
+                    seen[index].append(row["id"])
+    finally:
+        for worker in workers:
+            worker.shutdown()
+
+    expected = [payment["id"] for payment in ledger.all()]
+    assert len(expected) == 50
+    assert seen == [expected, expected]
+
+
+def test_concurrent_filtered_streams(tmp_path):
+    ledger = _ledger(tmp_path)
+    results: dict[str, list[dict]] = {}
+    errors: list[BaseException] = []
+
+    def consume(contact_id):
+        try:
+            results[contact_id] = list(ledger.iter_payments(contact_id=contact_id, batch_size=2))
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=consume, args=(f"contact-{i}",)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert all(len(rows) == 10 for rows in results.values())
+    assert all(row["contact_id"] == contact_id for contact_id, rows in results.items() for row in rows)
+
+
+def test_stats_are_floats_when_nothing_was_paid(tmp_path):
+    stats = PaymentsLedger(str(tmp_path / "payments.sqlite")).stats(today=date(2024, 3, 6))
+    assert stats["weeklyRevenue"] == 0.0 and isinstance(stats["weeklyRevenue"], float)
+    assert all(isinstance(stats[key], float) for key in ("dailyRevenue", "monthlyRevenue", "totalRevenue"))
+
+
+def test_legacy_import_skips_undated_payments(tmp_path):
+    legacy_path = tmp_path / "payments.json"
+    legacy_path.write_text(json.dumps([
+        {"contact_id": "a", "amount": 100, "channel_id": 1, "date": "2024-03-04T10:00:00"},
+        {"contact_id": "b", "amount": 250, "channel_id": 2},
+        {"contact_id": "c", "amount": 40, "channel_id": 3, "date": None},
+    ]))
+    ledger = PaymentsLedger(str(tmp_path / "payments.sqlite"), legacy_json_path=str(legacy_path))
+
+    assert [payment["contact_id"] for payment in ledger.all()] == ["a"]
+    stats = ledger.stats(today=date(2024, 3, 6))
+    assert stats["weeklyRevenue"] == stats["monthlyRevenue"] == stats["totalRevenue"] == 100.0
+    assert stats["totalClients"] == 1
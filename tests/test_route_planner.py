@@ -0,0 +1,31 @@
+import route_planner
+from route_planner import GeocodeCache
+
+
+def test_imported_geocode_is_a_cache_hit(tmp_path):
+    csv_path = tmp_path / "geocodes.csv"
+    csv_path.write_text(
+        "address,lat,lon\n"
+        "\"123 Main St, Ontario, CA 91761\",34.0601,-117.6502\n"
+        "456 Oak Ave,not-a-number,-117.1\n"
+    )
+    cache_path = tmp_path / "geocode_cache.json"
+
+    assert route_planner.main(["--import-geocodes", str(csv_path), "--cache", str(cache_path)]) == 0
+
+    cache = GeocodeCache(str(cache_path))
+    # Exact entry, not the Ontario centroid, and matched regardless of punctuation and case.
+    assert cache.lookup("123 main st ontario ca 91761") == (34.0601, -117.6502)
+    assert cache.lookup("456 Oak Ave", "Ontario") == route_planner.CITY_CENTROIDS["ontario"]
+
+
+def test_running_cache_sees_a_later_import(tmp_path):
+    cache_path = tmp_path / "geocode_cache.json"
+    running = GeocodeCache(str(cache_path))
+    assert running.lookup("9 Elm St, Nowhere") is None
+
+    csv_path = tmp_path / "geocodes.csv"
+    csv_path.write_text("address,lat,lon\n\"9 Elm St, Nowhere\",34.5,-117.5\n")
+    GeocodeCache(str(cache_path)).import_csv(str(csv_path))
+
+    assert running.lookup("9 Elm St, Nowhere") == (34.5, -117.5)
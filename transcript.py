@@ -0,0 +1,170 @@
+import asyncio
+import gzip
+import logging
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable
+
+import discord
+
+import file_io
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+TRANSCRIPT_DIR = os.path.join("bot_data", "transcripts")
+HISTORY_PAGE_SIZE = 100         # Messages per history request (the Discord API maximum)
+MESSAGE_CHAR_LIMIT = 1900       # Leaves headroom under Discord's 2000-character message limit
+INLINE_PART_LIMIT = 5           # Longer transcripts are only posted as the attached file
+
+
+def render_message(message: discord.Message) -> str:
+    """Formats one channel message as a markdown transcript entry."""
+    timestamp = message.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    entry = f"**{message.author.name}** `({timestamp})`:\n{message.content or ' '}\n"
+
+    for embed in message.embeds:
+        entry += "\n> `--- Embed Start ---`\n"
+        if embed.title:
+            entry += f"> **{embed.title}**\n"
+        if embed.description:
+            entry += f"> {embed.description.replace(chr(10), chr(10) + '> ')}\n"
+        for field in embed.fields:
+            entry += f"> **{field.name}**: {field.value.replace(chr(10), chr(10) + '> ')}\n"
+        entry += "> `--- Embed End ---`\n"
+
+    for att in message.attachments:
+        entry += f"📎 **Attachment:** `{att.filename}` - {att.url}\n"
+
+    return entry + "\n"
+
+
+async def iter_history_pages(channel: discord.abc.Messageable, after: discord.abc.Snowflake | None = None) -> AsyncIterator[list[discord.Message]]:
+    """Yields the channel's messages oldest-first, one API page at a time, starting after `after`."""
+    while True:
+        page = [msg async for msg in channel.history(limit=HISTORY_PAGE_SIZE, after=after, oldest_first=True)]
+        if not page:
+            return
+        yield page
+        if len(page) < HISTORY_PAGE_SIZE:
+            return
+        after = page[-1]
+
+
+class ChunkPacker:
+    """Packs transcript lines into message-sized parts, splitting lines that are too long on their own."""
+
+    def __init__(self, limit: int = MESSAGE_CHAR_LIMIT):
+        self.limit = limit
+        self._current = ""
+
+    def add(self, text: str) -> list[str]:
+        """Adds text and returns any parts it completed."""
+        parts = []
+        if self._current and len(self._current) + len(text) > self.limit:
+            parts.append(self._current)
+            self._current = ""
+        while len(text) > self.limit:
+            parts.append(text[:self.limit])
+            text = text[self.limit:]
+        self._current += text
+        return parts
+
+    def flush(self) -> list[str]:
+        parts = [self._current] if self._current else []
+        self._current = ""
+        return parts
+
+
+@dataclass
+class TranscriptProgress:
+    """How far an export has got. Everything up to `bytes_written` is complete on disk."""
+    message_count: int = 0
+    last_message_id: int | None = None
+    bytes_written: int = 0
+    text_length: int = 0
+
+
+def _append_member(path: str, offset: int, text: str) -> int:
+    """
+    Truncates the file to `offset` and appends `text` as a complete gzip member. Returns the
+    new size. Concatenated members read back as one stream, and cutting at a member boundary
+    discards anything a crash left half-written.
+    """
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        f.write(gzip.compress(text.encode("utf-8")))
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def _read_text(path: str) -> str:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return f.read()
+
+
+async def build_transcript(
+    channel: discord.abc.Messageable,
+    header: str,
+    path: str,
+    progress: TranscriptProgress | None = None,
+    on_progress: Callable[[TranscriptProgress], Awaitable[None]] | None = None,
+) -> TranscriptProgress:
+    """
+    Streams the channel's history into a gzip-compressed markdown file at `path`.
+
+    Only one page of messages is held at a time, and each page is compressed and written on
+    the I/O pool while the next one is fetched. `on_progress` is awaited once a page is safely
+    on disk; passing the last progress it received back in resumes an interrupted export
+    after the last message written.
+    """
+    await file_io.makedirs(os.path.dirname(path) or ".")
+    progress = progress or TranscriptProgress()
+    if not progress.bytes_written:
+        progress = TranscriptProgress(bytes_written=await file_io.run(_append_member, path, 0, header), text_length=len(header))
+
+    pending: asyncio.Future | None = None
+    pending_progress = progress
+
+    async def finish_pending():
+        nonlocal progress
+        if pending is None:
+            return
+        bytes_written = await pending
+        progress = TranscriptProgress(pending_progress.message_count, pending_progress.last_message_id, bytes_written, pending_progress.text_length)
+        if on_progress is not None:
+            await on_progress(progress)
+
+    after = discord.Object(id=progress.last_message_id) if progress.last_message_id else None
+    try:
+        async for page in iter_history_pages(channel, after=after):
+            text = "".join(render_message(message) for message in page)
+            await finish_pending()
+            pending = asyncio.ensure_future(file_io.run(_append_member, path, progress.bytes_written, text))
+            pending_progress = TranscriptProgress(
+                progress.message_count + len(page), page[-1].id, 0, progress.text_length + len(text)
+            )
+        await finish_pending()
+    finally:
+        # Never leave a write running on the pool behind an error.
+        if pending is not None:
+            await asyncio.gather(pending, return_exceptions=True)
+    return progress
+
+
+async def inline_parts(path: str, progress: TranscriptProgress) -> list[str] | None:
+    """
+    Splits a finished transcript into message-sized parts at line breaks, or returns None if
+    it would take more than INLINE_PART_LIMIT messages (it is then only posted as a file).
+    """
+    if progress.text_length > INLINE_PART_LIMIT * MESSAGE_CHAR_LIMIT:
+        return None
+    text = await file_io.run(_read_text, path)
+    packer = ChunkPacker()
+    parts = []
+    for line in text.splitlines(keepends=True):
+        parts.extend(packer.add(line))
+    parts.extend(packer.flush())
+    return parts if len(parts) <= INLINE_PART_LIMIT else None